@@ -0,0 +1,86 @@
+# scripts/bench_crisis.py
+"""
+Microbenchmark for the crisis detector.
+
+Compares the compiled Aho-Corasick matcher with the old loop of `in` checks
+as the phrase list grows. The automaton's cost per character should stay flat
+while the naive loop grows linearly with the number of phrases.
+
+Usage:
+    python -m scripts.bench_crisis
+    python -m scripts.bench_crisis --sizes 10 100 1000 10000 --repeat 5
+"""
+import sys
+import time
+import random
+import string
+import argparse
+
+from src.crisis_detector import PhraseMatcher, load_phrases, normalize
+
+SAMPLE_MESSAGES = [
+    "hey everyone, what should I do about my job interview tomorrow?",
+    "I feel kind of lonely lately and I don't really know why",
+    "lol that was hilarious, thanks for the advice",
+    "should I buy a new laptop or fix the old one, be honest",
+    "what is the meaning of all this, I keep wondering about it at night",
+    "my sister and I had a fight and now she won't talk to me",
+    "quick question: pizza or tacos tonight",
+    "I've been meditating every morning and it helps a bit",
+]
+
+def random_phrase(rng):
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+             for _ in range(rng.randint(1, 4))]
+    return " ".join(words)
+
+def build_phrases(n, rng):
+    phrases = load_phrases()
+    while len(phrases) < n:
+        phrases.append(random_phrase(rng))
+    return phrases[:n]
+
+def naive_detect(text, phrases):
+    text_lower = text.lower()
+    for phrase in phrases:
+        if phrase in text_lower:
+            return True
+    return False
+
+def time_per_char(fn, corpus, repeat):
+    chars = sum(len(t) for t in corpus)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / chars * 1e9
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--messages", type=int, default=2000, help="messages in the corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    corpus = [rng.choice(SAMPLE_MESSAGES) for _ in range(args.messages)]
+    normalized = [normalize(t) for t in corpus]
+
+    print(f"corpus: {len(corpus)} messages, {sum(len(t) for t in corpus)} chars")
+    print(f"{'phrases':>8} {'states':>8} {'build ms':>9} {'scan ns/char':>13} {'detect ns/char':>15} {'naive ns/char':>14}")
+    for n in args.sizes:
+        phrases = build_phrases(n, rng)
+        start = time.perf_counter()
+        matcher = PhraseMatcher(phrases)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        scan = time_per_char(lambda t: next(matcher.iter_matches(t), None), normalized, args.repeat)
+        detect = time_per_char(matcher.search, corpus, args.repeat)
+        naive = time_per_char(lambda t: naive_detect(t, phrases), corpus, args.repeat)
+        print(f"{n:>8} {matcher.num_states:>8} {build_ms:>9.1f} {scan:>13.1f} {detect:>15.1f} {naive:>14.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,564 @@
+# scripts/bench_pipeline.py
+"""
+Offline end-to-end benchmark for handle_governor_message.
+
+Everything external is replaced by a local stand-in, so the whole pipeline
+(classification, scheduler, resilience, context building, memory, outbox)
+runs as in production without network access or API keys:
+
+- Discord: fake clients, channels and messages that record every send, edit
+  and delete with a timestamp, after a configurable API latency.
+- OpenAI and Anthropic: an aiohttp server on 127.0.0.1, running in its own
+  thread, serving /v1/chat/completions and /v1/messages. It supports
+  streaming (SSE) and has a lognormal time to first token, a per-token delay
+  and injectable 5xx / 429 errors. The SDKs reach it through
+  OPENAI_BASE_URL / ANTHROPIC_BASE_URL.
+- Redis: fakeredis (pip install fakeredis), swapped in for the clients in
+  src.memory_manager and every module that imported them.
+
+N channels each send M messages one after another, all channels at once.
+The report gives p50/p95/p99 turn latency and time to first reply (the first
+message posted under a persona's identity), LLM calls and Discord operations
+per message, and throughput. --save writes the results as JSON; --baseline
+compares a run against such a file.
+
+A turn counts as failed if it raised or posted a reply containing "Error:";
+errors_total increments are reported per stage. If a provider that the model
+registry assigns to some role received no calls at all, the run is reported
+as broken and exits with status 1: the stub was never reached, so the numbers
+do not measure that provider.
+
+Other settings come from the usual environment variables, e.g.
+STREAM_REPLIES=1 or LLM_HEDGING=1.
+
+Usage:
+    python -m scripts.bench_pipeline
+    python -m scripts.bench_pipeline --channels 50 --messages 5 --ttft-ms 600 --error-rate 0.02
+    python -m scripts.bench_pipeline --save baseline.json
+    python -m scripts.bench_pipeline --panel 1 --baseline baseline.json
+    python -m scripts.bench_pipeline --baseline baseline.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+
+from aiohttp import web
+
+SAMPLE_MESSAGES = [
+    "hey everyone, what should I do about my job interview tomorrow?",
+    "I feel kind of lonely lately and I don't really know why",
+    "lol that was hilarious, thanks for the advice",
+    "should I buy a new laptop or fix the old one, be honest",
+    "what is the meaning of all this, I keep wondering about it at night",
+    "my sister and I had a fight and now she won't talk to me",
+    "quick question: pizza or tacos tonight",
+    "I've been meditating every morning and it helps a bit",
+    "can you help me make a plan to save money this year?",
+    "honestly I just need someone to tell me it'll be fine",
+]
+
+REPLY_WORDS = (
+    "sure think about what matters most here and take it one step at a time "
+    "it sounds like you already know the answer deep down so trust that"
+).split()
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of values (q in 0..100), or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(q / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- Stub LLM server -------------------------------------------------------
+
+class StubLLMServer:
+    """
+    OpenAI- and Anthropic-compatible endpoints with synthetic latency and errors.
+    """
+
+    def __init__(self, ttft_ms, ttft_sigma, token_ms, reply_words, error_rate, ratelimit_rate, seed,
+                 limit_rpm=0, limit_tpm=0):
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.token_ms = token_ms
+        self.reply_words = reply_words
+        self.error_rate = error_rate
+        self.ratelimit_rate = ratelimit_rate
+        self.limit_rpm = limit_rpm
+        self.limit_tpm = limit_tpm
+        self.rng = random.Random(seed)
+        self.port = free_port()
+        self.requests = {"openai": 0, "anthropic": 0}
+        self.streams = 0
+        self.injected = {"5xx": 0, "429": 0}
+        self._ready = threading.Event()
+
+    def start(self):
+        """
+        Runs the server in a daemon thread with its own event loop, so it does
+        not compete with the bot code for the benchmark's loop.
+        """
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+        return self
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.openai_chat)
+        app.router.add_post("/v1/messages", self.anthropic_messages)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", self.port).start()
+        self._ready.set()
+        while True:
+            await asyncio.sleep(3600)
+
+    def _ttft(self):
+        return self.ttft_ms / 1000.0 * math.exp(self.rng.gauss(0, self.ttft_sigma))
+
+    def _reply(self, body):
+        system = body.get("system") or ""
+        if not isinstance(system, str):
+            system = " ".join(block.get("text", "") for block in system)
+        for message in body.get("messages", []):
+            if message.get("role") == "system":
+                system += message.get("content") or ""
+        if "persona classifier" in system:
+            return "Cyclo, Emo"
+        if "meta-evaluator" in system:
+            return "Cyclo"
+        return " ".join(self.rng.choice(REPLY_WORDS) for _ in range(self.reply_words))
+
+    def _injected_error(self):
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            self.injected["5xx"] += 1
+            return web.json_response({"error": {"type": "server_error", "message": "injected"}}, status=503)
+        if roll < self.error_rate + self.ratelimit_rate:
+            self.injected["429"] += 1
+            return web.json_response(
+                {"error": {"type": "rate_limit_error", "message": "injected"}}, status=429,
+                headers={"retry-after": "0.2"}
+            )
+        return None
+
+    def _limit_headers(self, provider):
+        """
+        Rate-limit headers as the real API sends them (only with --stub-rpm/--stub-tpm).
+        """
+        headers = {}
+        for kind, limit in (("requests", self.limit_rpm), ("tokens", self.limit_tpm)):
+            if not limit:
+                continue
+            if provider == "openai":
+                headers[f"x-ratelimit-limit-{kind}"] = str(limit)
+                headers[f"x-ratelimit-remaining-{kind}"] = str(limit)
+            else:
+                headers[f"anthropic-ratelimit-{kind}-limit"] = str(limit)
+                headers[f"anthropic-ratelimit-{kind}-remaining"] = str(limit)
+        return headers
+
+    async def _sse(self, request, events, headers=None):
+        response = web.StreamResponse(headers=dict(headers or {}, **{"Content-Type": "text/event-stream"}))
+        await response.prepare(request)
+        for i, (event, data) in enumerate(events):
+            if i > 0 and self.token_ms:
+                await asyncio.sleep(self.token_ms / 1000.0)
+            prefix = f"event: {event}\n" if event else ""
+            payload = data if isinstance(data, str) else json.dumps(data)
+            await response.write(f"{prefix}data: {payload}\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def openai_chat(self, request):
+        body = await request.json()
+        self.requests["openai"] += 1
+        await asyncio.sleep(self._ttft())
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        text = self._reply(body)
+        model = body.get("model", "stub")
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()),
+                 "total_tokens": prompt_tokens + len(text.split())}
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": model}
+        if not body.get("stream"):
+            return web.json_response(dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            ]), headers=self._limit_headers("openai"))
+
+        self.streams += 1
+        chunk = dict(base, object="chat.completion.chunk")
+        events = [(None, dict(chunk, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}}]))]
+        for word in text.split(" "):
+            events.append((None, dict(chunk, choices=[{"index": 0, "delta": {"content": word + " "}}])))
+        events.append((None, dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+        events.append((None, dict(chunk, choices=[], usage=usage)))
+        events.append((None, "[DONE]"))
+        return await self._sse(request, events, self._limit_headers("openai"))
+
+    async def anthropic_messages(self, request):
+        body = await request.json()
+        self.requests["anthropic"] += 1
+        await asyncio.sleep(self._ttft())
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        text = self._reply(body)
+        model = body.get("model", "stub")
+        input_tokens = len(json.dumps(body.get("messages", []))) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": len(text.split())}
+        message = {"id": "msg_bench", "type": "message", "role": "assistant", "model": model,
+                   "stop_reason": None, "stop_sequence": None}
+        if not body.get("stream"):
+            return web.json_response(dict(message, stop_reason="end_turn", usage=usage,
+                                          content=[{"type": "text", "text": text}]),
+                                     headers=self._limit_headers("anthropic"))
+
+        self.streams += 1
+        events = [
+            ("message_start", {"type": "message_start",
+                               "message": dict(message, content=[], usage=dict(usage, output_tokens=0))}),
+            ("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+        ]
+        for word in text.split(" "):
+            events.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": word + " "}}))
+        events.append(("content_block_stop", {"type": "content_block_stop", "index": 0}))
+        events.append(("message_delta", {"type": "message_delta",
+                                         "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                         "usage": {"output_tokens": usage["output_tokens"]}}))
+        events.append(("message_stop", {"type": "message_stop"}))
+        return await self._sse(request, events, self._limit_headers("anthropic"))
+
+# --- Fake Discord ----------------------------------------------------------
+
+class Recorder:
+    """
+    Timestamped log of every Discord operation, with a simulated API latency.
+    """
+
+    def __init__(self, latency_ms, rng):
+        self.latency_ms = latency_ms
+        self.rng = rng
+        self.events = []  # (monotonic time, op, channel_id, identity, content)
+
+    async def call(self, op, channel_id, identity, content=None):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000.0 * self.rng.uniform(0.5, 1.5))
+        self.events.append((time.monotonic(), op, channel_id, identity, content))
+
+class FakeMessage:
+    def __init__(self, recorder, channel, content):
+        self.recorder = recorder
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        await self.recorder.call("edit", self.channel.id, self.channel.identity, content)
+        self.content = content
+        return self
+
+    async def delete(self):
+        await self.recorder.call("delete", self.channel.id, self.channel.identity)
+
+class _FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeChannel:
+    def __init__(self, recorder, channel_id, identity):
+        self.recorder = recorder
+        self.id = channel_id
+        self.identity = identity
+
+    async def send(self, content=None, **kwargs):
+        await self.recorder.call("send", self.id, self.identity, content)
+        return FakeMessage(self.recorder, self, content)
+
+    def typing(self):
+        return _FakeTyping()
+
+class FakeClient:
+    """
+    A persona's client: channels it returns post under the persona's identity.
+    """
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.user = None
+
+    def get_channel(self, channel_id):
+        return FakeChannel(self.recorder, channel_id, self.name)
+
+    get_partial_messageable = get_channel
+
+class FakeAuthor:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.bot = False
+
+class FakeIncomingMessage:
+    """
+    A user message as the gateway client sees it; its channel has the
+    "gateway" identity, used for the aggregator's placeholders.
+    """
+
+    def __init__(self, recorder, channel_id, user_id, content):
+        self.channel = FakeChannel(recorder, channel_id, "gateway")
+        self.author = FakeAuthor(user_id)
+        self.content = content
+        self.guild = None
+        self.id = random.getrandbits(48)
+
+# --- Harness ---------------------------------------------------------------
+
+def install_fake_redis():
+    """
+    Replaces the Redis clients created by src.memory_manager, including the
+    references other src modules imported, with fakeredis clients on one server.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("bench_pipeline needs fakeredis: pip install fakeredis")
+    server = fakeredis.FakeServer()
+    fakes = {
+        "r": fakeredis.FakeRedis(server=server, decode_responses=True),
+        "rb": fakeredis.FakeRedis(server=server),
+        "ar": fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+        "arb": fakeredis.FakeAsyncRedis(server=server),
+    }
+    import src.memory_manager as memory_manager
+    originals = {name: getattr(memory_manager, name) for name in fakes}
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith("src.") or module is None:
+            continue
+        for name, fake in fakes.items():
+            if getattr(module, name, None) is originals[name]:
+                setattr(module, name, fake)
+
+async def run_channel(handle, clients, recorder, channel_id, args, rng, turns):
+    for i in range(args.messages):
+        text = rng.choice(SAMPLE_MESSAGES)
+        message = FakeIncomingMessage(recorder, channel_id, 1000 + channel_id, text)
+        started = time.monotonic()
+        try:
+            await handle(message, clients)
+            failed = False
+        except Exception as e:
+            print(f"Turn error in channel {channel_id}:", e)
+            failed = True
+        turns.append({"channel": channel_id, "start": started, "end": time.monotonic(), "failed": failed})
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000.0 * rng.uniform(0.5, 1.5))
+
+def mark_error_replies(turns, events):
+    """
+    Marks turns that posted or edited in an "Error:" reply in their channel as failed.
+    """
+    errors = {}
+    for t, op, channel_id, identity, content in events:
+        if op in ("send", "edit") and content and "Error:" in content:
+            errors.setdefault(channel_id, []).append(t)
+    for turn in turns:
+        if any(turn["start"] <= t <= turn["end"] for t in errors.get(turn["channel"], [])):
+            turn["failed"] = True
+
+def expected_providers():
+    """
+    {provider: [roles]} for every provider the model registry currently uses.
+    """
+    from src.model_registry import roles, model_for
+    expected = {}
+    for role in roles():
+        expected.setdefault(model_for(role).provider, []).append(role)
+    return expected
+
+def first_reply_times(turns, events):
+    """
+    Seconds from each turn's start to the first message posted under a
+    persona's identity in its channel.
+    """
+    sends = {}
+    for t, op, channel_id, identity, content in events:
+        if op == "send" and identity != "gateway":
+            sends.setdefault(channel_id, []).append(t)
+    result = []
+    for turn in turns:
+        times = [t for t in sends.get(turn["channel"], []) if turn["start"] <= t <= turn["end"]]
+        if times:
+            result.append(min(times) - turn["start"])
+    return result
+
+def summarize(values):
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+async def bench(args, stub):
+    # src modules read their settings at import, so they are imported only
+    # once the environment points them at the stub server.
+    from src import metrics
+    from src.aggregator import handle_governor_message
+    from src.llm_provider import close_clients
+    from src.persona_manager import set_panel_mode
+    install_fake_redis()
+    if args.panel:
+        for c in range(args.channels):
+            await set_panel_mode(str(1 + c), args.panel)
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    recorder = Recorder(args.discord_ms, random.Random(args.seed + 1))
+    clients = {name: FakeClient(recorder, name) for name in ["Cyclo", "Emo", "Prim", "Spri", "Governor"]}
+    turns = []
+
+    started = time.monotonic()
+    await asyncio.gather(*(
+        run_channel(handle_governor_message, clients, recorder, 1 + c, args, random.Random(rng.random()), turns)
+        for c in range(args.channels)
+    ))
+    elapsed = time.monotonic() - started
+    await close_clients()
+    mark_error_replies(turns, recorder.events)
+    expected = expected_providers()
+
+    messages = len(turns)
+    llm_calls = sum(stub.requests.values())
+    ops = {}
+    for _, op, _, _, _ in recorder.events:
+        ops[op] = ops.get(op, 0) + 1
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")},
+        "messages": messages,
+        "failed_turns": sum(1 for t in turns if t["failed"]),
+        "elapsed_s": elapsed,
+        "throughput_msgs_per_s": messages / elapsed if elapsed else 0.0,
+        "turn_latency_s": summarize([t["end"] - t["start"] for t in turns]),
+        "time_to_first_reply_s": summarize(first_reply_times(turns, recorder.events)),
+        "llm_calls_per_message": llm_calls / messages if messages else 0.0,
+        "llm_calls": dict(stub.requests, streams=stub.streams),
+        "providers_not_called": {p: r for p, r in expected.items() if not stub.requests.get(p)},
+        "errors": {k: v for k, v in metrics.snapshot().items() if k.startswith("errors_total")},
+        "llm_retries": sum(v for k, v in metrics.snapshot().items() if k.startswith("llm_retries_total")),
+        "injected_errors": dict(stub.injected),
+        "discord_ops_per_message": {op: n / messages for op, n in sorted(ops.items())} if messages else {},
+        "flows": {k: v for k, v in metrics.snapshot().items() if k.startswith("turn_flows_total")},
+    }
+
+def _fmt(value, unit=""):
+    if value is None:
+        return "-"
+    if unit == "ms":
+        return f"{value * 1000:.0f}ms"
+    return f"{value:.2f}"
+
+def print_report(result, baseline=None):
+    def line(label, value, base=None, unit=""):
+        text = f"{label:28} {_fmt(value, unit):>10}"
+        if base is not None and value is not None:
+            delta = (value - base) / base * 100 if base else 0.0
+            text += f"   baseline {_fmt(base, unit):>10}  ({delta:+.1f}%)"
+        print(text)
+
+    def b(*path):
+        node = baseline
+        for key in path:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(key)
+        return node
+
+    cfg = result["config"]
+    print(f"== {cfg['channels']} channels x {cfg['messages']} messages, "
+          f"ttft {cfg['ttft_ms']}ms (sigma {cfg['ttft_sigma']}), {cfg['token_ms']}ms/token, "
+          f"errors {cfg['error_rate']:.0%} / 429s {cfg['ratelimit_rate']:.0%} ==")
+    print(f"messages={result['messages']} failed={result['failed_turns']} elapsed={result['elapsed_s']:.1f}s")
+    line("throughput (msgs/s)", result["throughput_msgs_per_s"], b("throughput_msgs_per_s"))
+    for q in ("p50", "p95", "p99"):
+        line(f"turn latency {q}", result["turn_latency_s"][q], b("turn_latency_s", q), "ms")
+    for q in ("p50", "p95", "p99"):
+        line(f"time to first reply {q}", result["time_to_first_reply_s"][q], b("time_to_first_reply_s", q), "ms")
+    line("LLM calls / message", result["llm_calls_per_message"], b("llm_calls_per_message"))
+    for op, value in result["discord_ops_per_message"].items():
+        line(f"discord {op} / message", value, b("discord_ops_per_message", op))
+    print(f"LLM calls: {result['llm_calls']}  retries: {result['llm_retries']}  injected: {result['injected_errors']}")
+    print(f"flows: {result['flows']}")
+    print(f"errors: {result['errors'] or 'none'}")
+    for provider, roles in result["providers_not_called"].items():
+        print(f"!! WARNING: no calls reached the {provider} stub, though the registry uses it for "
+              f"{', '.join(roles)}. The results do not cover {provider}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of handle_governor_message.")
+    parser.add_argument("--channels", type=int, default=10, help="concurrent channels")
+    parser.add_argument("--messages", type=int, default=5, help="messages per channel, sent one after another")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a channel's messages")
+    parser.add_argument("--ttft-ms", type=float, default=400, help="median LLM time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.4, help="lognormal spread of the time to first token")
+    parser.add_argument("--token-ms", type=float, default=15, help="delay between streamed tokens")
+    parser.add_argument("--reply-words", type=int, default=40, help="words per stub reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM requests failing with 503")
+    parser.add_argument("--ratelimit-rate", type=float, default=0.0, help="share of LLM requests failing with 429")
+    parser.add_argument("--stub-rpm", type=int, default=0, help="requests/min the stub reports in its rate-limit headers")
+    parser.add_argument("--stub-tpm", type=int, default=0, help="tokens/min the stub reports in its rate-limit headers")
+    parser.add_argument("--discord-ms", type=float, default=60, help="mean Discord API latency")
+    parser.add_argument("--panel", type=int, default=0, help="run every channel in panel mode, posting this many replies")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    args = parser.parse_args()
+
+    stub = StubLLMServer(args.ttft_ms, args.ttft_sigma, args.token_ms, args.reply_words,
+                         args.error_rate, args.ratelimit_rate, args.seed,
+                         args.stub_rpm, args.stub_tpm).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub.port}/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{stub.port}"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+
+    result = asyncio.run(bench(args, stub))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if result["providers_not_called"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# scripts/bench_startup.py
+"""
+Cold-start benchmark.
+
+Starts fresh interpreters the way the bot starts on a Fly machine and
+measures, from process spawn:
+
+- import: the entry module (src.main, src.gateway or src.worker) is imported,
+  which is when the Discord clients can start logging in
+- health: the health server answers, which is when the Fly check passes
+- pipeline: the message pipeline is imported and both LLM clients exist, so
+  the first message can be answered without an import stall
+
+Discord login itself needs the network and is not included. One extra run
+under `python -X importtime` breaks the import time down by top-level
+package. --save / --baseline store and compare results like
+scripts/bench_pipeline.py.
+
+Usage:
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --mode gateway --repeat 10
+    python -m scripts.bench_startup --save startup.json
+    python -m scripts.bench_startup --baseline startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+
+MODULES = {"all": "src.main", "gateway": "src.gateway", "worker": "src.worker"}
+
+# Runs in the child interpreter. Times are absolute (time.time()) so the
+# parent can subtract its spawn time.
+CHILD = r"""
+import sys, time, json, asyncio, importlib
+module_name, port = sys.argv[1], int(sys.argv[2])
+marks = {}
+module = importlib.import_module(module_name)
+marks["import"] = time.time()
+
+from src.health import start_health_server
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+runner = loop.run_until_complete(start_health_server(port))
+marks["health"] = time.time()
+
+if hasattr(module, "preload_pipeline"):
+    module.preload_pipeline()
+else:
+    import src.aggregator
+    import src.llm_provider as provider
+    for name in ("get_openai_client", "get_anthropic_client"):
+        try:
+            getattr(provider, name)()
+        except Exception as e:
+            print("client error:", e, file=sys.stderr)
+marks["pipeline"] = time.time()
+
+loop.run_until_complete(runner.cleanup())
+print("MARKS " + json.dumps(marks))
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def child_env(mode):
+    env = dict(os.environ, BOT_MODE=mode)
+    # Client construction needs a key, not a valid one.
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env.setdefault("ANTHROPIC_API_KEY", "bench")
+    return env
+
+def run_once(module_name, mode):
+    """
+    Returns {"import": s, "health": s, "pipeline": s} measured from spawn.
+    """
+    spawned = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, module_name, str(free_port())],
+        capture_output=True, text=True, env=child_env(mode), cwd=os.getcwd()
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("MARKS "):
+            marks = json.loads(line[len("MARKS "):])
+            return {stage: t - spawned for stage, t in marks.items()}
+    raise RuntimeError(f"child failed:\n{proc.stderr[-2000:]}")
+
+def import_breakdown(module_name, mode, top):
+    """
+    Self import time per top-level package (seconds) from `python -X importtime`.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True, env=child_env(mode), cwd=os.getcwd()
+    )
+    per_package = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module name>"
+        parts = line[len("import time:"):].split("|")
+        self_us = int(parts[0].strip())
+        package = parts[2].strip().split(".")[0]
+        per_package[package] = per_package.get(package, 0) + self_us / 1e6
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    return dict(ranked[:top]), sum(per_package.values())
+
+def median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+def print_report(result, baseline=None):
+    print(f"== BOT_MODE={result['mode']} ({result['module']}), median of {result['repeat']} cold starts ==")
+    for stage in ("import", "health", "pipeline"):
+        value = result["stages_s"][stage]
+        text = f"{stage + ' ready':16} {value * 1000:8.0f}ms"
+        base = (baseline or {}).get("stages_s", {}).get(stage)
+        if base:
+            text += f"   baseline {base * 1000:8.0f}ms  ({(value - base) / base * 100:+.1f}%)"
+        print(text)
+    print(f"-X importtime total {result['importtime_total_s'] * 1000:.0f}ms, by package (self time):")
+    for package, seconds in result["importtime_by_package_s"].items():
+        print(f"  {package:24} {seconds * 1000:8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the bot's entry points.")
+    parser.add_argument("--mode", choices=sorted(MODULES), default="all", help="BOT_MODE to start")
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to take the median of")
+    parser.add_argument("--top", type=int, default=12, help="packages to list in the import breakdown")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    args = parser.parse_args()
+
+    module_name = MODULES[args.mode]
+    runs = [run_once(module_name, args.mode) for _ in range(args.repeat)]
+    by_package, total = import_breakdown(module_name, args.mode, args.top)
+    result = {
+        "mode": args.mode,
+        "module": module_name,
+        "repeat": args.repeat,
+        "stages_s": {stage: median([run[stage] for run in runs]) for stage in ("import", "health", "pipeline")},
+        "importtime_total_s": total,
+        "importtime_by_package_s": by_package,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+if __name__ == "__main__":
+    main()
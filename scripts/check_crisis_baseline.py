@@ -0,0 +1,86 @@
+# scripts/check_crisis_baseline.py
+"""
+Regression check for the crisis detector: every message the original keyword
+check (`phrase in text.lower()` over SUICIDE_KEYWORDS) flags must still be
+flagged by the phrase matcher, and so must the inflected phrasings in
+INFLECTED_CASES ("killing myself", "took my life").
+
+Runs a fixed list of known cases plus randomly generated messages that embed
+each keyword with random case, surrounding text, punctuation and hashtags.
+Exits non-zero and prints the misses if any message is no longer flagged.
+
+Usage:
+    python -m scripts.check_crisis_baseline
+    python -m scripts.check_crisis_baseline --samples 50000 --seed 7
+"""
+import sys
+import random
+import string
+import asyncio
+import argparse
+
+from src.crisis_detector import SUICIDE_KEYWORDS, crisis_detect
+
+KNOWN_CASES = [
+    "#suicidewatch",
+    "suicides are rising",
+    "suicide's a hard topic",
+    "I want to kill myself",
+    "i'll KILL MYSELF lol",
+    "thinking about self-harm again",
+    "self-harming",
+    "he overdosed last year",
+    "antisuicide campaign",
+    "please don't end my life story like that",
+    "I could die by my own hand",
+    "stop, I'll hurt myself.",
+    "they tried to take my life away",
+]
+
+# Inflected phrasings the original check missed; the matcher must flag them too.
+INFLECTED_CASES = [
+    "I am killing myself",
+    "I killed myself in that game lol",
+    "thinking about ending my life",
+    "I keep hurting myself",
+    "he took my life from me",
+    "I want to take my own life",
+    "overdosing on my meds",
+    "she overdosed",
+    "dying by my own hand",
+]
+
+_FILLER = string.ascii_letters + string.digits + " .,!?#@'-_*:;()\n"
+
+def baseline_detect(text):
+    text_lower = text.lower()
+    return any(phrase in text_lower for phrase in SUICIDE_KEYWORDS)
+
+def random_case(rng, text):
+    return "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+
+def random_message(rng):
+    keyword = random_case(rng, rng.choice(SUICIDE_KEYWORDS))
+    before = "".join(rng.choice(_FILLER) for _ in range(rng.randint(0, 30)))
+    after = "".join(rng.choice(_FILLER) for _ in range(rng.randint(0, 30)))
+    return before + keyword + after
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the crisis detector against the original keyword check.")
+    parser.add_argument("--samples", type=int, default=20000, help="random messages to generate")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = KNOWN_CASES + [random_message(rng) for _ in range(args.samples)]
+    flagged = [m for m in messages if baseline_detect(m)]
+    misses = [m for m in flagged + INFLECTED_CASES if not asyncio.run(crisis_detect(m))]
+
+    print(f"{len(flagged)} messages flagged by the original check plus {len(INFLECTED_CASES)} inflected cases, "
+          f"{len(misses)} missed by the matcher")
+    for message in misses[:20]:
+        print("  missed:", repr(message))
+    sys.exit(1 if misses else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# scripts/check_sanitizer.py
+"""
+Checks the compiled response sanitizer against the original implementation.
+
+Every recorded reply in the corpus (JSONL of {"persona", "response"}) is run
+through the original sanitize_persona_response logic, the compiled
+ResponseSanitizer, and the incremental StreamSanitizer fed in random chunk
+sizes. Any difference is printed; the exit status is non-zero on mismatch.
+
+Usage:
+    python -m scripts.check_sanitizer
+    python -m scripts.check_sanitizer replies.jsonl --trials 50
+"""
+import re
+import sys
+import json
+import random
+import argparse
+
+from src.postprocess import default_sanitizer
+
+def reference_sanitize(persona_name, response):
+    """
+    The original aggregator.sanitize_persona_response, kept verbatim as the reference.
+    """
+    cleaned = re.sub(r'\*[^*]+\*', '', response)
+    unwanted_phrases = [
+        "is reflecting on your question",
+        "has something thoughtful to share",
+        "is working on an answer right now",
+    ]
+    for phrase in unwanted_phrases:
+        cleaned = re.sub(re.escape(phrase), "", cleaned, flags=re.IGNORECASE)
+    for prefix in [f"{persona_name}:", f"{persona_name.lower()}:", f"{persona_name.capitalize()}:" ]:
+        if cleaned.strip().startswith(prefix):
+            cleaned = cleaned.strip()[len(prefix):].strip()
+            break
+    return cleaned.strip()
+
+def stream_sanitize(persona_name, response, rng):
+    stream = default_sanitizer.stream(persona_name)
+    pieces = []
+    pos = 0
+    while pos < len(response):
+        size = rng.randint(1, 8)
+        pieces.append(stream.feed(response[pos:pos + size]))
+        pos += size
+    pieces.append(stream.finish())
+    return "".join(pieces)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default="data/sanitizer_corpus.jsonl")
+    parser.add_argument("--trials", type=int, default=20, help="random chunkings per reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    rows = []
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+
+    mismatches = 0
+    for row in rows:
+        persona, response = row["persona"], row["response"]
+        expected = reference_sanitize(persona, response)
+        compiled = default_sanitizer.sanitize(persona, response)
+        if compiled != expected:
+            mismatches += 1
+            print(f"[compiled] {persona}: {response!r}\n  expected {expected!r}\n  got      {compiled!r}")
+        for _ in range(args.trials):
+            streamed = stream_sanitize(persona, response, rng)
+            if streamed != expected:
+                mismatches += 1
+                print(f"[stream] {persona}: {response!r}\n  expected {expected!r}\n  got      {streamed!r}")
+                break
+
+    print(f"{len(rows)} replies, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
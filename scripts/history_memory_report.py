@@ -0,0 +1,106 @@
+# scripts/history_memory_report.py
+"""
+Reports Redis memory used by channel histories and migrates them to the
+structured entry format (src/history_format.py).
+
+For every "history:*" key it prints the entry count, how many entries are
+still in the old "author: content" format, MEMORY USAGE and TTL. With
+--migrate, old entries are rewritten in the new format (order kept), keys get
+the idle-channel TTL, and the report is printed again with the before/after
+totals.
+
+Usage:
+    python -m scripts.history_memory_report
+    python -m scripts.history_memory_report --migrate
+    python -m scripts.history_memory_report --migrate --limit 100 --quiet
+"""
+import argparse
+
+from redis.exceptions import WatchError
+
+from src.history_format import decode_entry, encode_entry, is_legacy
+from src.memory_manager import rb, HISTORY_TTL
+from src.token_count import count_tokens
+
+def scan_history_keys(limit=None):
+    keys = []
+    for key in rb.scan_iter(match="history:*", count=500):
+        keys.append(key)
+        if limit and len(keys) >= limit:
+            break
+    return sorted(keys)
+
+def key_report(key):
+    raw_entries = rb.lrange(key, 0, -1)
+    return {
+        "key": key.decode("utf-8", errors="replace"),
+        "entries": len(raw_entries),
+        "legacy": sum(1 for raw in raw_entries if is_legacy(raw)),
+        "bytes": rb.memory_usage(key) or 0,
+        "ttl": rb.ttl(key),
+    }
+
+def migrate_key(key):
+    """
+    Rewrites a key's old-format entries in the new format. Returns the number
+    of entries converted.
+    """
+    with rb.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                raw_entries = pipe.lrange(key, 0, -1)
+                converted = 0
+                encoded = []
+                for raw in raw_entries:
+                    if is_legacy(raw):
+                        entry = decode_entry(raw)
+                        entry = entry._replace(tokens=count_tokens(entry.content))
+                        encoded.append(encode_entry(entry))
+                        converted += 1
+                    else:
+                        encoded.append(raw)
+                pipe.multi()
+                if converted:
+                    pipe.delete(key)
+                    pipe.rpush(key, *encoded)
+                if HISTORY_TTL:
+                    pipe.expire(key, HISTORY_TTL)
+                pipe.execute()
+                return converted
+            except WatchError:
+                continue
+
+def print_report(reports, title, quiet=False):
+    print(f"== {title} ==")
+    if not quiet:
+        print(f"{'key':40} {'entries':>7} {'legacy':>6} {'bytes':>8} {'ttl':>9}")
+        for rep in reports:
+            print(f"{rep['key'][:40]:40} {rep['entries']:>7} {rep['legacy']:>6} {rep['bytes']:>8} {rep['ttl']:>9}")
+    total = sum(rep["bytes"] for rep in reports)
+    entries = sum(rep["entries"] for rep in reports)
+    legacy = sum(rep["legacy"] for rep in reports)
+    no_ttl = sum(1 for rep in reports if rep["ttl"] == -1)
+    print(f"channels={len(reports)} entries={entries} legacy={legacy} bytes={total} without_ttl={no_ttl}")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis memory per channel history, with optional migration.")
+    parser.add_argument("--migrate", action="store_true", help="rewrite old-format entries and set TTLs")
+    parser.add_argument("--limit", type=int, default=None, help="only look at this many keys")
+    parser.add_argument("--quiet", action="store_true", help="print totals only")
+    args = parser.parse_args()
+
+    keys = scan_history_keys(args.limit)
+    before = print_report([key_report(k) for k in keys], "before" if args.migrate else "history keys", args.quiet)
+    if not args.migrate:
+        return
+
+    converted = sum(migrate_key(k) for k in keys)
+    after = print_report([key_report(k) for k in keys], "after", args.quiet)
+    saved = before - after
+    pct = 100.0 * saved / before if before else 0.0
+    print(f"converted={converted} entries, bytes {before} -> {after} ({pct:.1f}% saved)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# scripts/train_classifier.py
+"""
+Offline training and evaluation for the local persona classifier.
+
+Input is JSONL, one transcript line per row:
+    {"text": "user message"}
+By default every row is labelled by the production LLM classifier (needs
+OPENAI_API_KEY), since what matters is how often the local classifier agrees
+with the LLM it replaces. --save-labels keeps those labels for later runs,
+which can then pass --file-labels to use them without calling the LLM again.
+Hand-written labels (data/classifier_seed.jsonl) only make a toy run: their
+agreement says nothing about production traffic.
+
+Training writes to --out and never to the shipped weights file unless that
+path is given explicitly. The holdout evaluation ends with the lowest
+confidence threshold whose agreement reaches --target-agreement on at least
+--min-covered rows: the value to set as LOCAL_CLASSIFIER_THRESHOLD.
+
+Usage:
+    python -m scripts.train_classifier transcripts.jsonl --save-labels labelled.jsonl --holdout 0.2 --out weights.json
+    python -m scripts.train_classifier labelled.jsonl --file-labels --holdout 0.2 --out weights.json
+    python -m scripts.train_classifier labelled.jsonl --file-labels --eval-only
+"""
+import sys
+import json
+import random
+import asyncio
+import argparse
+
+from src.local_classifier import (
+    PERSONAS, NUM_BUCKETS, WEIGHTS_PATH,
+    features, softmax, load_model, classify_local
+)
+
+def load_rows(path):
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rows.append(json.loads(line))
+    return rows
+
+async def label_with_llm(rows, concurrency=8):
+    """
+    Sets every row's "labels" using the production LLM classifier.
+    """
+    from src.classification import classify_personas_llm
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def label(row):
+        async with sem:
+            row["labels"] = await classify_personas_llm(row["text"])
+
+    await asyncio.gather(*(label(r) for r in rows))
+    return rows
+
+def train(rows, epochs=30, lr=0.3, l2=1e-4, seed=0):
+    """
+    Multinomial logistic regression with soft targets (uniform over each
+    row's labels), trained with plain SGD on sparse hashed features.
+    """
+    rng = random.Random(seed)
+    k = len(PERSONAS)
+    weights = {}
+    bias = [0.0] * k
+    data = []
+    for row in rows:
+        labels = [l for l in row["labels"] if l in PERSONAS]
+        if not labels:
+            continue
+        target = [1.0 / len(labels) if p in labels else 0.0 for p in PERSONAS]
+        data.append((features(row["text"]), target))
+
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        for feats, target in data:
+            scores = list(bias)
+            for b, c in feats.items():
+                w = weights.get(b)
+                if w is not None:
+                    for i in range(k):
+                        scores[i] += w[i] * c
+            probs = softmax(scores)
+            grad = [probs[i] - target[i] for i in range(k)]
+            for i in range(k):
+                bias[i] -= lr * grad[i]
+            for b, c in feats.items():
+                w = weights.setdefault(b, [0.0] * k)
+                for i in range(k):
+                    w[i] -= lr * (grad[i] * c + l2 * w[i])
+    return {"labels": list(PERSONAS), "bias": bias, "weights": weights}
+
+def save_model(model, path):
+    data = {
+        "labels": model["labels"],
+        "num_buckets": NUM_BUCKETS,
+        "bias": [round(b, 5) for b in model["bias"]],
+        "weights": {
+            str(b): [round(x, 5) for x in w]
+            for b, w in sorted(model["weights"].items())
+            if any(abs(x) > 1e-4 for x in w)
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+THRESHOLDS = (0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98)
+
+def evaluate(model, rows, thresholds=THRESHOLDS):
+    """
+    Prints agreement between the local classifier and the reference (LLM) labels:
+      - top-1: the local top label is one of the LLM's labels
+      - exact: the local label set equals the LLM's label set
+    and, per confidence threshold, the share of messages handled locally
+    (coverage) and the top-1 agreement on that share.
+    Returns [(threshold, covered rows, agreement)].
+    """
+    results = []
+    for row in rows:
+        labels, confidence = classify_local(row["text"], model)
+        reference = set(row["labels"])
+        results.append((confidence, labels[0] in reference, set(labels) == reference))
+
+    n = len(results) or 1
+    print(f"rows: {len(results)}")
+    print(f"top-1 agreement: {sum(r[1] for r in results) / n:.3f}")
+    print(f"exact agreement: {sum(r[2] for r in results) / n:.3f}")
+    print("threshold  coverage  agreement")
+    table = []
+    for t in thresholds:
+        covered = [r for r in results if r[0] >= t]
+        agreement = sum(r[1] for r in covered) / len(covered) if covered else 0.0
+        print(f"{t:9.2f}  {len(covered) / n:8.3f}  {agreement:9.3f}")
+        table.append((t, len(covered), agreement))
+    return table
+
+def recommend_threshold(table, target, min_covered):
+    """
+    Prints and returns the lowest threshold meeting the target agreement on
+    enough rows, or None (keep the local classifier off).
+    """
+    for t, covered, agreement in table:
+        if covered >= min_covered and agreement >= target:
+            print(f"recommended: LOCAL_CLASSIFIER_THRESHOLD={t} "
+                  f"({agreement:.3f} agreement on {covered} rows)")
+            return t
+    print(f"no threshold reaches {target:.2f} agreement on {min_covered}+ rows; "
+          "keep LOCAL_CLASSIFIER_THRESHOLD above 1.0")
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="JSONL file of {text, labels} rows")
+    parser.add_argument("--out", help="where to write the trained weights (required unless --eval-only)")
+    parser.add_argument("--weights", default=WEIGHTS_PATH, help="weights file evaluated by --eval-only")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--lr", type=float, default=0.3)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--holdout", type=float, default=0.0, help="fraction of rows kept out for evaluation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--file-labels", action="store_true",
+                        help="use the rows' own labels (e.g. saved with --save-labels) instead of calling the LLM")
+    parser.add_argument("--save-labels", help="write the LLM-labelled rows to this JSONL file")
+    parser.add_argument("--eval-only", action="store_true", help="evaluate the --weights file on all rows")
+    parser.add_argument("--target-agreement", type=float, default=0.95,
+                        help="agreement with the LLM required for a recommended threshold")
+    parser.add_argument("--min-covered", type=int, default=50,
+                        help="rows a threshold must cover for its agreement to count")
+    args = parser.parse_args(argv)
+    if not args.eval_only and not args.out:
+        parser.error("--out is required when training")
+
+    rows = load_rows(args.data)
+    if not args.file_labels:
+        rows = asyncio.run(label_with_llm(rows))
+        if args.save_labels:
+            with open(args.save_labels, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    rows = [r for r in rows if r.get("labels")]
+
+    if args.eval_only:
+        model = load_model(args.weights)
+        if model is None:
+            print(f"No weights at {args.weights}")
+            return 1
+        recommend_threshold(evaluate(model, rows), args.target_agreement, args.min_covered)
+        return 0
+
+    random.Random(args.seed).shuffle(rows)
+    split = int(len(rows) * (1 - args.holdout))
+    train_rows, eval_rows = rows[:split], rows[split:]
+
+    model = train(train_rows, epochs=args.epochs, lr=args.lr, l2=args.l2, seed=args.seed)
+    save_model(model, args.out)
+    print(f"Wrote {args.out} ({len(model['weights'])} buckets, {len(train_rows)} training rows)")
+
+    print("\n-- training set --")
+    evaluate(model, train_rows)
+    if eval_rows:
+        print("\n-- holdout set --")
+        recommend_threshold(evaluate(model, eval_rows), args.target_agreement, args.min_covered)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
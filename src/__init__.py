@@ -0,0 +1,7 @@
+# src/__init__.py
+"""
+Loads .env once, before any module reads its settings from the environment.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -1,23 +1,31 @@
+import time
 import asyncio
 import random
-import re
 import discord
 
+from src import metrics
 from src.persona_handlers import call_persona, call_persona_governor
 from src.classification import classify_personas
-from src.memory_manager import save_memory, load_memory, clear_memory
+from src.memory_manager import ar, snapshot_history, clear_memory_async
 from src.crisis_detector import crisis_detect
+from src.streaming_reply import StreamingReply, STREAMING_ENABLED
+from src.discord_outbox import DiscordOutbox
+from src.postprocess import default_sanitizer
+from src.llm_scheduler import PRIORITY_FIRST, PRIORITY_FOLLOWUP
+from src.turn_scope import TurnScope, spawn, message_arrived, wait_cancelled
+from src.panel import PANEL_TOP_K, PANEL_TIMEOUT, persona_fit, score_response, enough_good, rank_responses
 from src.persona_manager import (
-    remove_persona, add_persona, reset_personas, isolate_persona,
-    get_active_personas, is_isolation_mode
+    remove_persona, add_persona, reset_personas, isolate_persona, set_panel_mode,
+    get_active_personas, is_isolation_mode, get_panel_size, MAIN_PERSONAS
 )
 
 """
-We keep a global dictionary of user_id -> channel_id for private channels.
+We keep a Redis hash of user_id -> channel_id for private channels, shared by
+every process and kept across restarts.
 If a user calls '!private' and doesn't have one, we create it.
 If they already have one, we point them to that channel.
 """
-private_channels = {}  # Maps user_id (str) to channel_id (int)
+PRIVATE_CHANNELS_KEY = "private_channels"
 
 def sanitize_persona_response(persona_name, response):
     """
@@ -25,51 +33,219 @@ def sanitize_persona_response(persona_name, response):
       - Removing any text enclosed in asterisks (e.g. *thinks for a sec*, *nods*, *smiles warmly*).
       - Removing unwanted phrases.
       - Stripping persona name prefixes.
+    The rules are compiled once in src.postprocess.
     """
-    # Remove italicized narrative actions (anything between asterisks)
-    cleaned = re.sub(r'\*[^*]+\*', '', response)
-
-    # Remove unwanted phrases (case-insensitive)
-    unwanted_phrases = [
-        "is reflecting on your question",
-        "has something thoughtful to share",
-        "is working on an answer right now",
-    ]
-    for phrase in unwanted_phrases:
-        cleaned = re.sub(re.escape(phrase), "", cleaned, flags=re.IGNORECASE)
-
-    # Remove any leading persona name prefixes, e.g., "Cyclo:" or "cyclo:"
-    for prefix in [f"{persona_name}:", f"{persona_name.lower()}:", f"{persona_name.capitalize()}:" ]:
-        if cleaned.strip().startswith(prefix):
-            cleaned = cleaned.strip()[len(prefix):].strip()
+    return default_sanitizer.sanitize(persona_name, response)
+
+def _persona_channel(message, persona_clients, persona_name):
+    """
+    Returns the channel as seen by the persona's own client, so replies post
+    under that persona's identity. Clients without a gateway cache (worker
+    processes) get a partial channel that can still send and edit. Falls back
+    to the incoming channel.
+    """
+    client = persona_clients.get(persona_name)
+    if client:
+        return client.get_channel(message.channel.id) or client.get_partial_messageable(message.channel.id)
+    return message.channel
+
+async def _typing_until(channel, task):
+    """
+    Shows the typing indicator in channel until task completes.
+    """
+    try:
+        async with channel.typing():
+            await asyncio.wait({task})
+    except Exception as e:
+        print("Typing indicator error:", e)
+
+async def _run_persona(message, persona_clients, outbox, history, persona, prompt_text, channel_id, placeholder_text,
+                       priority=PRIORITY_FIRST):
+    """
+    One persona step of the conversation: placeholder, persona call,
+    sanitize, save to memory, post. Returns (persona_name, sanitized_text).
+
+    Discord output goes through the turn's outbox, so the placeholder send and
+    the reply post/delete overlap with the LLM call of the next step while the
+    channel still sees them in order. In streaming mode the reply is posted on
+    its first chunk and edited in place.
+    """
+    channel = _persona_channel(message, persona_clients, persona)
+    placeholder = outbox.placeholder(message.channel, placeholder_text)
+
+    reply = None
+    on_chunk = None
+    if STREAMING_ENABLED:
+        reply = StreamingReply(
+            channel,
+            render=default_sanitizer.stream(persona).update,
+            placeholder=placeholder,
+            outbox=outbox
+        )
+        on_chunk = reply.update
+
+    call = spawn(
+        call_persona(persona, prompt_text, channel_id, on_chunk=on_chunk, history=history, priority=priority)
+    )
+    spawn(_typing_until(channel, call))
+    name, resp = await call
+    resp = sanitize_persona_response(name, resp)
+    await history.save(name, resp)
+
+    if reply is not None:
+        await reply.finish(resp)
+    else:
+        outbox.delete(placeholder)
+        outbox.send(_persona_channel(message, persona_clients, name), resp)
+    return name, resp
+
+async def _run_governor_merge(message, persona_clients, outbox, history, responses, user_text, channel_id):
+    """
+    Has the Governor merge the persona responses and queues the result, in italics.
+    """
+    channel = _persona_channel(message, persona_clients, "Governor")
+
+    reply = None
+    on_chunk = None
+    if STREAMING_ENABLED:
+        reply = StreamingReply(
+            channel,
+            render=lambda text: f"*{text.strip()}*" if text.strip() else "",
+            outbox=outbox
+        )
+        on_chunk = reply.update
+
+    call = spawn(
+        call_persona_governor(responses, user_text, channel_id, on_chunk=on_chunk, history=history)
+    )
+    spawn(_typing_until(channel, call))
+    with metrics.timer("turn_stage_seconds", stage="governor_merge"):
+        gov_name, gov_text = await call
+    if not gov_text:
+        return
+    if reply is not None:
+        await reply.finish(f"*{gov_text.strip()}*")
+    else:
+        outbox.send(channel, f"*{gov_text.strip()}*")
+
+async def _collect_panel(tasks, user_text, top_k):
+    """
+    Waits for the panel's persona calls, scoring each reply as it arrives,
+    until all are done, PANEL_TIMEOUT passes or enough good replies are in.
+    The calls still running are cancelled. Returns (responses, scores).
+    """
+    fit = persona_fit(user_text)
+    responses, scores = {}, {}
+    pending = set(tasks)
+    deadline = time.monotonic() + PANEL_TIMEOUT
+    while pending and not enough_good(scores, top_k):
+        done, pending = await asyncio.wait(
+            pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
             break
+        for task in done:
+            try:
+                name, resp = task.result()
+            except Exception as e:
+                metrics.inc("errors_total", stage="persona_call")
+                print("Error in panel persona call:", e)
+                continue
+            resp = sanitize_persona_response(name, resp)
+            responses[name] = resp
+            scores[name] = score_response(name, user_text, resp, fit)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        metrics.inc("panel_cancelled_total", len(pending))
+    return responses, scores
+
+async def _run_panel(message, persona_clients, outbox, history, personas, user_text, channel_id, top_k):
+    """
+    Panel turn (see src/panel.py): every persona in personas answers at
+    once and the top_k replies are posted, best first. Only the posted
+    replies are saved to memory.
+    """
+    placeholder = outbox.placeholder(message.channel, "**The panel is thinking...**")
+    tasks = [spawn(call_persona(p, user_text, channel_id, history=history)) for p in personas]
+    collecting = spawn(_collect_panel(tasks, user_text, top_k))
+    spawn(_typing_until(message.channel, collecting))
+    responses, scores = await collecting
+    outbox.delete(placeholder)
+
+    if not responses:
+        outbox.send(message.channel, "**The panel could not answer this time.**")
+        return
+    for name in await rank_responses(user_text, responses, scores, top_k, channel_id=channel_id):
+        await history.save(name, responses[name])
+        outbox.send(_persona_channel(message, persona_clients, name), responses[name])
 
-    return cleaned.strip()
+def _finish_turn(started, flow):
+    """
+    Counts the flow a turn took (A / AB / ABA / ABC, panel, forced, isolated,
+    no_personas, crisis, cancelled) and observes its duration.
+    """
+    metrics.inc("turn_flows_total", flow=flow)
+    metrics.observe("turn_seconds", time.monotonic() - started, flow=flow)
 
-async def handle_governor_message(message, persona_clients):
+async def handle_governor_message(message, persona_clients, burst=None):
     """
     Main aggregator logic.
     Also handles user commands like !private, !new, !add, etc.
+
+    burst is the list of message texts of a debounced burst (see
+    src/debounce.py), ending with message itself. They are answered as one
+    turn but saved to memory as separate messages.
+
+    Each turn runs in a TurnScope (see src/turn_scope.py) with a deadline;
+    a newer message or a !new / !isolate / !reset in the channel cancels it.
+    Crisis detection and the helpline reply run before the scope and are
+    never cancelled.
     """
+    started = time.monotonic()
     channel_id = str(message.channel.id)
-    user_text = message.content.strip()
-    user_author = message.author.display_name
+    burst = [t.strip() for t in burst or [message.content] if t.strip()] or [""]
+    user_text = "\n".join(burst)
     user_id = str(message.author.id)
 
-    # 1) Check if it's a command
+    # 1) Check if it's a command; some cancel the channel's in-flight turns first
     if user_text.startswith("!"):
+        await wait_cancelled(message_arrived(channel_id, user_id, user_text))
         await process_governor_command(message, persona_clients)
         return
 
-    # 2) Crisis detection
-    in_crisis = await crisis_detect(user_text)
+    # 2) Crisis detection. Runs before the turn's scope exists, so neither a
+    # follow-up message nor the deadline can cancel the helpline reply.
+    with metrics.timer("turn_stage_seconds", stage="crisis_check"):
+        in_crisis = await crisis_detect(user_text)
     if in_crisis:
         await message.channel.send(
             "I’m really sorry you’re feeling this way. If you’re considering hurting yourself, please reach out. "
             "Call 988 (US) or visit https://findahelpline.com for help."
         )
+        _finish_turn(started, "crisis")
         return
 
+    # A newer message supersedes older turns (TURN_SUPERSEDE)
+    message_arrived(channel_id, user_id, user_text)
+    outbox = DiscordOutbox()
+    scope = TurnScope(channel_id, user_id)
+    if not await scope.run(_run_turn(message, persona_clients, outbox, started, burst)):
+        outbox.abandon()
+        _finish_turn(started, "cancelled")
+
+async def _run_turn(message, persona_clients, outbox, started, burst):
+    """
+    One turn of the conversation for a (non-command, non-crisis) message or burst.
+    """
+    channel_id = str(message.channel.id)
+    user_text = "\n".join(burst)
+    user_author = message.author.display_name
+
+    # Load the channel history once for the whole turn
+    history = await snapshot_history(channel_id)
+
     # 3) Check for forced personas via @ mention (including @[Prim])
     forced_personas = []
     for p in ["Cyclo", "Emo", "Prim", "Spri"]:
@@ -78,115 +254,91 @@ async def handle_governor_message(message, persona_clients):
 
     if len(forced_personas) == 1:
         iso_p = forced_personas[0]
-        isolate_persona(iso_p)
+        await isolate_persona(channel_id, iso_p)
         await message.channel.send(f"**Isolation mode: only {iso_p} will respond.**")
 
     # If multiple forced => each responds independently
     if len(forced_personas) > 1:
         tasks = []
         for p in forced_personas:
-            tasks.append(asyncio.create_task(call_persona(p, user_text, channel_id)))
-
-        wait_msg = await message.channel.send("**Thinking...**")
-        await asyncio.sleep(2)
-
-        done, pending = await asyncio.wait(tasks, timeout=20)
+            tasks.append(spawn(call_persona(p, user_text, channel_id, history=history)))
+
+        wait_msg = outbox.placeholder(message.channel, "**Thinking...**")
+        waiting = spawn(asyncio.wait(tasks, timeout=20))
+        spawn(_typing_until(message.channel, waiting))
+
+        done, pending = await waiting
+        # Personas that missed the timeout are cancelled rather than left running
+        for task in pending:
+            task.cancel()
+        if pending:
+            metrics.inc("persona_calls_timed_out_total", len(pending))
         responses = {}
         for task in done:
             try:
                 pn, resp = task.result()
                 sanitized = sanitize_persona_response(pn, resp)
                 responses[pn] = sanitized
-                save_memory(channel_id, pn, sanitized)
+                await history.save(pn, sanitized)
             except Exception as e:
+                metrics.inc("errors_total", stage="persona_call")
                 print("Error in forced persona call:", e)
 
-        try:
-            await wait_msg.delete()
-        except:
-            pass
+        outbox.delete(wait_msg)
 
         # Post each forced persona's response
         for pn, text in responses.items():
-            client = persona_clients.get(pn)
-            if client:
-                await client.get_channel(message.channel.id).send(text)
-            else:
-                await message.channel.send(text)
+            outbox.send(_persona_channel(message, persona_clients, pn), text)
 
         # If 2+ forced, Governor merges
-        if len(responses) >= 2 and not is_isolation_mode():
-            gov_name, gov_text = await call_persona_governor(responses, user_text, channel_id)
-            if gov_text:
-                merged_text = f"*{gov_text.strip()}*"
-                gov_client = persona_clients.get("Governor")
-                if gov_client:
-                    await gov_client.get_channel(message.channel.id).send(merged_text)
-                else:
-                    await message.channel.send(merged_text)
+        if len(responses) >= 2 and not await is_isolation_mode(channel_id):
+            await _run_governor_merge(message, persona_clients, outbox, history, responses, user_text, channel_id)
+        await outbox.flush()
+        _finish_turn(started, "forced")
         return
 
-    # 4) Save user message
-    save_memory(channel_id, user_author, user_text)
+    # 4) Save user message(s)
+    for text in burst:
+        await history.save(user_author, text)
 
     # 5) If isolation is active, only that one persona responds
-    if is_isolation_mode():
-        actives = get_active_personas()
-        if not actives:
-            await message.channel.send("**No active personas.**")
-            return
-
-        p_isolated = actives[0]
-        wait_msg = await message.channel.send("**Thinking...**")
-        await asyncio.sleep(2)
-
-        iso_name, iso_resp = await call_persona(p_isolated, user_text, channel_id)
-        iso_resp = sanitize_persona_response(iso_name, iso_resp)
-        save_memory(channel_id, iso_name, iso_resp)
-
-        try:
-            await wait_msg.delete()
-        except:
-            pass
-
-        client_iso = persona_clients.get(iso_name)
-        if client_iso:
-            await client_iso.get_channel(message.channel.id).send(iso_resp)
+    if await is_isolation_mode(channel_id):
+        actives = await get_active_personas(channel_id)
+        if actives:
+            p_isolated = actives[0]
+            await _run_persona(message, persona_clients, outbox, history, p_isolated, user_text, channel_id, "**Thinking...**")
+            flow = "isolated"
         else:
-            await message.channel.send(iso_resp)
+            outbox.send(message.channel, "**No active personas.**")
+            flow = "no_personas"
+        await outbox.flush()
+        _finish_turn(started, flow)
         return
 
     # 6) Otherwise do classification => random multi-turn
-    actives = get_active_personas()
-    c_list = await classify_personas(user_text)
+    actives = await get_active_personas(channel_id)
+    with metrics.timer("turn_stage_seconds", stage="classification"):
+        c_list = await classify_personas(user_text, channel_id)
     c_list = [p for p in c_list if p in actives]
     if not c_list:
         c_list = actives
 
-    wait_msg = await message.channel.send("**Thinking...**")
-    await asyncio.sleep(2)
+    # Panel mode: all classified personas at once, best reply(s) posted
+    panel_size = await get_panel_size(channel_id)
+    if panel_size:
+        await _run_panel(message, persona_clients, outbox, history, c_list, user_text, channel_id, panel_size)
+        await outbox.flush()
+        _finish_turn(started, "panel")
+        return
 
-    # Pick persona A
+    # Pick persona A and post A's response
     A = random.choice(c_list)
-    A_name, A_resp = await call_persona(A, user_text, channel_id)
-    A_resp = sanitize_persona_response(A_name, A_resp)
-    save_memory(channel_id, A_name, A_resp)
-
-    try:
-        await wait_msg.delete()
-    except:
-        pass
-
-    # Post A's response
-    clientA = persona_clients.get(A_name)
-    if clientA:
-        await clientA.get_channel(message.channel.id).send(A_resp)
-    else:
-        await message.channel.send(A_resp)
+    A_name, A_resp = await _run_persona(message, persona_clients, outbox, history, A, user_text, channel_id, "**Thinking...**")
 
     # Random multi-turn approach: A; or (A,B); or (A,B,A); or (A,B,C)
     flow_roll = random.random()
     responses_map = { A_name: A_resp }
+    flow = "A"
 
     if flow_roll <= 0.33:
         pass  # Only A responds.
@@ -195,26 +347,14 @@ async def handle_governor_message(message, persona_clients):
         c_list_2 = [p for p in c_list if p != A_name]
         if c_list_2:
             B = random.choice(c_list_2)
-            wait2 = await message.channel.send("**Thinking more...**")
-            await asyncio.sleep(2)
-
             second_input = f"User said:\n{user_text}\n\nThe first response was:\n{A_resp}"
-            B_name, B_resp = await call_persona(B, second_input, channel_id)
-            B_resp = sanitize_persona_response(B_name, B_resp)
-            save_memory(channel_id, B_name, B_resp)
-
-            try:
-                await wait2.delete()
-            except:
-                pass
-
-            clientB = persona_clients.get(B_name)
-            if clientB:
-                await clientB.get_channel(message.channel.id).send(B_resp)
-            else:
-                await message.channel.send(B_resp)
+            B_name, B_resp = await _run_persona(
+                message, persona_clients, outbox, history, B, second_input, channel_id, "**Thinking more...**",
+                priority=PRIORITY_FOLLOWUP
+            )
 
             responses_map[B_name] = B_resp
+            flow = "AB"
 
             follow_roll = random.random()
             if flow_roll <= 0.50:
@@ -223,59 +363,43 @@ async def handle_governor_message(message, persona_clients):
                 # Third response
                 if follow_roll < 0.5:
                     # (A,B,A)
-                    third_wait = await message.channel.send("**A brief follow-up...**")
-                    await asyncio.sleep(2)
-
                     third_input = (
                         f"Second response:\n{B_resp}\n\n"
                         f"Please provide a short final follow-up, {A_name}."
                     )
-                    name3, resp3 = await call_persona(A_name, third_input, channel_id)
+                    name3, resp3 = await _run_persona(
+                        message, persona_clients, outbox, history, A_name, third_input, channel_id, "**A brief follow-up...**",
+                        priority=PRIORITY_FOLLOWUP
+                    )
+                    flow = "ABA"
                 else:
                     # (A,B,C) if possible
                     c_list_3 = [p for p in c_list_2 if p != B_name]
                     if not c_list_3:
                         c_list_3 = [A_name]
                     C = random.choice(c_list_3)
-                    third_wait = await message.channel.send("**Another perspective...**")
-                    await asyncio.sleep(2)
-
                     third_input = (
                         f"User said:\n{user_text}\n\n"
                         f"First response:\n{A_resp}\n\n"
                         f"Second response:\n{B_resp}\n\n"
                         f"Please offer your unique perspective, {C}."
                     )
-                    name3, resp3 = await call_persona(C, third_input, channel_id)
-
-                resp3 = sanitize_persona_response(name3, resp3)
-                save_memory(channel_id, name3, resp3)
-
-                try:
-                    await third_wait.delete()
-                except:
-                    pass
-
-                client3 = persona_clients.get(name3)
-                if client3:
-                    await client3.get_channel(message.channel.id).send(resp3)
-                else:
-                    await message.channel.send(resp3)
+                    name3, resp3 = await _run_persona(
+                        message, persona_clients, outbox, history, C, third_input, channel_id, "**Another perspective...**",
+                        priority=PRIORITY_FOLLOWUP
+                    )
+                    flow = "ABC"
 
                 responses_map[name3] = resp3
 
     # Governor merges if more than one distinct persona responded
-    if not is_isolation_mode() and len(responses_map.keys()) > 1:
-        gov_name, gov_text = await call_persona_governor(responses_map, user_text, channel_id)
-        if gov_text:
-            final_text = f"*{gov_text.strip()}*"
-            gov_client = persona_clients.get("Governor")
-            if gov_client:
-                await gov_client.get_channel(message.channel.id).send(final_text)
-            else:
-                await message.channel.send(final_text)
+    if not await is_isolation_mode(channel_id) and len(responses_map.keys()) > 1:
+        await _run_governor_merge(message, persona_clients, outbox, history, responses_map, user_text, channel_id)
+    await outbox.flush()
+    _finish_turn(started, flow)
 
 async def process_governor_command(message, persona_clients):
+    channel_id = str(message.channel.id)
     user_text = message.content.strip()
     parts = user_text.split()
     cmd = parts[0].lower() if parts else None
@@ -284,7 +408,7 @@ async def process_governor_command(message, persona_clients):
     if cmd == "!remove":
         if args:
             persona = args[0].lstrip("@").capitalize()
-            remove_persona(persona)
+            await remove_persona(channel_id, persona)
             await message.channel.send(f"**Removed {persona} from active personas.**")
         else:
             await message.channel.send("**Usage: !remove [PersonaName]**")
@@ -293,29 +417,45 @@ async def process_governor_command(message, persona_clients):
     elif cmd == "!add":
         if args:
             persona = args[0].lstrip("@").capitalize()
-            add_persona(persona)
+            await add_persona(channel_id, persona)
             await message.channel.send(f"**Added {persona} to active personas.**")
         else:
             await message.channel.send("**Usage: !add [PersonaName]**")
         return
 
     elif cmd == "!reset":
-        reset_personas()
+        await reset_personas(channel_id)
         await message.channel.send("**All personas reset to active. Isolation mode off.**")
         return
 
     elif cmd == "!isolate":
         if args:
             persona = args[0].lstrip("@").capitalize()
-            isolate_persona(persona)
+            await isolate_persona(channel_id, persona)
             await message.channel.send(f"**Isolation mode: only {persona} will respond.**")
         else:
             await message.channel.send("**Usage: !isolate [PersonaName]**")
         return
 
+    elif cmd == "!panel":
+        arg = args[0].lower() if args else str(PANEL_TOP_K)
+        if arg == "off":
+            await set_panel_mode(channel_id, 0)
+            await message.channel.send("**Panel mode off.**")
+        elif arg.isdigit() and int(arg) > 0:
+            top_k = min(int(arg), len(MAIN_PERSONAS))
+            await set_panel_mode(channel_id, top_k)
+            await message.channel.send(
+                f"**Panel mode on: relevant personas answer at once and the best {top_k} "
+                f"{'reply is' if top_k == 1 else 'replies are'} posted.**"
+            )
+        else:
+            await message.channel.send("**Usage: !panel [number of replies | off]**")
+        return
+
     elif cmd == "!new":
-        clear_memory(str(message.channel.id))
-        reset_personas()
+        await clear_memory_async(channel_id)
+        await reset_personas(channel_id)
         await message.channel.send("**Memory cleared and all personas reset.**")
         return
 
@@ -326,6 +466,7 @@ async def process_governor_command(message, persona_clients):
             "`!add [PersonaName]` — Re-enable a persona.\n"
             "`!reset` — Reset to all personas active.\n"
             "`!isolate [PersonaName]` — Only that persona is active.\n"
+            "`!panel [N|off]` — Personas answer at once, only the best N replies are posted.\n"
             "`!commands` — Show this help.\n"
             "`!new` — Reset memory & reset all personas.\n"
             "`!private` — Create a private conversation with all bots.\n"
@@ -344,6 +485,19 @@ async def process_governor_command(message, persona_clients):
         )
         return
 
+async def _channel_exists(client, channel_id):
+    """
+    False once Discord reports the channel deleted (or no longer visible to
+    the bot); other errors leave the stored channel in place.
+    """
+    try:
+        await client.fetch_channel(channel_id)
+    except (discord.NotFound, discord.Forbidden):
+        return False
+    except discord.HTTPException as e:
+        print("Private channel lookup error:", e)
+    return True
+
 async def handle_private_command(message, persona_clients):
     """
     Creates (or finds) a private channel for the user, with read/write
@@ -353,17 +507,16 @@ async def handle_private_command(message, persona_clients):
     author = message.author
     user_id = str(author.id)
 
-    # If a channel already exists for this user, inform them
-    if user_id in private_channels:
-        channel_id = private_channels[user_id]
-        existing_channel = guild.get_channel(channel_id)
-        if existing_channel:
+    # If a channel already exists for this user, inform them. It is fetched
+    # over REST: worker processes have no channel cache.
+    channel_id = await ar.hget(PRIVATE_CHANNELS_KEY, user_id)
+    if channel_id:
+        if await _channel_exists(persona_clients["Governor"], int(channel_id)):
             await message.channel.send(
                 f"**You already have a private channel:** <#{channel_id}>"
             )
             return
-        else:
-            del private_channels[user_id]
+        await ar.hdel(PRIVATE_CHANNELS_KEY, user_id)
 
     # Create a new private channel named after the user
     overwrites = {
@@ -382,7 +535,7 @@ async def handle_private_command(message, persona_clients):
         name=f"{author.name}-private",
         overwrites=overwrites
     )
-    private_channels[user_id] = private_channel.id
+    await ar.hset(PRIVATE_CHANNELS_KEY, user_id, private_channel.id)
 
     await message.channel.send(
         f"**Private channel created:** <#{private_channel.id}>"
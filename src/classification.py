@@ -1,8 +1,36 @@
 import os
-from openai import OpenAI
+import re
+import json
+import time
+import hashlib
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
-import asyncio
+from src import metrics
+from src.llm_provider import openai_chat
+from src.local_classifier import classify_local
+from src.model_registry import model_for
+from src.memory_manager import ar
+from src.ttl_cache import TTLCache
+
+# Local classifier results at or above this confidence skip the LLM call.
+# Off by default (above 1.0: the local classifier is not even run): the shipped
+# weights come from the small hand-labelled seed set and are overconfident on
+# real traffic. Set it to the value scripts/train_classifier.py recommends
+# after training on LLM-labelled transcripts.
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "1.01"))
+
+# Classification result cache, keyed on normalized message text.
+# CLASSIFY_CACHE_REDIS=1 also shares results between instances through Redis.
+CLASSIFY_CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "2000"))
+CLASSIFY_CACHE_TTL = float(os.getenv("CLASSIFY_CACHE_TTL", "3600"))
+CLASSIFY_CACHE_REDIS = os.getenv("CLASSIFY_CACHE_REDIS", "0") == "1"
+
+ALL_PERSONAS = ["Cyclo", "Emo", "Prim", "Spri"]
+
+_cache = TTLCache(CLASSIFY_CACHE_SIZE, CLASSIFY_CACHE_TTL)
+
+# Discord user/role/channel mentions and @everyone/@here.
+_MENTION_RE = re.compile(r"<(?:@[!&]?|#)\d+>|@(?:everyone|here)\b")
+_SPACE_RE = re.compile(r"\s+")
 
 
 classification_prompt = """
@@ -11,30 +39,116 @@ Given the user’s message, decide which persona(s) are most relevant.
 Output a comma-separated list with no extra text.
 """
 
-async def classify_personas(user_text):
+def normalize_for_cache(user_text):
+    """
+    Cache key text: mentions stripped, case-folded, whitespace collapsed.
+    """
+    text = _MENTION_RE.sub(" ", user_text)
+    return _SPACE_RE.sub(" ", text.casefold()).strip()
+
+async def _cache_lookup(key):
+    entry = _cache.get(key)
+    if entry is None and CLASSIFY_CACHE_REDIS:
+        try:
+            raw = await ar.get(f"classify:{key}")
+        except Exception as e:
+            print("Classification cache read error:", e)
+            raw = None
+        if raw:
+            entry = json.loads(raw)
+            _cache.set(key, entry)
+    return entry
+
+async def _cache_store(key, entry):
+    _cache.set(key, entry)
+    if CLASSIFY_CACHE_REDIS:
+        try:
+            await ar.set(f"classify:{key}", json.dumps(entry), ex=int(CLASSIFY_CACHE_TTL))
+        except Exception as e:
+            print("Classification cache write error:", e)
+
+def _export_cache_size():
+    metrics.set_gauge("classification_cache_entries", len(_cache))
+
+metrics.register_collector(_export_cache_size)
+
+async def classify_personas(user_text, channel_id=None):
+    """
+    Returns the relevant personas for a message.
+
+    Repeated messages are answered from the classification cache. Otherwise
+    the local classifier is tried first, escalating to the LLM classifier
+    only when its confidence is below LOCAL_CLASSIFIER_THRESHOLD.
     """
-    Calls GPT-4 using openai.ChatCompletion.create (new interface),
-    wrapped in run_in_executor for asynchronous usage.
+    normalized = normalize_for_cache(user_text)
+    key = hashlib.sha1(normalized.encode("utf-8")).hexdigest() if normalized else None
+
+    if key is not None:
+        entry = await _cache_lookup(key)
+        if entry is not None:
+            metrics.inc("classification_cache_requests_total", result="hit")
+            metrics.inc("classification_cache_saved_seconds_total", entry["latency"])
+            return list(entry["labels"])
+        metrics.inc("classification_cache_requests_total", result="miss")
+
+    start = time.monotonic()
+    labels, cacheable = await _classify_uncached(user_text, channel_id)
+    if key is not None and cacheable:
+        await _cache_store(key, {"labels": labels, "latency": time.monotonic() - start})
+    return labels
+
+async def _classify_uncached(user_text, channel_id=None):
+    """
+    Returns (labels, cacheable). Fallback results after an LLM error are not cacheable.
+    """
+    if LOCAL_CLASSIFIER_THRESHOLD <= 1.0:
+        labels, confidence = classify_local(user_text)
+        if labels and confidence >= LOCAL_CLASSIFIER_THRESHOLD:
+            metrics.inc("classification_total", source="local")
+            return labels, True
+
+    metrics.inc("classification_total", source="llm")
+    try:
+        labels = await _request_llm_labels(user_text, channel_id)
+    except Exception as e:
+        metrics.inc("errors_total", stage="classification")
+        print("Classification error:", e)
+        return list(ALL_PERSONAS), False
+    if not labels:
+        return list(ALL_PERSONAS), False
+    return labels, True
+
+async def classify_personas_llm(user_text):
+    """
+    Calls the registry's "classifier" model through the shared async provider layer.
     """
-    loop = asyncio.get_running_loop()
     try:
-        resp = await loop.run_in_executor(
-            None,
-            lambda: client.chat.completions.create(model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a persona classifier."},
-                {"role": "user", "content": f"User text:\n{user_text}\n\n{classification_prompt}"}
-            ],
-            max_tokens=50,
-            temperature=0.1)
-        )
-        text = resp.choices[0].message.content.strip()
-        # Parse the CSV output into a list
-        persona_list = [x.strip() for x in text.split(",")]
-        valid_personas = [p for p in persona_list if p in ["Cyclo", "Emo", "Prim", "Spri"]]
+        valid_personas = await _request_llm_labels(user_text)
         if not valid_personas:
-            return ["Cyclo", "Emo", "Prim", "Spri"]
+            return list(ALL_PERSONAS)
         return valid_personas
     except Exception as e:
         print("Classification error:", e)
-        return ["Cyclo", "Emo", "Prim", "Spri"]
+        return list(ALL_PERSONAS)
+
+async def _request_llm_labels(user_text, channel_id=None):
+    """
+    Asks the "classifier" model for the relevant personas and returns the
+    valid ones (possibly none). Raises on provider errors.
+    """
+    spec = model_for("classifier")
+    resp = await openai_chat(
+        model=spec.model,
+        messages=[
+            {"role": "system", "content": "You are a persona classifier."},
+            {"role": "user", "content": f"User text:\n{user_text}\n\n{classification_prompt}"}
+        ],
+        max_tokens=spec.max_tokens,
+        temperature=spec.temperature,
+        timeout=spec.timeout,
+        channel_id=channel_id
+    )
+    text = resp.choices[0].message.content.strip()
+    # Parse the CSV output into a list
+    persona_list = [x.strip() for x in text.split(",")]
+    return [p for p in persona_list if p in ALL_PERSONAS]
@@ -0,0 +1,186 @@
+# src/context_builder.py
+"""
+Builds the history part of each persona prompt within a token budget.
+
+For every call, history entries are taken newest first until the input budget
+(CONTEXT_TOKEN_BUDGET, after the system prompt, the new input and the summary)
+or CONTEXT_MAX_ENTRIES is reached. Entries whose text already appears in the
+new input are skipped: the user's own message saved just before the call, or
+the earlier replies quoted in a follow-up prompt.
+
+Older entries are replaced by a rolling per-channel summary kept in Redis.
+When enough entries have fallen out of the window without being summarized,
+the summary is refreshed by a background LLM call at the lowest scheduler
+priority; the turn itself never waits for it.
+
+Token counts are stored with each history entry (src/token_count.py).
+"""
+import os
+import asyncio
+from collections import namedtuple
+
+from src import metrics
+from src.llm_provider import openai_chat, anthropic_messages
+from src.llm_scheduler import PRIORITY_BACKGROUND
+from src.model_registry import model_for
+from src.memory_manager import (
+    load_entries_async, load_summary_async, save_summary_async, HISTORY_MAX_ENTRIES
+)
+from src.token_count import count_tokens
+
+# Input tokens allowed per persona call (system prompt + summary + history + new input).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+# Most history entries sent raw, whatever the budget.
+CONTEXT_MAX_ENTRIES = int(os.getenv("CONTEXT_MAX_ENTRIES", "20"))
+# Quoted text shorter than this only counts as a duplicate on an exact match.
+CONTEXT_DEDUPE_MIN_CHARS = int(os.getenv("CONTEXT_DEDUPE_MIN_CHARS", "40"))
+
+CONTEXT_SUMMARY_ENABLED = os.getenv("CONTEXT_SUMMARY_ENABLED", "1") == "1"
+# Unsummarized entries outside the window needed before a refresh is worth it.
+CONTEXT_SUMMARY_MIN_ENTRIES = int(os.getenv("CONTEXT_SUMMARY_MIN_ENTRIES", "6"))
+
+summary_prompt = """
+You maintain a running summary of a group chat between a user and several personas.
+Update the summary with the new messages. Keep names, facts, open questions and the
+user's goals; drop small talk. Reply with the updated summary only, under 150 words.
+"""
+
+Context = namedtuple("Context", ["summary", "entries"])
+
+_refreshing = set()
+_background = set()
+
+def _entry_tokens(entry):
+    # The author prefix and message framing cost a few tokens on top of the content.
+    tokens = entry.tokens if entry.tokens is not None else count_tokens(entry.content)
+    return tokens + 6
+
+def _is_duplicate(entry, user_text):
+    content = entry.content.strip()
+    if content == user_text.strip():
+        return True
+    return len(content) >= CONTEXT_DEDUPE_MIN_CHARS and content in user_text
+
+async def build_context(channel_id, entries, system_prompt, user_text, budget=None):
+    """
+    Picks the summary and the history entries (oldest first) for one call.
+
+    Parameters:
+        channel_id (str): Channel the call is for.
+        entries (list): The channel history as HistoryEntry records, oldest first.
+        system_prompt (str): The persona's system prompt.
+        user_text (str): The new input of the call.
+        budget (int): Input token budget; defaults to CONTEXT_TOKEN_BUDGET.
+
+    Returns:
+        Context: (summary text or None, list of HistoryEntry records to send).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    summary = await load_summary_async(channel_id) if CONTEXT_SUMMARY_ENABLED else None
+
+    # Entries up to the one the summary covers are already in the summary.
+    start = _covered_until(entries, summary) if summary else 0
+    candidates = entries[start:]
+
+    remaining = budget - count_tokens(system_prompt) - count_tokens(user_text)
+    if summary:
+        remaining -= count_tokens(summary["text"])
+
+    kept = []
+    cut = 0  # candidates[:cut] fell out of the window
+    for i in range(len(candidates) - 1, -1, -1):
+        entry = candidates[i]
+        if _is_duplicate(entry, user_text):
+            metrics.inc("context_entries_deduped_total")
+            continue
+        cost = _entry_tokens(entry)
+        if len(kept) >= CONTEXT_MAX_ENTRIES or cost > remaining:
+            cut = i + 1
+            break
+        remaining -= cost
+        kept.append(entry)
+    kept.reverse()
+
+    dropped = candidates[:cut]
+    metrics.inc("context_builds_total")
+    metrics.inc("context_entries_dropped_total", len(dropped))
+    metrics.inc("context_prompt_tokens_total", budget - remaining)
+    if CONTEXT_SUMMARY_ENABLED and len(dropped) >= CONTEXT_SUMMARY_MIN_ENTRIES:
+        _schedule_refresh(channel_id, summary, dropped)
+
+    return Context(summary["text"] if summary else None, kept)
+
+def _covered_until(entries, summary):
+    """
+    Index just past the entry the summary covers, or 0 if it is not in entries.
+    The entry is matched on its timestamp and author as well as its text, and
+    the earliest match wins: a repeated line can at worst resend entries that
+    are already summarized, never skip unsummarized ones.
+    """
+    ts = int(summary.get("covers_ts") or 0)
+    for i, entry in enumerate(entries):
+        if entry.text != summary.get("covers"):
+            continue
+        # Legacy entries (ts 0) and older summaries can only match on text.
+        if not ts or (entry.ts == ts and entry.author == summary.get("covers_author")):
+            return i + 1
+    return 0
+
+def _schedule_refresh(channel_id, summary, dropped):
+    if channel_id in _refreshing:
+        return
+    _refreshing.add(channel_id)
+    task = asyncio.create_task(_refresh_summary(channel_id, summary, dropped))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def _summarize(spec, content, channel_id):
+    """
+    Calls the "summarizer" model on the provider the registry names for it.
+    """
+    if spec.provider == "anthropic":
+        response = await anthropic_messages(
+            model=spec.model,
+            system=summary_prompt,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=spec.max_tokens,
+            temperature=spec.temperature,
+            timeout=spec.timeout,
+            priority=PRIORITY_BACKGROUND,
+            channel_id=channel_id
+        )
+        return response.content[0].text.strip()
+    completion = await openai_chat(
+        model=spec.model,
+        messages=[
+            {"role": "system", "content": summary_prompt},
+            {"role": "user", "content": content}
+        ],
+        max_tokens=spec.max_tokens,
+        temperature=spec.temperature,
+        timeout=spec.timeout,
+        priority=PRIORITY_BACKGROUND,
+        channel_id=channel_id
+    )
+    return completion.choices[0].message.content.strip()
+
+async def _refresh_summary(channel_id, summary, dropped):
+    """
+    Folds the dropped entries (HistoryEntry records) into the channel's
+    summary (background task).
+    """
+    try:
+        spec = model_for("summarizer")
+        previous = summary["text"] if summary else "(none yet)"
+        content = f"Current summary:\n{previous}\n\nNew messages:\n" + "\n".join(entry.text for entry in dropped)
+        text = await _summarize(spec, content, channel_id)
+        # Skip the write if the history was cleared (e.g. !new) in the meantime.
+        current = await load_entries_async(channel_id, limit=HISTORY_MAX_ENTRIES // 2)
+        if text and dropped[-1] in current:
+            await save_summary_async(channel_id, text, dropped[-1])
+            metrics.inc("context_summary_refresh_total", result="ok")
+    except Exception as e:
+        metrics.inc("context_summary_refresh_total", result="error")
+        print("Summary refresh error:", e)
+    finally:
+        _refreshing.discard(channel_id)
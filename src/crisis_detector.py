@@ -1,16 +1,202 @@
 # src/crisis_detector.py
 """
-Crisis detection with a simple keyword approach for strong suicidal or self-harm ideation.
+Crisis detection for strong suicidal or self-harm ideation.
+
+Phrases are loaded from a data file and compiled once, at import, into an
+Aho-Corasick automaton. Each message is normalized and scanned in a single
+pass, so the cost per character stays constant however long the phrase list
+grows.
+
+Phrases ending in "*" match anywhere, inside longer words too, like the old
+`phrase in text.lower()` check did ("#suicidewatch", "suicides"). Every
+SUICIDE_KEYWORDS entry is such a phrase, so anything the old check flagged
+is still flagged (scripts/check_crisis_baseline.py verifies this). Other
+phrases match on word boundaries only.
 """
+import os
+import re
+import unicodedata
+from collections import deque
 
 SUICIDE_KEYWORDS = [
     "kill myself", "suicide", "end my life", "die by my own hand",
     "hurt myself", "self-harm", "overdose", "take my life"
 ]
 
+CRISIS_PHRASES_PATH = os.getenv(
+    "CRISIS_PHRASES_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "crisis_phrases.txt")
+)
+
+# Leetspeak / look-alike characters folded to the letter they stand for.
+_LEET_DIGITS = str.maketrans("0134578", "oieastb")
+_LEET_SYMBOLS = str.maketrans("@$!|+", "asiit")
+# Symbols only count as letters when followed by one ("$uicide", not "help!").
+_SYMBOL_IN_WORD_RE = re.compile(r"[@$!|+](?=[a-z0-9])")
+# Punctuation inside a word is dropped ("s.u.i.c.i.d.e", "self-harm", "don't").
+_JOINER_RE = re.compile(r"(?<=[a-z0-9])[.\-_*'’`~]+(?=[a-z0-9])")
+# "1" is both "i" and "l" in leetspeak; text containing it is scanned both ways.
+_LEET_ONE_AS_L = str.maketrans("1", "l")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+# Runs of three or more of a letter ("suiciiiide"); doubles are real spelling.
+_REPEAT_RE = re.compile(r"(.)\1{2,}")
+
+# Irregular or spelling-changing inflections for "~" words in the phrase file.
+_IRREGULAR = {
+    "take": ["takes", "took", "taken", "taking"],
+    "hang": ["hangs", "hanged", "hung", "hanging"],
+    "cut": ["cuts", "cutting"],
+    "hurt": ["hurts", "hurting"],
+    "die": ["dies", "died", "dying"],
+}
+
+def normalize(text, one_as_l=False):
+    """
+    Canonical form used for both phrases and messages: accents stripped,
+    case-folded, leetspeak folded ("1" as "i", or as "l" with one_as_l),
+    punctuation inside words removed, other punctuation turned into single
+    spaces and runs of three or more of a character collapsed.
+    """
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold()
+    text = _SYMBOL_IN_WORD_RE.sub(lambda m: m.group(0).translate(_LEET_SYMBOLS), text)
+    if one_as_l:
+        text = text.translate(_LEET_ONE_AS_L)
+    text = text.translate(_LEET_DIGITS)
+    text = _JOINER_RE.sub("", text)
+    text = _NON_ALNUM_RE.sub(" ", text)
+    return _REPEAT_RE.sub(r"\1", text).strip()
+
+def message_forms(text):
+    """
+    The normalized forms of a message to scan (two when it contains a "1").
+    """
+    if "1" in text:
+        return [normalize(text), normalize(text, one_as_l=True)]
+    return [normalize(text)]
+
+def _inflections(word):
+    if word in _IRREGULAR:
+        return [word] + _IRREGULAR[word]
+    stem = word[:-1] if word.endswith("e") else word
+    return [word, word + "s", stem + "ed", stem + "ing"]
+
+def expand_phrase(phrase):
+    """
+    All surface variants of one phrase-file entry (inflections, joined form).
+    """
+    variants = [[]]
+    for word in phrase.rstrip("*").split():
+        forms = _inflections(word[:-1]) if word.endswith("~") else [word]
+        variants = [v + [f] for v in variants for f in forms]
+    result = set()
+    for words in variants:
+        spaced = normalize(" ".join(words).replace("-", " "))
+        if spaced:
+            result.add(spaced)
+            result.add(spaced.replace(" ", ""))
+    return result
+
+def load_phrases(path=CRISIS_PHRASES_PATH):
+    """
+    Reads the phrase file (one phrase per line, '#' comments). Falls back to
+    SUICIDE_KEYWORDS (as substring phrases) if the file is missing.
+    """
+    if not os.path.exists(path):
+        return [f"{keyword}*" for keyword in SUICIDE_KEYWORDS]
+    phrases = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                phrases.append(line)
+    return phrases
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over normalized phrases.
+
+    Whole-word patterns are stored padded with spaces and every message is
+    scanned padded the same way, so they start and end on a word boundary.
+    Substring phrases (ending in "*") are stored unpadded and match anywhere.
+    """
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]
+        for phrase in phrases:
+            for variant in expand_phrase(phrase):
+                self._add(variant if phrase.endswith("*") else f" {variant} ", phrase)
+        self._build()
+
+    def _add(self, pattern, phrase):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+            state = nxt
+        self._out[state] = phrase
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[nxt] is None:
+                    self._out[nxt] = self._out[self._fail[nxt]]
+
+    def iter_matches(self, normalized_text):
+        """
+        Yields the source phrase for every match in already-normalized text.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in f" {normalized_text} ":
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] is not None:
+                yield out[state]
+                # Restart, on this space if it ended the match, so the next word can begin a new one.
+                state = goto[0].get(" ", 0) if ch == " " else 0
+
+    def search(self, text):
+        """
+        Returns the first matching phrase in text, or None.
+        """
+        for form in message_forms(text):
+            for phrase in self.iter_matches(form):
+                return phrase
+        return None
+
+    @property
+    def num_states(self):
+        return len(self._goto)
+
+_matcher = PhraseMatcher(load_phrases())
+
+def find_crisis_phrases(text):
+    """
+    Returns every crisis phrase found in text (by its phrase-file entry).
+    """
+    found = []
+    for form in message_forms(text):
+        found += [p for p in _matcher.iter_matches(form) if p not in found]
+    return found
+
 async def crisis_detect(text: str) -> bool:
-    text_lower = text.lower()
-    for phrase in SUICIDE_KEYWORDS:
-        if phrase in text_lower:
-            return True
-    return False
+    return _matcher.search(text) is not None
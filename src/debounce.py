@@ -0,0 +1,113 @@
+# src/debounce.py
+"""
+Per-author burst coalescing (debounce) for incoming messages.
+
+Users often send several short messages in a row. With DEBOUNCE_WINDOW_MS set,
+messages from the same author in the same channel are held until the author
+has been quiet for the window, then handed over together as one burst, so the
+persona pipeline runs once instead of once per message. A typing event from
+the author while a burst is pending pushes the deadline out by
+DEBOUNCE_TYPING_MS; no burst is held longer than DEBOUNCE_MAX_MS in total.
+
+The window defaults to 0, which turns debouncing off: every message is handed
+over on its own, immediately.
+"""
+import os
+import asyncio
+
+from src import metrics
+
+DEBOUNCE_WINDOW_MS = int(os.getenv("DEBOUNCE_WINDOW_MS", "0"))
+DEBOUNCE_TYPING_MS = int(os.getenv("DEBOUNCE_TYPING_MS", "3000"))
+DEBOUNCE_MAX_MS = int(os.getenv("DEBOUNCE_MAX_MS", "8000"))
+
+class _Burst:
+    __slots__ = ("items", "started", "deadline", "task")
+
+    def __init__(self, now):
+        self.items = []
+        self.started = now
+        self.deadline = now
+        self.task = None
+
+class Debouncer:
+    """
+    Groups items per key (e.g. (channel_id, author_id)) and calls
+    flush(items) once per burst, with the items in arrival order.
+
+    Parameters:
+        flush (coroutine function): Receives the list of items of one burst.
+        window_ms (int): Quiet period that ends a burst; 0 disables debouncing.
+        typing_ms (int): How far a typing event pushes the deadline out.
+        max_ms (int): Upper bound on how long a burst is held.
+    """
+
+    def __init__(self, flush, window_ms=None, typing_ms=None, max_ms=None):
+        self.flush = flush
+        self.window = (DEBOUNCE_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.typing_window = (DEBOUNCE_TYPING_MS if typing_ms is None else typing_ms) / 1000
+        self.max_hold = (DEBOUNCE_MAX_MS if max_ms is None else max_ms) / 1000
+        self._pending = {}
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    async def submit(self, key, item, hold=True):
+        """
+        Adds item to the key's pending burst. With hold=False (e.g. commands)
+        the pending burst is flushed right away and item is handled on its
+        own after it.
+        """
+        if not self.enabled:
+            await self._run_flush([item])
+            return
+        if not hold:
+            burst = self._pending.pop(key, None)
+            if burst is not None:
+                burst.task.cancel()
+                await self._run_flush(burst.items)
+            await self._run_flush([item])
+            return
+
+        now = asyncio.get_running_loop().time()
+        burst = self._pending.get(key)
+        if burst is None:
+            burst = _Burst(now)
+            self._pending[key] = burst
+            burst.task = asyncio.create_task(self._wait_and_flush(key, burst))
+        burst.items.append(item)
+        self._extend(burst, now + self.window)
+
+    def typing(self, key):
+        """
+        Notes that the key's author is typing; extends a pending burst.
+        """
+        burst = self._pending.get(key)
+        if burst is not None:
+            self._extend(burst, asyncio.get_running_loop().time() + self.typing_window)
+
+    def _extend(self, burst, deadline):
+        burst.deadline = min(max(burst.deadline, deadline), burst.started + self.max_hold)
+
+    async def _wait_and_flush(self, key, burst):
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = burst.deadline - loop.time()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self._pending.get(key) is burst:
+            del self._pending[key]
+        await self._run_flush(burst.items)
+
+    async def _run_flush(self, items):
+        metrics.inc("debounce_runs_total")
+        if len(items) > 1:
+            # Pipeline runs saved by merging this burst.
+            metrics.inc("debounce_collapsed_runs_total", len(items) - 1)
+            print(f"Debounce: merged {len(items)} messages into one run")
+        try:
+            await self.flush(items)
+        except Exception as e:
+            print("Debounced handler error:", e)
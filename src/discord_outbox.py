@@ -0,0 +1,111 @@
+# src/discord_outbox.py
+"""
+Ordered, non-blocking Discord output for one conversation turn.
+
+Sends and deletes are queued as background tasks that run strictly one after
+another, so the channel sees messages in the same order as before while the
+aggregator is already waiting on the next LLM call. The tasks belong to the
+turn's scope (see src/turn_scope.py): a cancelled turn stops posting.
+"""
+import asyncio
+
+from src import metrics
+from src.turn_scope import spawn
+
+async def _delete_quietly(message):
+    try:
+        await message.delete()
+    except Exception as e:
+        print("Placeholder cleanup error:", e)
+
+class DiscordOutbox:
+    """
+    Serializes Discord operations for a single turn without making the caller wait.
+
+    Every submitted operation starts only after the previous one finished
+    (successfully or not). Failures are logged and never break the chain.
+    """
+
+    def __init__(self):
+        self._tail = None
+        self._background = set()
+        self._placeholders = set()
+
+    def submit(self, make_coro):
+        """
+        Queues make_coro() behind everything submitted so far.
+        Returns a task resolving to its result (None if it failed).
+        """
+        previous = self._tail
+
+        async def runner():
+            if previous is not None:
+                await asyncio.wait({previous})
+            try:
+                with metrics.timer("turn_stage_seconds", stage="discord_send"):
+                    return await make_coro()
+            except Exception as e:
+                metrics.inc("errors_total", stage="discord_send")
+                print("Discord send error:", e)
+                return None
+
+        self._tail = spawn(runner())
+        return self._tail
+
+    def send(self, channel, text):
+        """
+        Queues channel.send(text). The returned task resolves to the sent message.
+        """
+        return self.submit(lambda: channel.send(text))
+
+    def placeholder(self, channel, text):
+        """
+        Queues a placeholder ("Thinking...") send. Unlike a plain send, it is
+        removed by abandon() if the turn is cancelled before deleting it.
+        """
+        task = self.send(channel, text)
+        self._placeholders.add(task)
+        return task
+
+    def delete(self, message):
+        """
+        Queues deletion of a message, or of the message a queued send resolves to.
+        """
+        async def _delete():
+            target = await message if isinstance(message, asyncio.Future) else message
+            if target is not None:
+                await target.delete()
+            self._placeholders.discard(message)
+
+        return self.submit(_delete)
+
+    def background(self, coro):
+        """
+        Runs an operation that needs no ordering (e.g. editing an already
+        posted message) concurrently; flush() still waits for it.
+        """
+        task = spawn(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def flush(self):
+        """
+        Waits until every queued and background operation has run.
+        """
+        pending = set(self._background)
+        if self._tail is not None:
+            pending.add(self._tail)
+        if pending:
+            await asyncio.wait(pending)
+
+    def abandon(self):
+        """
+        Cleans up after a cancelled turn: placeholders that were already
+        posted get deleted. Runs outside the turn's scope, so the cancellation
+        does not stop it.
+        """
+        for task in self._placeholders:
+            if task.done() and not task.cancelled() and task.result() is not None:
+                asyncio.create_task(_delete_quietly(task.result()))
+        self._placeholders.clear()
@@ -0,0 +1,77 @@
+# src/gateway.py
+"""
+Gateway process (BOT_MODE=gateway): holds the only Discord gateway connection
+(the Governor's) and turns each incoming user message into a job on the Redis
+Streams work queue. Replies are produced by worker processes (src/worker.py).
+"""
+import os
+import asyncio
+import discord
+
+from src.job_queue import enqueue_job
+from src.health import start_health_server
+from src.debounce import Debouncer
+
+TOKEN_GOVERNOR = os.getenv("BLOB_TOKEN_GOVERNOR")
+
+intents = discord.Intents.default()
+intents.message_content = True
+
+client_governor = discord.Client(intents=intents)
+
+def message_job(message):
+    """
+    The parts of a discord.Message a worker needs to handle it.
+    """
+    return {
+        "message_id": str(message.id),
+        "channel_id": str(message.channel.id),
+        "guild_id": str(message.guild.id) if message.guild else None,
+        "content": message.content,
+        "author_id": str(message.author.id),
+        "author_name": message.author.name,
+        "author_display_name": message.author.display_name,
+        "author_bot": message.author.bot,
+    }
+
+@client_governor.event
+async def on_ready():
+    print(f"Gateway is ready as {client_governor.user}")
+
+async def enqueue_burst(messages):
+    job = message_job(messages[-1])
+    if len(messages) > 1:
+        job["burst"] = [m.content for m in messages]
+    try:
+        await enqueue_job(job)
+    except Exception as e:
+        print("Enqueue error:", e)
+
+# Bursts are merged here, before they reach the queue
+debouncer = Debouncer(enqueue_burst)
+
+@client_governor.event
+async def on_message(message):
+    # Ignore messages from self, other bots and webhooks (persona replies)
+    if message.author == client_governor.user or message.author.bot or message.webhook_id:
+        return
+    key = (message.channel.id, message.author.id)
+    await debouncer.submit(key, message, hold=not message.content.strip().startswith("!"))
+
+@client_governor.event
+async def on_typing(channel, user, when):
+    debouncer.typing((channel.id, user.id))
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.create_task(start_health_server())
+    loop.create_task(client_governor.start(TOKEN_GOVERNOR))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        loop.run_until_complete(client_governor.close())
+        loop.stop()
+
+if __name__ == "__main__":
+    main()
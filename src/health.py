@@ -0,0 +1,36 @@
+# src/health.py
+"""
+HTTP health server to satisfy Fly.io, shared by every process mode.
+
+Also serves /metrics in the Prometheus text format (see src/metrics.py)
+unless METRICS_ENABLED=0.
+"""
+import os
+
+from aiohttp import web
+
+from src import metrics
+
+# Set a different port per process when several run on one host (e.g. workers).
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+
+async def handle_health(request):
+    return web.Response(text="OK")
+
+async def handle_metrics(request):
+    return web.Response(
+        body=metrics.render_prometheus().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+async def start_health_server(port=HEALTH_PORT):
+    app = web.Application()
+    app.router.add_get("/", handle_health)
+    if metrics.METRICS_ENABLED:
+        app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    print(f"Health server started on 0.0.0.0:{port}")
+    return runner
@@ -0,0 +1,100 @@
+# src/history_format.py
+"""
+Binary format of one stored history entry.
+
+An entry is stored as MAGIC, one codec byte and the serialized record
+[author, role, content, ts, tokens]:
+
+    b"\\x00H1" + b"m" + msgpack(record)          msgpack
+    b"\\x00H1" + b"M" + zlib(msgpack(record))    msgpack, compressed
+    b"\\x00H1" + b"j" / b"J"                     the same with JSON, used when
+                                                 msgpack is not installed
+
+Entries longer than HISTORY_COMPRESS_MIN bytes are compressed when that makes
+them smaller. Anything without the magic prefix is an entry from the original
+"author: content" string format and is parsed as such.
+"""
+import os
+import json
+import zlib
+from collections import namedtuple
+
+try:
+    import msgpack
+except ImportError:  # optional; JSON is used instead
+    msgpack = None
+
+MAGIC = b"\x00H1"
+HISTORY_COMPRESS_MIN = int(os.getenv("HISTORY_COMPRESS_MIN", "512"))
+
+# Authors whose entries are persona replies rather than user messages.
+PERSONA_AUTHORS = {"Cyclo", "Emo", "Prim", "Spri", "Governor"}
+
+class HistoryEntry(namedtuple("HistoryEntry", ["author", "role", "content", "ts", "tokens"])):
+    """
+    One history entry. role is "user" or "assistant"; ts is a Unix timestamp
+    (0 for legacy entries) and tokens the content's token count (None if unknown).
+    """
+    __slots__ = ()
+
+    @property
+    def text(self):
+        """
+        The entry in the original "author: content" form.
+        """
+        return f"{self.author}: {self.content}"
+
+def role_for(author):
+    return "assistant" if author in PERSONA_AUTHORS else "user"
+
+def encode_entry(entry):
+    record = list(entry)
+    if msgpack is not None:
+        codec, payload = b"m", msgpack.packb(record, use_bin_type=True)
+    else:
+        codec, payload = b"j", json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(payload) >= HISTORY_COMPRESS_MIN:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            codec, payload = codec.upper(), compressed
+    return MAGIC + codec + payload
+
+def decode_entry(raw):
+    """
+    Decodes a stored entry in either format. Returns None if it cannot be read.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if not raw.startswith(MAGIC):
+        return parse_legacy(raw.decode("utf-8", errors="replace"))
+
+    codec = raw[len(MAGIC):len(MAGIC) + 1]
+    payload = raw[len(MAGIC) + 1:]
+    try:
+        if codec in (b"M", b"J"):
+            payload = zlib.decompress(payload)
+        if codec in (b"m", b"M"):
+            if msgpack is None:
+                print("History entry needs msgpack, which is not installed")
+                return None
+            record = msgpack.unpackb(payload, raw=False)
+        else:
+            record = json.loads(payload.decode("utf-8"))
+        return HistoryEntry(*record)
+    except Exception as e:
+        print("Unreadable history entry:", e)
+        return None
+
+def parse_legacy(text):
+    """
+    Parses an "author: content" entry from the original string format.
+    """
+    author, sep, content = text.partition(": ")
+    if not sep:
+        author, content = "", text
+    return HistoryEntry(author, role_for(author), content, 0, None)
+
+def is_legacy(raw):
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    return not raw.startswith(MAGIC)
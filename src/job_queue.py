@@ -0,0 +1,299 @@
+# src/job_queue.py
+"""
+Redis Streams work queue between the gateway and worker processes.
+
+Jobs are spread over JOB_STREAM_SHARDS streams by channel, so every message
+from one channel lands in the same stream, in order. Each shard is consumed
+by exactly one worker at a time: workers take short leases on shards
+(SET NX PX, renewed while alive) and balance them among themselves. Inside a
+shard, jobs for the same channel run one after another while different
+channels run concurrently.
+
+Delivery is at-least-once through a consumer group: a job is acknowledged
+only after its handler returns. A worker giving up a shard first lets its
+running jobs of that shard finish (briefly), cancels the rest and only then
+releases the lease. When a worker dies its leases expire, and the worker that
+takes the shard over claims (XAUTOCLAIM) and re-runs the entries left pending,
+but only once they have been idle longer than JOB_LEASE_MS, so a job still
+running elsewhere is not started twice.
+"""
+import os
+import json
+import math
+import time
+import uuid
+import zlib
+import socket
+import asyncio
+
+from redis.exceptions import ResponseError
+
+from src.memory_manager import ar
+
+JOB_STREAM_PREFIX = os.getenv("JOB_STREAM_PREFIX", "jobs")
+JOB_STREAM_SHARDS = int(os.getenv("JOB_STREAM_SHARDS", "8"))
+JOB_STREAM_MAXLEN = int(os.getenv("JOB_STREAM_MAXLEN", "10000"))
+JOB_GROUP = os.getenv("JOB_GROUP", "workers")
+
+# Shard lease length; leases are renewed every third of it.
+JOB_LEASE_MS = int(os.getenv("JOB_LEASE_MS", "15000"))
+# Jobs handled concurrently by one worker (across all its shards).
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "32"))
+# Jobs read ahead of the running ones, as a multiple of WORKER_CONCURRENCY.
+WORKER_READ_AHEAD = int(os.getenv("WORKER_READ_AHEAD", "4"))
+# Reclaimed jobs are dropped after this many deliveries (poison-message guard).
+JOB_MAX_DELIVERIES = int(os.getenv("JOB_MAX_DELIVERIES", "3"))
+
+_RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def shard_for(channel_id):
+    return zlib.crc32(str(channel_id).encode("utf-8")) % JOB_STREAM_SHARDS
+
+def stream_key(shard):
+    return f"{JOB_STREAM_PREFIX}:{shard}"
+
+def _lease_key(shard):
+    return f"{JOB_STREAM_PREFIX}:lease:{shard}"
+
+def _workers_key():
+    return f"{JOB_STREAM_PREFIX}:workers"
+
+def _attempts_key(shard):
+    return f"{JOB_STREAM_PREFIX}:attempts:{shard}"
+
+async def enqueue_job(job):
+    """
+    Appends a job (a JSON-serializable dict with a "channel_id") to its
+    channel's shard stream and returns the entry id.
+    """
+    stream = stream_key(shard_for(job["channel_id"]))
+    return await ar.xadd(
+        stream,
+        {"job": json.dumps(job)},
+        maxlen=JOB_STREAM_MAXLEN,
+        approximate=True
+    )
+
+class StreamWorker:
+    """
+    Consumes the job streams and runs handler(job) for each entry.
+
+    Parameters:
+        handler (coroutine function): Called with the decoded job dict.
+        name (str): Consumer name; defaults to host name plus a random suffix.
+        on_dispatch (callable): Optional; called with each job as soon as it
+            is read, before it waits for its channel's previous job.
+        on_shard_change (callable): Optional; called with a shard number when
+            this worker takes the shard and again once it has given it up, so
+            state cached for the shard's channels can be dropped.
+    """
+
+    def __init__(self, handler, name=None, concurrency=WORKER_CONCURRENCY, on_dispatch=None,
+                 on_shard_change=None):
+        self.handler = handler
+        self.on_dispatch = on_dispatch
+        self.on_shard_change = on_shard_change
+        self.name = name or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._slots = asyncio.Semaphore(concurrency)
+        self._queued = asyncio.Semaphore(concurrency * WORKER_READ_AHEAD)
+        self._shards = {}         # shard -> consumer task
+        self._jobs = {}           # shard -> {entry_id: job task}
+        self._channel_tails = {}  # channel_id -> last job task for that channel
+        self._stopping = False
+
+    async def run(self):
+        """
+        Runs until stop() is called: keeps leases renewed and balanced, and a
+        consumer task per owned shard.
+        """
+        await self._ensure_groups()
+        interval = JOB_LEASE_MS / 3000
+        try:
+            while not self._stopping:
+                await self._heartbeat()
+                await self._balance()
+                await asyncio.sleep(interval)
+        finally:
+            await self._release_all()
+
+    def stop(self):
+        self._stopping = True
+
+    async def _ensure_groups(self):
+        for shard in range(JOB_STREAM_SHARDS):
+            try:
+                await ar.xgroup_create(stream_key(shard), JOB_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def _heartbeat(self):
+        now = time.time()
+        await ar.zadd(_workers_key(), {self.name: now})
+        await ar.zremrangebyscore(_workers_key(), 0, now - 3 * JOB_LEASE_MS / 1000)
+
+    async def _balance(self):
+        """
+        Renews owned leases, gives up shards above this worker's fair share and
+        takes free shards below it.
+        """
+        live = max(1, await ar.zcard(_workers_key()))
+        target = math.ceil(JOB_STREAM_SHARDS / live)
+
+        for shard in list(self._shards):
+            renewed = await ar.eval(_RENEW_LEASE, 1, _lease_key(shard), self.name, JOB_LEASE_MS)
+            if not renewed:
+                # Someone else may own the shard already: stop its jobs now.
+                await self._drop_shard(shard, drain=0)
+            elif self._shards[shard].done():
+                await self._drop_shard(shard)
+                await ar.eval(_RELEASE_LEASE, 1, _lease_key(shard), self.name)
+
+        while len(self._shards) > target:
+            shard = next(iter(self._shards))
+            await self._drop_shard(shard)
+            await ar.eval(_RELEASE_LEASE, 1, _lease_key(shard), self.name)
+
+        for shard in range(JOB_STREAM_SHARDS):
+            if len(self._shards) >= target:
+                break
+            if shard in self._shards:
+                continue
+            if await ar.set(_lease_key(shard), self.name, nx=True, px=JOB_LEASE_MS):
+                self._shard_changed(shard)
+                self._shards[shard] = asyncio.create_task(self._consume(shard))
+
+    async def _drop_shard(self, shard, drain=None):
+        """
+        Stops consuming a shard and winds down its jobs: running ones get up to
+        drain seconds (a third of the lease by default) to finish, the rest are
+        cancelled and left unacknowledged for the next owner. Call it before
+        releasing the shard's lease.
+        """
+        if drain is None:
+            drain = JOB_LEASE_MS / 3000
+        task = self._shards.pop(shard, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+        jobs = list(self._jobs.get(shard, {}).values())
+        if jobs and drain > 0:
+            await asyncio.wait(jobs, timeout=drain)
+        pending = [job for job in jobs if not job.done()]
+        for job in pending:
+            job.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            print(f"Cancelled {len(pending)} running jobs of shard {shard}")
+        self._shard_changed(shard)
+
+    def _shard_changed(self, shard):
+        if self.on_shard_change is not None:
+            try:
+                self.on_shard_change(shard)
+            except Exception as e:
+                print(f"Shard {shard} change hook error:", e)
+
+    async def _release_all(self):
+        for shard in list(self._shards):
+            await self._drop_shard(shard)
+            await ar.eval(_RELEASE_LEASE, 1, _lease_key(shard), self.name)
+        await ar.zrem(_workers_key(), self.name)
+
+    async def _consume(self, shard):
+        stream = stream_key(shard)
+        try:
+            next_reclaim = 0.0
+            while shard in self._shards and not self._stopping:
+                # Entries a previous owner left pending are picked up once they
+                # have been idle for a full lease.
+                if time.monotonic() >= next_reclaim:
+                    await self._reclaim(shard)
+                    next_reclaim = time.monotonic() + JOB_LEASE_MS / 1000
+                response = await ar.xreadgroup(JOB_GROUP, self.name, {stream: ">"}, count=50, block=2000)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        await self._dispatch(shard, entry_id, fields)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The lease check in _balance() notices the finished task and retries the shard.
+            print(f"Worker shard {shard} error:", e)
+
+    async def _reclaim(self, shard):
+        stream = stream_key(shard)
+        running = self._jobs.get(shard, {})
+        cursor = "0-0"
+        while True:
+            result = await ar.xautoclaim(stream, JOB_GROUP, self.name, min_idle_time=JOB_LEASE_MS, start_id=cursor, count=100)
+            cursor, entries = result[0], result[1]
+            for entry_id, fields in entries:
+                # A long job of our own also goes idle; it is still running here.
+                if entry_id not in running:
+                    await self._dispatch(shard, entry_id, fields, reclaimed=True)
+            if not entries or cursor in ("0-0", b"0-0"):
+                break
+
+    async def _dispatch(self, shard, entry_id, fields, reclaimed=False):
+        if fields is None:
+            # Entry was trimmed from the stream; nothing left to run.
+            await ar.xack(stream_key(shard), JOB_GROUP, entry_id)
+            return
+        if reclaimed:
+            attempts = await ar.hincrby(_attempts_key(shard), entry_id, 1)
+            if attempts > JOB_MAX_DELIVERIES:
+                print(f"Dropping job {entry_id} after {attempts - 1} deliveries")
+                await self._ack(shard, entry_id)
+                return
+
+        job = json.loads(fields["job"])
+        channel_id = job["channel_id"]
+        if self.on_dispatch is not None:
+            self.on_dispatch(job)
+        # Bounds read-ahead; slots are only taken once a job can actually run.
+        await self._queued.acquire()
+        previous = self._channel_tails.get(channel_id)
+        task = asyncio.create_task(self._run_job(shard, entry_id, job, previous))
+        self._channel_tails[channel_id] = task
+        self._jobs.setdefault(shard, {})[entry_id] = task
+
+    async def _run_job(self, shard, entry_id, job, previous):
+        try:
+            # Same-channel jobs run strictly in stream order. Waiting happens
+            # before taking a slot, so one busy channel cannot hold them all.
+            if previous is not None:
+                await asyncio.wait({previous})
+            async with self._slots:
+                try:
+                    await self.handler(job)
+                except Exception as e:
+                    print(f"Job {entry_id} failed:", e)
+            await self._ack(shard, entry_id)
+        finally:
+            self._queued.release()
+            channel_id = job["channel_id"]
+            if self._channel_tails.get(channel_id) is asyncio.current_task():
+                del self._channel_tails[channel_id]
+            running = self._jobs.get(shard)
+            if running is not None:
+                running.pop(entry_id, None)
+                if not running:
+                    del self._jobs[shard]
+
+    async def _ack(self, shard, entry_id):
+        async with ar.pipeline(transaction=False) as pipe:
+            pipe.xack(stream_key(shard), JOB_GROUP, entry_id)
+            pipe.hdel(_attempts_key(shard), entry_id)
+            await pipe.execute()
@@ -0,0 +1,349 @@
+# src/llm_provider.py
+"""
+Shared async provider layer for every LLM call in the bot.
+
+One long-lived AsyncOpenAI and one AsyncAnthropic client per process, each on a
+keep-alive HTTP connection pool, so calls reuse warm TCP/TLS connections instead
+of paying a handshake per request. Every call is admitted by the scheduler in
+src/llm_scheduler.py, which caps concurrency per provider, enforces
+requests/min and tokens/min limits, and serves waiting calls by priority and
+round-robin across channels. Retries and hedging (src/resilience.py) wrap each
+call; the SDKs' own retries are turned off so they do not multiply.
+
+The SDKs are imported when their client is first created, not at import: they
+are most of the bot's import time. prewarm_clients() does it ahead of the
+first call, from a thread, while the Discord clients log in.
+
+Calls cancelled before they finish (a superseded or timed-out turn, see
+src/turn_scope.py) are counted in llm_calls_cancelled_total, with the output
+tokens they no longer produce in llm_output_tokens_saved_total.
+"""
+import os
+import asyncio
+import inspect
+import threading
+
+from src import metrics
+from src.llm_scheduler import lane, estimate_messages_tokens, estimate_tokens, PRIORITY_FIRST
+from src.resilience import call_with_resilience, stream_with_resilience
+from src.turn_scope import current_scope
+
+openai_api_key = os.getenv("OPENAI_API_KEY", "")
+anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "")
+
+# Maximum number of in-flight requests per provider (across all channels).
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+ANTHROPIC_MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "16"))
+
+# Connection pool settings shared by both providers.
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+_openai_client = None
+_anthropic_client = None
+_client_lock = threading.Lock()
+
+def _pool_limits(sdk, max_concurrency):
+    """
+    Pool sized to the provider's concurrency cap, with connections kept
+    alive long enough to survive the gap between user messages.
+
+    Built from the SDK's own Limits class (the type of its
+    DEFAULT_CONNECTION_LIMITS): depending on the version the SDK runs on
+    httpx or httpx2, and only accepts that package's types.
+    """
+    return type(sdk.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=max_concurrency,
+        max_keepalive_connections=min(max_concurrency, LLM_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+def _timeout(sdk):
+    return sdk.Timeout(LLM_TIMEOUT, connect=10.0)
+
+def get_openai_client():
+    """
+    Returns the process-wide AsyncOpenAI client, creating it on first use.
+    """
+    global _openai_client
+    if _openai_client is not None:
+        return _openai_client
+    with _client_lock:
+        if _openai_client is None:
+            import openai
+            _openai_client = openai.AsyncOpenAI(
+                api_key=openai_api_key,
+                timeout=_timeout(openai),
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=_pool_limits(openai, OPENAI_MAX_CONCURRENCY),
+                    timeout=_timeout(openai),
+                ),
+            )
+    return _openai_client
+
+def get_anthropic_client():
+    """
+    Returns the process-wide AsyncAnthropic client, creating it on first use.
+    """
+    global _anthropic_client
+    if _anthropic_client is not None:
+        return _anthropic_client
+    with _client_lock:
+        if _anthropic_client is None:
+            import anthropic
+            _anthropic_client = anthropic.AsyncAnthropic(
+                api_key=anthropic_api_key,
+                timeout=_timeout(anthropic),
+                max_retries=0,
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    limits=_pool_limits(anthropic, ANTHROPIC_MAX_CONCURRENCY),
+                    timeout=_timeout(anthropic),
+                ),
+            )
+    return _anthropic_client
+
+def prewarm_clients():
+    """
+    Imports the SDKs and creates both clients ahead of the first call.
+    Blocking; run it in an executor thread. Errors (e.g. a missing API key)
+    are only logged here; the first call raises them again.
+    """
+    for get_client in (get_openai_client, get_anthropic_client):
+        try:
+            get_client()
+        except Exception as e:
+            print("LLM client setup error:", e)
+
+def _lane(provider):
+    limit = OPENAI_MAX_CONCURRENCY if provider == "openai" else ANTHROPIC_MAX_CONCURRENCY
+    return lane(provider, limit)
+
+def _admit(provider, model, messages, max_tokens, priority, channel_id, system=None):
+    """
+    Waits for the scheduler to admit one call; returns its Grant.
+    """
+    tokens = estimate_messages_tokens(messages, system=system, max_tokens=max_tokens)
+    return _lane(provider).acquire(model, tokens, priority, channel_id)
+
+async def _parse_raw(provider, model, raw):
+    """
+    Feeds a raw response's rate-limit headers to the scheduler and returns
+    the parsed response (parse() is async in some SDK versions).
+    """
+    _lane(provider).observe_headers(model, getattr(raw, "headers", None))
+    parsed = raw.parse()
+    if inspect.isawaitable(parsed):
+        parsed = await parsed
+    return parsed
+
+def _observe_stream(provider, model, stream):
+    response = getattr(stream, "response", None)
+    _lane(provider).observe_headers(model, getattr(response, "headers", None))
+
+def _record_usage(provider, usage):
+    """
+    Counts prompt, cached-prompt and completion tokens from a response's usage
+    and returns the total, for the scheduler's token bucket.
+    """
+    if usage is None:
+        return 0
+    if provider == "openai":
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        written = 0
+    else:
+        completion = getattr(usage, "output_tokens", 0) or 0
+        cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+        written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        prompt = (getattr(usage, "input_tokens", 0) or 0) + cached + written
+    metrics.inc("llm_prompt_tokens_total", prompt, provider=provider)
+    metrics.inc("llm_cached_prompt_tokens_total", cached, provider=provider)
+    metrics.inc("llm_cache_write_tokens_total", written, provider=provider)
+    metrics.inc("llm_completion_tokens_total", completion, provider=provider)
+    return prompt + completion
+
+def _record_cancelled(provider, max_tokens, received_tokens=0):
+    """
+    Counts a call cancelled before it finished. The tokens saved are its
+    max_tokens budget minus what it had already produced (an upper bound).
+    The reason is the turn's (superseded / command / deadline), or
+    "abandoned" when the turn itself gave up on the call (panel early stop,
+    forced-persona timeout).
+    """
+    scope = current_scope()
+    reason = scope.reason if scope is not None and scope.cancelled else "abandoned"
+    metrics.inc("llm_calls_cancelled_total", provider=provider, reason=reason)
+    metrics.inc("llm_output_tokens_saved_total", max(0, (max_tokens or 0) - received_tokens), provider=provider)
+
+async def _tracked_stream(provider, max_tokens, stream):
+    """
+    Passes a text stream through, recording it as cancelled when it is
+    closed or cancelled before its end.
+    """
+    received = ""
+    completed = False
+    try:
+        async for delta in stream:
+            received += delta
+            yield delta
+        completed = True
+    except Exception:
+        completed = True
+        raise
+    finally:
+        if not completed:
+            _record_cancelled(provider, max_tokens, estimate_tokens(received))
+        await stream.aclose()
+
+async def openai_chat(model, messages, max_tokens, temperature, priority=PRIORITY_FIRST, channel_id=None, **kwargs):
+    """
+    Runs a chat completion on the shared OpenAI client and returns the raw response.
+    priority and channel_id place the call in the scheduler's queues.
+    """
+    try:
+        return await call_with_resilience(
+            f"openai:{model}",
+            lambda: _openai_chat_once(model, messages, max_tokens, temperature, priority, channel_id, **kwargs)
+        )
+    except asyncio.CancelledError:
+        _record_cancelled("openai", max_tokens)
+        raise
+
+async def anthropic_messages(model, system, messages, max_tokens, temperature, priority=PRIORITY_FIRST, channel_id=None, **kwargs):
+    """
+    Runs a Messages API call on the shared Anthropic client and returns the raw response.
+    priority and channel_id place the call in the scheduler's queues.
+    """
+    try:
+        return await call_with_resilience(
+            f"anthropic:{model}",
+            lambda: _anthropic_messages_once(model, system, messages, max_tokens, temperature, priority, channel_id, **kwargs)
+        )
+    except asyncio.CancelledError:
+        _record_cancelled("anthropic", max_tokens)
+        raise
+
+def openai_chat_stream(model, messages, max_tokens, temperature, priority=PRIORITY_FIRST, channel_id=None, **kwargs):
+    """
+    Streams a chat completion on the shared OpenAI client, yielding text deltas.
+    """
+    return _tracked_stream("openai", max_tokens, stream_with_resilience(
+        f"openai:{model}",
+        lambda: _openai_chat_stream_once(model, messages, max_tokens, temperature, priority, channel_id, **kwargs)
+    ))
+
+def anthropic_messages_stream(model, system, messages, max_tokens, temperature, priority=PRIORITY_FIRST, channel_id=None, **kwargs):
+    """
+    Streams a Messages API call on the shared Anthropic client, yielding text deltas.
+    """
+    return _tracked_stream("anthropic", max_tokens, stream_with_resilience(
+        f"anthropic:{model}",
+        lambda: _anthropic_messages_stream_once(model, system, messages, max_tokens, temperature, priority, channel_id, **kwargs)
+    ))
+
+async def _openai_chat_once(model, messages, max_tokens, temperature, priority, channel_id, **kwargs):
+    async with await _admit("openai", model, messages, max_tokens, priority, channel_id) as grant:
+        raw = await get_openai_client().chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+        response = await _parse_raw("openai", model, raw)
+        grant.settle(_record_usage("openai", getattr(response, "usage", None)))
+        return response
+
+_anthropic_temperature = None
+
+def _anthropic_sampling(temperature):
+    """
+    {"temperature": temperature} when the installed Anthropic SDK still takes
+    it; newer major versions dropped it, and passing it fails every call.
+    """
+    global _anthropic_temperature
+    if _anthropic_temperature is None:
+        client = get_anthropic_client()
+        _anthropic_temperature = "temperature" in inspect.signature(client.messages.create).parameters
+        if not _anthropic_temperature:
+            print("Anthropic SDK takes no temperature; persona temperatures are ignored for Claude models.")
+    return {"temperature": temperature} if _anthropic_temperature and temperature is not None else {}
+
+async def _anthropic_messages_once(model, system, messages, max_tokens, temperature, priority, channel_id, **kwargs):
+    async with await _admit("anthropic", model, messages, max_tokens, priority, channel_id, system) as grant:
+        raw = await get_anthropic_client().messages.with_raw_response.create(
+            model=model,
+            system=system,
+            messages=messages,
+            max_tokens=max_tokens,
+            **_anthropic_sampling(temperature),
+            **kwargs
+        )
+        response = await _parse_raw("anthropic", model, raw)
+        grant.settle(_record_usage("anthropic", getattr(response, "usage", None)))
+        return response
+
+async def _openai_chat_stream_once(model, messages, max_tokens, temperature, priority, channel_id, **kwargs):
+    """
+    One streaming attempt. The scheduler slot is held until the stream is
+    exhausted or closed.
+    """
+    async with await _admit("openai", model, messages, max_tokens, priority, channel_id) as grant:
+        stream = await get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        _observe_stream("openai", model, stream)
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    grant.settle(_record_usage("openai", chunk.usage))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            await stream.close()
+
+async def _anthropic_messages_stream_once(model, system, messages, max_tokens, temperature, priority, channel_id, **kwargs):
+    """
+    One streaming attempt. The scheduler slot is held until the stream is
+    exhausted or closed.
+    """
+    async with await _admit("anthropic", model, messages, max_tokens, priority, channel_id, system) as grant:
+        async with get_anthropic_client().messages.stream(
+            model=model,
+            system=system,
+            messages=messages,
+            max_tokens=max_tokens,
+            **_anthropic_sampling(temperature),
+            **kwargs
+        ) as stream:
+            _observe_stream("anthropic", model, stream)
+            async for text in stream.text_stream:
+                if text:
+                    yield text
+            final = await stream.get_final_message()
+            grant.settle(_record_usage("anthropic", getattr(final, "usage", None)))
+
+async def close_clients():
+    """
+    Closes the shared clients and their connection pools (used on shutdown).
+    """
+    global _openai_client, _anthropic_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
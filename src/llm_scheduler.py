@@ -0,0 +1,385 @@
+# src/llm_scheduler.py
+"""
+Central admission control for every LLM call.
+
+Each provider call first asks the scheduler for a slot. A slot is granted when
+the provider has a free concurrency slot and the provider/model token buckets
+hold one request (requests/min) and the call's estimated tokens (tokens/min).
+Waiting calls are served by priority class first; within a class, channels
+take turns (round-robin), so one busy channel cannot starve the others.
+
+Limits are read from the environment:
+    OPENAI_RPM, OPENAI_TPM, ANTHROPIC_RPM, ANTHROPIC_TPM  provider-wide defaults
+    LLM_RATE_LIMITS  JSON overrides per provider or "provider:model", e.g.
+                     {"openai:gpt-4": {"rpm": 500, "tpm": 10000}}
+A limit of 0 means "not configured": the limit is then taken from the
+rate-limit headers of the provider's responses (x-ratelimit-* for OpenAI,
+anthropic-ratelimit-* for Anthropic) as soon as the first call returns, and
+the remaining request/token counts they report keep the buckets in step with
+other processes using the same key. Configured limits are never overridden.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+from src import metrics
+
+# Priority classes, most urgent first. Crisis handling makes no LLM calls
+# (see src/crisis_detector.py), so it needs no class of its own.
+PRIORITY_FIRST = 1      # classification and the first persona reply of a turn
+PRIORITY_FOLLOWUP = 2   # second/third persona replies
+PRIORITY_MERGE = 3      # Governor merges
+PRIORITY_BACKGROUND = 4 # summaries and other work nobody is waiting on
+
+PRIORITY_NAMES = {
+    PRIORITY_FIRST: "first",
+    PRIORITY_FOLLOWUP: "followup",
+    PRIORITY_MERGE: "merge",
+    PRIORITY_BACKGROUND: "background",
+}
+
+_DEFAULT_LIMITS = {
+    "openai": {
+        "rpm": int(os.getenv("OPENAI_RPM", "0")),
+        "tpm": int(os.getenv("OPENAI_TPM", "0")),
+    },
+    "anthropic": {
+        "rpm": int(os.getenv("ANTHROPIC_RPM", "0")),
+        "tpm": int(os.getenv("ANTHROPIC_TPM", "0")),
+    },
+}
+
+def _load_overrides():
+    raw = os.getenv("LLM_RATE_LIMITS", "")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        print("Ignoring invalid LLM_RATE_LIMITS:", e)
+        return {}
+
+_OVERRIDES = _load_overrides()
+
+def limits_for(provider, model):
+    """
+    Returns {"rpm": ..., "tpm": ...} for a provider/model (0 = unlimited).
+    """
+    limits = dict(_DEFAULT_LIMITS.get(provider, {"rpm": 0, "tpm": 0}))
+    limits.update(_OVERRIDES.get(provider, {}))
+    limits.update(_OVERRIDES.get(f"{provider}:{model}", {}))
+    return limits
+
+def estimate_tokens(text):
+    """
+    Rough token count for rate-limit accounting (about 4 characters per token).
+    """
+    return len(text) // 4 + 1
+
+def estimate_messages_tokens(messages, system=None, max_tokens=0):
+    """
+    Estimated prompt tokens of a chat request plus its completion budget.
+    """
+    total = _content_tokens(system) if system else 0
+    for m in messages:
+        total += _content_tokens(m.get("content")) + 4
+    return total + (max_tokens or 0)
+
+def _content_tokens(content):
+    """
+    Estimate for a message content: a string or a list of text blocks.
+    """
+    if isinstance(content, str):
+        return estimate_tokens(content)
+    if isinstance(content, list):
+        return sum(_content_tokens(block.get("text", "") if isinstance(block, dict) else block) for block in content)
+    return estimate_tokens(json.dumps(content))
+
+class TokenBucket:
+    """
+    Refills at rate_per_min / 60 per second up to a full minute's worth.
+    A rate of 0 never limits.
+    """
+
+    def __init__(self, rate_per_min):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until amount can be taken (0 if it can be taken now).
+        """
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        if self.rate:
+            self.tokens -= amount
+
+    def learn(self, rate_per_min, remaining, now):
+        """
+        Adopts a per-minute limit and remaining count reported by the provider
+        (either may be None).
+        """
+        if rate_per_min and float(rate_per_min) != self.capacity:
+            unlimited = not self.rate
+            self.rate = rate_per_min / 60.0
+            self.capacity = float(rate_per_min)
+            self.tokens = self.capacity if unlimited else min(self.tokens, self.capacity)
+            self.updated = now
+        if remaining is not None and self.rate:
+            self._refill(now)
+            self.tokens = min(self.tokens, float(remaining))
+
+    def drain(self, seconds):
+        """
+        Empties the bucket so nothing is admitted for about `seconds` (after a 429).
+        """
+        if self.rate:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+class _Waiter:
+    __slots__ = ("model", "tokens", "priority", "channel", "future", "enqueued")
+
+    def __init__(self, model, tokens, priority, channel, future):
+        self.model = model
+        self.tokens = tokens
+        self.priority = priority
+        self.channel = channel
+        self.future = future
+        self.enqueued = time.monotonic()
+
+class Grant:
+    """
+    An admitted call. Use as an async context manager; settle() corrects the
+    token bucket with the real usage once it is known.
+    """
+
+    def __init__(self, lane, model, tokens):
+        self._lane = lane
+        self.model = model
+        self.tokens = tokens
+        self._released = False
+
+    def settle(self, actual_tokens):
+        if actual_tokens:
+            self._lane.bucket(self.model, "tpm").take(actual_tokens - self.tokens)
+            self.tokens = actual_tokens
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._lane.release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is not None and getattr(exc, "status_code", None) == 429:
+            self._lane.throttle(self.model, _retry_after(exc))
+        self.release()
+
+# provider -> {kind: (limit header, remaining header)}
+RATE_LIMIT_HEADERS = {
+    "openai": {
+        "rpm": ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests"),
+        "tpm": ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens"),
+    },
+    "anthropic": {
+        "rpm": ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining"),
+        "tpm": ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining"),
+    },
+}
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+class ProviderLane:
+    """
+    Queue and limits for one provider: a concurrency cap shared by all its
+    models, token buckets per model, and per-priority round-robin queues of
+    channels.
+    """
+
+    def __init__(self, provider, max_concurrency):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.inflight = 0
+        self._buckets = {}
+        self._queues = {}  # priority -> OrderedDict(channel -> deque of _Waiter)
+        self._depth = 0
+        self._timer = None
+        self._timer_at = None
+
+    def bucket(self, model, kind):
+        key = (model, kind)
+        b = self._buckets.get(key)
+        if b is None:
+            b = TokenBucket(limits_for(self.provider, model)[kind])
+            self._buckets[key] = b
+        return b
+
+    async def acquire(self, model, tokens, priority, channel):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(model, tokens, priority, channel, loop.create_future())
+        queue = self._queues.setdefault(priority, OrderedDict())
+        queue.setdefault(channel, deque()).append(waiter)
+        self._depth += 1
+        self._report_depth()
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller gave up; hand the slot back.
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        metrics.inc("llm_scheduler_requests_total", provider=self.provider, priority=label)
+        metrics.inc("llm_scheduler_wait_seconds_total", waited, provider=self.provider, priority=label)
+        metrics.observe_max("llm_scheduler_wait_seconds_max", waited, provider=self.provider)
+        return Grant(self, model, tokens)
+
+    def release(self):
+        self.inflight -= 1
+        self._pump()
+
+    def observe_headers(self, model, headers):
+        """
+        Updates the model's buckets from a response's rate-limit headers.
+        Buckets with a configured limit keep it.
+        """
+        names = RATE_LIMIT_HEADERS.get(self.provider)
+        if not names or not headers:
+            return
+        now = time.monotonic()
+        configured = limits_for(self.provider, model)
+        for kind in ("rpm", "tpm"):
+            if configured[kind]:
+                continue
+            limit_name, remaining_name = names[kind]
+            self.bucket(model, kind).learn(_header_int(headers, limit_name), _header_int(headers, remaining_name), now)
+
+    def throttle(self, model, seconds):
+        """
+        A 429 came back: stop admitting this model's calls for a while.
+        """
+        metrics.inc("llm_rate_limited_total", provider=self.provider)
+        self.bucket(model, "rpm").drain(seconds)
+        self.bucket(model, "tpm").drain(seconds)
+
+    def _discard(self, waiter):
+        queue = self._queues.get(waiter.priority, {})
+        waiters = queue.get(waiter.channel)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.channel]
+            self._depth -= 1
+            self._report_depth()
+
+    def _report_depth(self):
+        metrics.set_gauge("llm_scheduler_queue_depth", self._depth, provider=self.provider)
+
+    def _pump(self):
+        """
+        Admits as many waiting calls as the limits allow, in priority then
+        round-robin order; otherwise arms a timer for the next refill.
+        """
+        now = time.monotonic()
+        retry_in = None
+        while self.inflight < self.max_concurrency and self._depth:
+            picked = None
+            for priority in sorted(self._queues):
+                queue = self._queues[priority]
+                for channel, waiters in queue.items():
+                    waiter = waiters[0]
+                    wait = max(
+                        self.bucket(waiter.model, "rpm").wait_time(1, now),
+                        self.bucket(waiter.model, "tpm").wait_time(waiter.tokens, now)
+                    )
+                    if wait <= 0:
+                        picked = (queue, channel, waiters, waiter)
+                        break
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                if picked:
+                    break
+            if picked is None:
+                break
+
+            queue, channel, waiters, waiter = picked
+            waiters.popleft()
+            if waiters:
+                queue.move_to_end(channel)
+            else:
+                del queue[channel]
+            self._depth -= 1
+            if waiter.future.done():
+                continue
+            self.bucket(waiter.model, "rpm").take(1)
+            self.bucket(waiter.model, "tpm").take(waiter.tokens)
+            self.inflight += 1
+            waiter.future.set_result(None)
+        self._report_depth()
+
+        if retry_in is not None and self._depth:
+            # Re-arm when a waiter can go sooner than the timer already set
+            # (e.g. a cheaper call queued behind a large one).
+            due = now + retry_in
+            if self._timer is None or due < self._timer_at:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = asyncio.get_running_loop().call_later(retry_in, self._on_timer)
+                self._timer_at = due
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_at = None
+        self._pump()
+
+_lanes = {}
+
+def lane(provider, max_concurrency):
+    """
+    The process-wide lane for a provider, created on first use.
+    """
+    l = _lanes.get(provider)
+    if l is None:
+        l = ProviderLane(provider, max_concurrency)
+        _lanes[provider] = l
+    return l
+
+def _export_inflight():
+    # Queue depth is kept current by _pump(); in-flight calls are read here.
+    for provider, l in _lanes.items():
+        metrics.set_gauge("llm_scheduler_inflight", l.inflight, provider=provider)
+
+metrics.register_collector(_export_inflight)
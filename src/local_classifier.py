@@ -0,0 +1,114 @@
+# src/local_classifier.py
+"""
+Local fast-path persona classifier.
+
+A multinomial logistic regression over hashed word unigrams and bigrams, in
+pure Python. Weights are trained offline by scripts/train_classifier.py and
+shipped in src/data/classifier_weights.json. Prediction is a few dictionary
+lookups per token, so the common case needs no network round-trip; callers
+fall back to the LLM classifier when the confidence is low.
+"""
+import os
+import re
+import json
+import math
+import zlib
+
+PERSONAS = ["Cyclo", "Emo", "Prim", "Spri"]
+
+# Number of hash buckets for features. Must match the value used at training time.
+NUM_BUCKETS = 2 ** 14
+
+# A second label is returned when its probability is at least this fraction of the top one.
+SECONDARY_LABEL_RATIO = 0.6
+
+WEIGHTS_PATH = os.getenv(
+    "LOCAL_CLASSIFIER_WEIGHTS",
+    os.path.join(os.path.dirname(__file__), "data", "classifier_weights.json")
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+_model = None
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+def features(text):
+    """
+    Returns the hashed feature buckets (with counts) for a piece of text.
+    """
+    tokens = tokenize(text)
+    grams = [f"w:{t}" for t in tokens]
+    grams += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    counts = {}
+    for g in grams:
+        bucket = zlib.crc32(g.encode("utf-8")) % NUM_BUCKETS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+def softmax(scores):
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+def load_model(path=WEIGHTS_PATH):
+    """
+    Loads the weights file. Returns None if it does not exist.
+
+    The file holds {"labels": [...], "bias": [...], "weights": {bucket: [w per label]}}.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("num_buckets", NUM_BUCKETS) != NUM_BUCKETS:
+        print(f"Local classifier weights at {path} use a different bucket count; ignoring them.")
+        return None
+    return {
+        "labels": data["labels"],
+        "bias": data["bias"],
+        "weights": {int(k): v for k, v in data["weights"].items()},
+    }
+
+def _get_model():
+    global _model
+    if _model is None:
+        _model = load_model() or {}
+    return _model
+
+def predict_proba(text, model=None):
+    """
+    Returns {label: probability} for the text, or {} if no model is available.
+    """
+    model = model or _get_model()
+    if not model:
+        return {}
+    labels = model["labels"]
+    weights = model["weights"]
+    scores = list(model["bias"])
+    for bucket, count in features(text).items():
+        w = weights.get(bucket)
+        if w is None:
+            continue
+        for i in range(len(labels)):
+            scores[i] += w[i] * count
+    return dict(zip(labels, softmax(scores)))
+
+def classify_local(text, model=None):
+    """
+    Classifies text without any network call.
+
+    Returns:
+        tuple: (labels, confidence) where labels is a list of persona names,
+        most likely first, and confidence is the top label's probability.
+        Returns ([], 0.0) when no model is available.
+    """
+    probs = predict_proba(text, model)
+    if not probs:
+        return [], 0.0
+    ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
+    top_label, top_p = ranked[0]
+    labels = [top_label] + [p for p, prob in ranked[1:] if prob >= top_p * SECONDARY_LABEL_RATIO]
+    return labels, top_p
@@ -1,12 +1,10 @@
 import os
 import asyncio
 import discord
-from dotenv import load_dotenv
-from aiohttp import web
 
-load_dotenv()
-
-from src.aggregator import handle_governor_message
+from src.health import start_health_server
+from src.debounce import Debouncer
+from src.webhook_transport import webhooks_enabled, webhook_persona_clients
 
 # Discord tokens from environment variables
 TOKEN_GOVERNOR = os.getenv("BLOB_TOKEN_GOVERNOR")
@@ -15,80 +13,99 @@ TOKEN_EMO      = os.getenv("BLOB_TOKEN_EMO")
 TOKEN_PRIM     = os.getenv("BLOB_TOKEN_PRIM")
 TOKEN_SPRI     = os.getenv("BLOB_TOKEN_SPRI")
 
+PERSONA_TOKENS = {
+    "Cyclo":    TOKEN_CYCLO,
+    "Emo":      TOKEN_EMO,
+    "Prim":     TOKEN_PRIM,
+    "Spri":     TOKEN_SPRI,
+    "Governor": TOKEN_GOVERNOR,
+}
+
 # Set up Discord intents
 intents = discord.Intents.default()
 intents.message_content = True
 
-# Create Discord clients for each bot persona
-client_governor = discord.Client(intents=intents)
-client_cyclo    = discord.Client(intents=intents)
-client_emo      = discord.Client(intents=intents)
-client_prim     = discord.Client(intents=intents)
-client_spri     = discord.Client(intents=intents)
+def make_client(name):
+    """
+    Creates the Discord client of one persona, logging when it is ready.
+    """
+    client = discord.Client(intents=intents)
 
-@client_governor.event
-async def on_ready():
-    print(f"Governor is ready as {client_governor.user}")
+    @client.event
+    async def on_ready():
+        print(f"{name} is ready as {client.user}")
+
+    return client
 
-@client_cyclo.event
-async def on_ready():
-    print(f"Cyclo is ready as {client_cyclo.user}")
+client_governor = make_client("Governor")
 
-@client_emo.event
-async def on_ready():
-    print(f"Emo is ready as {client_emo.user}")
+# Map persona names to their corresponding Discord clients. With
+# PERSONA_TRANSPORT=webhooks only the Governor connects and the other personas
+# post through channel webhooks (see src/webhook_transport.py).
+if webhooks_enabled():
+    persona_clients = webhook_persona_clients(client_governor)
+    login_clients = {"Governor": client_governor}
+else:
+    persona_clients = {name: make_client(name) for name in PERSONA_TOKENS if name != "Governor"}
+    persona_clients["Governor"] = client_governor
+    login_clients = persona_clients
 
-@client_prim.event
-async def on_ready():
-    print(f"Prim is ready as {client_prim.user}")
+async def handle_burst(messages):
+    # Imported here rather than at the top so the clients can start logging in
+    # first; main() preloads it in the background.
+    from src.aggregator import handle_governor_message
+    burst = [m.content for m in messages] if len(messages) > 1 else None
+    await handle_governor_message(messages[-1], persona_clients, burst=burst)
 
-@client_spri.event
-async def on_ready():
-    print(f"Spri is ready as {client_spri.user}")
+# Merges quick runs of messages from one author (off unless DEBOUNCE_WINDOW_MS is set)
+debouncer = Debouncer(handle_burst)
 
 @client_governor.event
 async def on_message(message):
-    # Ignore messages from self or other bots
-    if message.author == client_governor.user or message.author.bot:
+    # Ignore messages from self, other bots and webhooks (persona replies)
+    if message.author == client_governor.user or message.author.bot or message.webhook_id:
         return
-    # Map persona names to their corresponding Discord clients
-    persona_clients = {
-        "Cyclo":    client_cyclo,
-        "Emo":      client_emo,
-        "Prim":     client_prim,
-        "Spri":     client_spri,
-        "Governor": client_governor
-    }
-    await handle_governor_message(message, persona_clients)
-
-# --- Health server to satisfy Fly.io ---
-async def handle_health(request):
-    return web.Response(text="OK")
-
-async def start_health_server():
-    app = web.Application()
-    app.router.add_get("/", handle_health)
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", 8080)
-    await site.start()
-    print("Health server started on 0.0.0.0:8080")
+    key = (message.channel.id, message.author.id)
+    await debouncer.submit(key, message, hold=not message.content.strip().startswith("!"))
+
+@client_governor.event
+async def on_typing(channel, user, when):
+    debouncer.typing((channel.id, user.id))
+
+def preload_pipeline():
+    """
+    Imports the message pipeline and creates the LLM clients (most of the
+    startup time). Blocking; run in an executor while the clients log in.
+    """
+    import src.aggregator  # noqa: F401
+    from src.llm_provider import prewarm_clients
+    prewarm_clients()
 
 # --- Main function to start both the health server and Discord bots ---
+# BOT_MODE=all runs everything in this process; "gateway" and "worker" split
+# it over the Redis Streams work queue (see src/gateway.py, src/worker.py).
+BOT_MODE = os.getenv("BOT_MODE", "all").lower()
+
 def main():
+    if BOT_MODE == "gateway":
+        from src import gateway
+        return gateway.main()
+    if BOT_MODE == "worker":
+        from src import worker
+        return worker.main()
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     # Start the HTTP health server
     loop.create_task(start_health_server())
-    # Start Discord bot clients concurrently
-    loop.create_task(client_governor.start(TOKEN_GOVERNOR))
-    loop.create_task(client_cyclo.start(TOKEN_CYCLO))
-    loop.create_task(client_emo.start(TOKEN_EMO))
-    loop.create_task(client_prim.start(TOKEN_PRIM))
-    loop.create_task(client_spri.start(TOKEN_SPRI))
+    # Start Discord bot clients concurrently, then load the pipeline alongside
+    for name, client in login_clients.items():
+        loop.create_task(client.start(PERSONA_TOKENS[name]))
+    loop.run_in_executor(None, preload_pipeline)
     try:
         loop.run_forever()
     except KeyboardInterrupt:
+        from src.llm_provider import close_clients
+        loop.run_until_complete(close_clients())
         loop.stop()
 
 if __name__ == "__main__":
@@ -1,9 +1,13 @@
 import os
+import time
 import redis
-from dotenv import load_dotenv
+import redis.asyncio as aioredis
+from collections import OrderedDict
 
-# Load environment variables from .env file
-load_dotenv()
+from src import metrics
+from src.ttl_cache import TTLCache
+from src.history_format import HistoryEntry, encode_entry, decode_entry, role_for
+from src.token_count import count_tokens
 
 # Retrieve the Redis connection URL from the environment.
 # If not set, default to a local Redis instance.
@@ -13,6 +17,106 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 # decode_responses=True ensures that we work with Python strings.
 r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
 
+# Async client used from the bot's coroutines, backed by a shared connection pool
+# so memory reads and writes never block the event loop.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+async_pool = aioredis.ConnectionPool.from_url(
+    REDIS_URL, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS
+)
+ar = aioredis.Redis(connection_pool=async_pool)
+
+# History entries are binary (see src/history_format.py), so they go through
+# clients that return raw bytes.
+rb = redis.Redis.from_url(REDIS_URL, decode_responses=False)
+async_binary_pool = aioredis.ConnectionPool.from_url(
+    REDIS_URL, decode_responses=False, max_connections=REDIS_MAX_CONNECTIONS
+)
+arb = aioredis.Redis(connection_pool=async_binary_pool)
+
+# Number of entries kept per channel.
+HISTORY_MAX_ENTRIES = 40
+
+# A channel's history expires after this many seconds without a new entry
+# (0 keeps it forever).
+HISTORY_TTL = int(os.getenv("HISTORY_TTL", str(30 * 24 * 3600)))
+
+# In-process read-through cache of each channel's full history (at most
+# HISTORY_MAX_ENTRIES entries per channel), LRU-evicted past
+# HISTORY_CACHE_CHANNELS channels. Entries older than HISTORY_CACHE_TTL seconds
+# are re-read so writes from other processes show up eventually.
+HISTORY_CACHE_CHANNELS = int(os.getenv("HISTORY_CACHE_CHANNELS", "500"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "300"))
+
+_history_cache = OrderedDict()  # channel_id -> (loaded_at, [HistoryEntry])
+
+# Rolling summaries of turns that fell out of the prompt window (see
+# src/context_builder.py), one Redis hash per channel, cached briefly in-process.
+SUMMARY_TTL = int(os.getenv("SUMMARY_TTL", str(7 * 24 * 3600)))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "60"))
+
+_summary_cache = TTLCache(HISTORY_CACHE_CHANNELS, SUMMARY_CACHE_TTL)
+
+def _history_key(channel_id):
+    return f"history:{channel_id}"
+
+def _summary_key(channel_id):
+    return f"summary:{channel_id}"
+
+def _cache_get(channel_id):
+    item = _history_cache.get(channel_id)
+    if item is None:
+        return None
+    loaded_at, entries = item
+    if time.monotonic() - loaded_at > HISTORY_CACHE_TTL:
+        del _history_cache[channel_id]
+        return None
+    _history_cache.move_to_end(channel_id)
+    return entries
+
+def _cache_put(channel_id, entries):
+    _history_cache[channel_id] = (time.monotonic(), list(entries[-HISTORY_MAX_ENTRIES:]))
+    _history_cache.move_to_end(channel_id)
+    while len(_history_cache) > HISTORY_CACHE_CHANNELS:
+        _history_cache.popitem(last=False)
+
+def _cache_append(channel_id, entry):
+    # Only channels already cached are updated; a miss is filled on the next read.
+    item = _history_cache.get(channel_id)
+    if item is None:
+        return
+    loaded_at, entries = item
+    entries.append(entry)
+    del entries[:-HISTORY_MAX_ENTRIES]
+
+def forget_channels(predicate):
+    """
+    Drops the cached history and summary of every channel for which
+    predicate(channel_id) is true, e.g. when this process stops or starts
+    handling those channels and the cache may have missed other writes.
+    """
+    for channel_id in [c for c in _history_cache if predicate(c)]:
+        del _history_cache[channel_id]
+    _summary_cache.evict(predicate)
+
+def _export_cache_size():
+    metrics.set_gauge("history_cache_channels", len(_history_cache))
+
+metrics.register_collector(_export_cache_size)
+
+def make_entry(author, content, role=None):
+    """
+    Builds a HistoryEntry stamped with the current time and its token count.
+    """
+    return HistoryEntry(author, role or role_for(author), content, int(time.time()), count_tokens(content))
+
+def _decode_all(raw_entries):
+    entries = []
+    for raw in raw_entries:
+        entry = decode_entry(raw)
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
 def load_memory(channel_id, limit=10):
     """
     Retrieve the conversation history for a given channel.
@@ -25,28 +129,34 @@ def load_memory(channel_id, limit=10):
         limit (int): The number of message pairs to retrieve. Defaults to 10.
 
     Returns:
-        list: A list of conversation entries (strings).
+        list: A list of conversation entries ("author: content" strings).
     """
-    key = f"history:{channel_id}"
-    return r.lrange(key, -limit * 2, -1)
+    raw_entries = rb.lrange(_history_key(channel_id), -limit * 2, -1)
+    return [entry.text for entry in _decode_all(raw_entries)]
 
 def save_memory(channel_id, author, content):
     """
     Save a new conversation entry into Redis memory.
 
-    The entry is formatted as "author: content". After appending, the memory is
-    trimmed to keep only the last 40 entries, ensuring that the history remains manageable.
+    The entry is stored as a structured record (author, role, content,
+    timestamp, token count). After appending, the memory is trimmed to keep
+    only the last 40 entries and its idle expiry (HISTORY_TTL) is renewed.
 
     Parameters:
         channel_id (str): Unique identifier for the channel.
         author (str): The author of the message (user or bot).
         content (str): The content of the message.
     """
-    key = f"history:{channel_id}"
-    entry = f"{author}: {content}"
-    r.rpush(key, entry)
-    # Keep only the last 40 entries in the conversation history.
-    r.ltrim(key, -40, -1)
+    key = _history_key(channel_id)
+    entry = make_entry(author, content)
+    # Append, trim and renew the expiry in a single MULTI round-trip.
+    pipe = rb.pipeline(transaction=True)
+    pipe.rpush(key, encode_entry(entry))
+    pipe.ltrim(key, -HISTORY_MAX_ENTRIES, -1)
+    if HISTORY_TTL:
+        pipe.expire(key, HISTORY_TTL)
+    pipe.execute()
+    _cache_append(channel_id, entry)
 
 def clear_memory(channel_id):
     """
@@ -55,5 +165,120 @@ def clear_memory(channel_id):
     Parameters:
         channel_id (str): Unique identifier for the channel.
     """
-    key = f"history:{channel_id}"
-    r.delete(key)
+    r.delete(_history_key(channel_id), _summary_key(channel_id))
+    _history_cache.pop(channel_id, None)
+    _summary_cache.pop(channel_id)
+
+async def load_entries_async(channel_id, limit=10):
+    """
+    Returns the last 'limit * 2' entries of a channel as HistoryEntry records.
+    Reads through the in-process history cache.
+    """
+    entries = _cache_get(channel_id)
+    if entries is None:
+        metrics.inc("history_cache_requests_total", result="miss")
+        raw_entries = await arb.lrange(_history_key(channel_id), -HISTORY_MAX_ENTRIES, -1)
+        entries = _decode_all(raw_entries)
+        _cache_put(channel_id, entries)
+    else:
+        metrics.inc("history_cache_requests_total", result="hit")
+    return entries[-limit * 2:]
+
+async def save_memory_async(channel_id, author, content):
+    """
+    Async version of save_memory. The push, trim and expiry renewal are sent
+    as one MULTI/EXEC pipeline, so a save costs a single round-trip.
+
+    Parameters:
+        channel_id (str): Unique identifier for the channel.
+        author (str): The author of the message (user or bot).
+        content (str): The content of the message.
+
+    Returns:
+        HistoryEntry: The saved entry.
+    """
+    key = _history_key(channel_id)
+    entry = make_entry(author, content)
+    async with arb.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, encode_entry(entry))
+        pipe.ltrim(key, -HISTORY_MAX_ENTRIES, -1)
+        if HISTORY_TTL:
+            pipe.expire(key, HISTORY_TTL)
+        await pipe.execute()
+    _cache_append(channel_id, entry)
+    return entry
+
+async def clear_memory_async(channel_id):
+    """
+    Async version of clear_memory.
+
+    Parameters:
+        channel_id (str): Unique identifier for the channel.
+    """
+    await ar.delete(_history_key(channel_id), _summary_key(channel_id))
+    _cache_put(channel_id, [])
+    _summary_cache.set(channel_id, {})
+
+async def load_summary_async(channel_id):
+    """
+    Returns the channel's rolling summary as {"text": ..., "covers": ...,
+    "covers_ts": ..., "covers_author": ...}, where the covers fields identify
+    the newest history entry it includes (summaries saved before covers_ts
+    existed only have covers), or None.
+    """
+    summary = _summary_cache.get(channel_id)
+    if summary is None:
+        summary = await ar.hgetall(_summary_key(channel_id)) or {}
+        _summary_cache.set(channel_id, summary)
+    return summary or None
+
+async def save_summary_async(channel_id, text, covers):
+    """
+    Stores a new rolling summary covering history up to the HistoryEntry `covers`.
+    """
+    key = _summary_key(channel_id)
+    summary = {"text": text, "covers": covers.text, "covers_ts": str(covers.ts), "covers_author": covers.author}
+    async with ar.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=summary)
+        pipe.expire(key, SUMMARY_TTL)
+        await pipe.execute()
+    _summary_cache.set(channel_id, summary)
+
+class HistorySnapshot:
+    """
+    Request-scoped view of one channel's history.
+
+    Created once per message turn with snapshot_history(); every persona call
+    in that turn reads from it instead of Redis, and saves made through it are
+    written to Redis and appended to the local view so later steps see them.
+    """
+
+    def __init__(self, channel_id, entries):
+        self.channel_id = channel_id
+        self.entries = list(entries)
+
+    def recent_entries(self, limit=10):
+        """
+        Returns the last 'limit * 2' entries as HistoryEntry records.
+        """
+        return self.entries[-limit * 2:]
+
+    async def save(self, author, content):
+        """
+        Saves an entry to Redis (and the history cache) and to this snapshot.
+        """
+        with metrics.timer("turn_stage_seconds", stage="memory_save"):
+            entry = await save_memory_async(self.channel_id, author, content)
+        self.entries.append(entry)
+        del self.entries[:-HISTORY_MAX_ENTRIES]
+
+async def snapshot_history(channel_id):
+    """
+    Loads a channel's history once (through the cache) for a whole message turn.
+
+    Returns:
+        HistorySnapshot: The turn's view of the channel history.
+    """
+    with metrics.timer("turn_stage_seconds", stage="memory_load"):
+        entries = await load_entries_async(channel_id, limit=HISTORY_MAX_ENTRIES // 2)
+    return HistorySnapshot(channel_id, entries)
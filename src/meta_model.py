@@ -1,14 +1,12 @@
-import os
-from openai import OpenAI
+from src import metrics
+from src.llm_provider import openai_chat
+from src.model_registry import model_for
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
-import asyncio
 
-
-async def choose_best_response(user_text, persona_responses, second_pass=False):
+async def choose_best_response(user_text, persona_responses, second_pass=False, channel_id=None):
     """
-    Uses GPT-4 to pick the single best response from persona_responses
-    with the new openai.ChatCompletion.create interface.
+    Uses the registry's "meta_evaluator" model to pick the single best
+    response from persona_responses through the shared async provider layer.
     """
     system_prompt = (
         "You are a meta-evaluator. Given multiple persona responses, pick the single best or most relevant. "
@@ -19,18 +17,18 @@ async def choose_best_response(user_text, persona_responses, second_pass=False):
     for p, r in persona_responses.items():
         combined += f"{p}:\n{r}\n\n"
 
-    loop = asyncio.get_running_loop()
-
+    spec = model_for("meta_evaluator")
     try:
-        completion = await loop.run_in_executor(
-            None,
-            lambda: client.chat.completions.create(model="gpt-4",
+        completion = await openai_chat(
+            model=spec.model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": combined}
             ],
-            max_tokens=50,
-            temperature=0.2)
+            max_tokens=spec.max_tokens,
+            temperature=spec.temperature,
+            timeout=spec.timeout,
+            channel_id=channel_id
         )
         chosen = completion.choices[0].message.content.strip()
 
@@ -39,5 +37,6 @@ async def choose_best_response(user_text, persona_responses, second_pass=False):
         return chosen
 
     except Exception as e:
+        metrics.inc("errors_total", stage="meta_evaluator")
         print("Meta-model error:", e)
         return list(persona_responses.keys())[0]
@@ -0,0 +1,183 @@
+# src/metrics.py
+"""
+In-process counters, gauges and histograms shared by the bot's modules.
+
+Counters are keyed by name plus optional labels, e.g.
+inc("history_cache_requests_total", result="hit"). Gauges hold the last value
+set (set_gauge) or the largest value seen (observe_max). Histograms count
+observations (usually latencies, see timer()) into fixed buckets.
+
+Values that are cheaper to read when asked for than to keep current (cache
+sizes, latency quantiles) are set by collectors: functions registered with
+register_collector() that set their gauges right before every export.
+
+render_prometheus() writes everything in the Prometheus text format; the
+health server serves it on /metrics. With METRICS_ENABLED=0 the endpoint is
+off and observe()/timer() do nothing, so timed code pays one function call.
+Counters stay on: some modules read them back (get()).
+"""
+import os
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+_counters = {}
+_gauges = {}
+_histograms = {}  # key -> [count per bucket..., +Inf count, sum]
+_collectors = []
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def inc(name, value=1, **labels):
+    """
+    Adds value to the counter identified by name and labels.
+    """
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+def get(name, **labels):
+    """
+    Returns the current value of a counter (0 if it was never incremented).
+    """
+    return _counters.get(_key(name, labels), 0)
+
+def set_gauge(name, value, **labels):
+    """
+    Sets the gauge identified by name and labels to value.
+    """
+    _gauges[_key(name, labels)] = value
+
+def observe_max(name, value, **labels):
+    """
+    Raises the gauge identified by name and labels to value if it is larger.
+    """
+    key = _key(name, labels)
+    if value > _gauges.get(key, 0):
+        _gauges[key] = value
+
+def get_gauge(name, **labels):
+    return _gauges.get(_key(name, labels), 0)
+
+def register_collector(collector):
+    """
+    Registers collector() to be called before every export, to set gauges.
+    """
+    _collectors.append(collector)
+
+def _collect():
+    for collector in _collectors:
+        try:
+            collector()
+        except Exception as e:
+            print("Metrics collector error:", e)
+
+def observe(name, value, **labels):
+    """
+    Records value in the histogram identified by name and labels.
+    """
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        _histograms[key] = hist
+    i = 0
+    while i < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[i]:
+        i += 1
+    hist[i] += 1
+    hist[-1] += value
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.monotonic() - self.start, **self.labels)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name, **labels):
+    """
+    Context manager observing the duration of its block (in seconds) in the
+    histogram name, e.g. `with metrics.timer("turn_stage_seconds", stage="classification"):`.
+    """
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+def _label_str(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def render_prometheus():
+    """
+    All counters, gauges and histograms in the Prometheus text exposition format.
+    """
+    _collect()
+    lines = []
+    for kind, series in (("counter", _counters), ("gauge", _gauges)):
+        by_name = {}
+        for (name, labels), value in list(series.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in by_name[name]:
+                lines.append(f"{name}{_label_str(labels)} {value}")
+
+    by_name = {}
+    for (name, labels), hist in list(_histograms.items()):
+        by_name.setdefault(name, []).append((labels, list(hist)))
+    for name in sorted(by_name):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, hist in by_name[name]:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, hist):
+                cumulative += count
+                lines.append(f"{name}_bucket{_label_str(labels, [('le', bound)])} {cumulative}")
+            cumulative += hist[len(LATENCY_BUCKETS)]
+            lines.append(f"{name}_bucket{_label_str(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_label_str(labels)} {hist[-1]}")
+            lines.append(f"{name}_count{_label_str(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    """
+    Returns all counters and gauges as {"name{label=value,...}": value}.
+    """
+    _collect()
+    result = {}
+    for (name, labels), value in list(_counters.items()) + list(_gauges.items()):
+        if labels:
+            label_str = ",".join(f"{k}={v}" for k, v in labels)
+            result[f"{name}{{{label_str}}}"] = value
+        else:
+            result[name] = value
+    return result
@@ -0,0 +1,147 @@
+# src/model_registry.py
+"""
+Per-role model settings.
+
+The registry is src/data/models.json (or MODEL_REGISTRY_PATH), read once at
+import. Each role maps to a provider, model, temperature, max_tokens and
+timeout. A persona role also names its system prompt in src/persona_prompts.py.
+The roles are the four personas, "Governor", "governor_merge", "classifier",
+"meta_evaluator" and "summarizer". The classifier and meta_evaluator are
+called through the OpenAI chat API, so the registry rejects any other
+provider for them; the summarizer can use either provider.
+
+A role can have a "fallback" tier that overrides any of those fields, usually
+a faster and cheaper model, and a "latency_budget" in seconds. The fallback
+is a latency tier only: it is never tried when the primary fails (retries
+and hedging for errors are the resilience layer's job). Tiering is opt-in:
+with MODEL_TIERING=1, a role whose primary model shows a p95 time to first
+token above its budget is switched to the fallback tier for
+MODEL_TIER_COOLDOWN seconds. Only streamed calls record time to first token
+(see STREAM_REPLIES), so roles that are not streamed never switch; full
+completion times are not compared against the budget. After the cooldown,
+the primary's old samples are dropped and it gets another try.
+"""
+import os
+import json
+import time
+from collections import namedtuple
+
+from src import metrics
+from src.resilience import TTFT, latency_quantile, reset_latency
+
+MODEL_REGISTRY_PATH = os.getenv(
+    "MODEL_REGISTRY_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "models.json")
+)
+
+MODEL_TIERING = os.getenv("MODEL_TIERING", "0") == "1"
+MODEL_TIER_QUANTILE = float(os.getenv("MODEL_TIER_QUANTILE", "0.95"))
+MODEL_TIER_COOLDOWN = float(os.getenv("MODEL_TIER_COOLDOWN", "300"))
+
+PROVIDERS = ("openai", "anthropic")
+# Roles whose callers use the OpenAI chat API directly.
+OPENAI_ONLY_ROLES = ("classifier", "meta_evaluator")
+_REQUIRED = ("provider", "model", "temperature", "max_tokens", "timeout")
+
+ModelSpec = namedtuple("ModelSpec", ["role", "tier", "provider", "model", "temperature", "max_tokens", "timeout"])
+
+_degraded = {}  # role -> monotonic time its fallback tier ends
+
+def _check(role, tier, config):
+    missing = [field for field in _REQUIRED if field not in config]
+    if missing:
+        raise ValueError(f"Model registry: role {role} ({tier}) is missing {', '.join(missing)}")
+    if config["provider"] not in PROVIDERS:
+        raise ValueError(f"Model registry: role {role} has unknown provider {config['provider']!r}")
+    if role in OPENAI_ONLY_ROLES and config["provider"] != "openai":
+        raise ValueError(f"Model registry: role {role} ({tier}) must use provider 'openai', not {config['provider']!r}")
+
+def load_registry(path=MODEL_REGISTRY_PATH):
+    """
+    Reads and validates the registry file. Returns {role: {"primary": ModelSpec,
+    "fallback": ModelSpec or None, "latency_budget": float or None, "prompt": str or None}}.
+    Raises ValueError on an invalid entry so a bad file fails at startup.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    registry = {}
+    for role, config in raw.items():
+        _check(role, "primary", config)
+        primary = ModelSpec(role, "primary", *(config[field] for field in _REQUIRED))
+        fallback = None
+        if config.get("fallback"):
+            merged = dict(config, **config["fallback"])
+            _check(role, "fallback", merged)
+            fallback = ModelSpec(role, "fallback", *(merged[field] for field in _REQUIRED))
+        registry[role] = {
+            "primary": primary,
+            "fallback": fallback,
+            "latency_budget": config.get("latency_budget"),
+            "prompt": config.get("prompt"),
+        }
+    return registry
+
+_registry = load_registry()
+
+def _latency_key(spec):
+    return f"{spec.provider}:{spec.model}"
+
+def _observed_p95(spec):
+    # Only time to first token counts; full completion times are kept apart.
+    return latency_quantile(_latency_key(spec), TTFT, MODEL_TIER_QUANTILE)
+
+def model_for(role):
+    """
+    Returns the ModelSpec to use for role now, applying latency-budget tiering.
+    """
+    entry = _registry.get(role)
+    if entry is None:
+        raise KeyError(f"Model registry has no role {role!r}")
+    primary, fallback, budget = entry["primary"], entry["fallback"], entry["latency_budget"]
+    if not MODEL_TIERING or fallback is None or not budget:
+        return primary
+
+    now = time.monotonic()
+    until = _degraded.get(role)
+    if until is not None:
+        if now < until:
+            return fallback
+        # Cooldown over: judge the primary on fresh samples only.
+        del _degraded[role]
+        reset_latency(_latency_key(primary))
+        metrics.inc("model_tier_switches_total", role=role, tier="primary")
+        print(f"Model registry: {role} back on {primary.model}")
+        return primary
+
+    p95 = _observed_p95(primary)
+    if p95 is not None and p95 > budget:
+        _degraded[role] = now + MODEL_TIER_COOLDOWN
+        metrics.inc("model_tier_switches_total", role=role, tier="fallback")
+        print(f"Model registry: {role} p95 TTFT {p95:.2f}s over {budget}s budget, using {fallback.model}")
+        return fallback
+    return primary
+
+def prompt_name(role):
+    """
+    Name of the role's system prompt in src/persona_prompts.py, or None.
+    """
+    entry = _registry.get(role)
+    return entry["prompt"] if entry else None
+
+def roles():
+    return list(_registry)
+
+def _export_tiers():
+    """
+    Sets per role whether it currently runs on its fallback tier and the
+    observed p95 time to first token of its primary model.
+    """
+    now = time.monotonic()
+    for role, entry in _registry.items():
+        metrics.set_gauge("model_tier_degraded", int(_degraded.get(role, 0) > now), role=role)
+        p95 = _observed_p95(entry["primary"])
+        if p95 is not None:
+            metrics.set_gauge("model_primary_ttft_p95_seconds", p95, role=role)
+
+metrics.register_collector(_export_tiers)
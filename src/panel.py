@@ -0,0 +1,81 @@
+# src/panel.py
+"""
+Panel mode: every classified persona answers at the same time and the best
+reply (or the best PANEL_TOP_K) is posted, so a turn costs about one persona
+call instead of several back to back. It is switched on per channel with
+!panel (see src/persona_manager.py); src/aggregator.py runs the turn.
+
+Finished replies are scored locally as they arrive (score_response). With
+PANEL_EARLY_STOP=1 the turn stops as soon as it has enough replies scoring at
+least PANEL_GOOD_SCORE ("first good answer wins") and the slower calls are
+cancelled. The replies are then ranked: PANEL_RANKER=meta asks the
+meta-evaluator model for the best one when there is more than one candidate
+to choose from, PANEL_RANKER=local orders them by the local score only.
+"""
+import os
+import re
+
+from src import metrics
+from src.local_classifier import predict_proba
+from src.meta_model import choose_best_response
+
+PANEL_TOP_K = int(os.getenv("PANEL_TOP_K", "1"))
+PANEL_RANKER = os.getenv("PANEL_RANKER", "meta").lower()
+PANEL_EARLY_STOP = os.getenv("PANEL_EARLY_STOP", "1") == "1"
+PANEL_GOOD_SCORE = float(os.getenv("PANEL_GOOD_SCORE", "0.5"))
+# Seconds to wait for the panel before ranking whatever has finished.
+PANEL_TIMEOUT = float(os.getenv("PANEL_TIMEOUT", "20"))
+
+# Replies this many words long get the full length score.
+_FULL_LENGTH_WORDS = 20
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+def _content_words(text):
+    return {w for w in _WORD_RE.findall(text.lower()) if len(w) > 3}
+
+def persona_fit(user_text):
+    """
+    Returns {persona: probability} from the local classifier, used as the
+    prior of each persona's reply. Empty when no classifier model is shipped.
+    """
+    return predict_proba(user_text)
+
+def score_response(persona, user_text, response, fit=None):
+    """
+    Cheap local quality score in [0, 1] for one reply: how well the persona
+    fits the message, how much of the message the reply picks up, and whether
+    it is long enough to be an answer. Empty and error replies score 0.
+    """
+    if not response or response.startswith("Error:"):
+        return 0.0
+    fit = fit if fit is not None else persona_fit(user_text)
+    # Relative to the best-fitting persona, so it gets the full prior
+    prior = fit.get(persona, 0.0) / max(fit.values()) if fit else 1.0
+
+    asked = _content_words(user_text)
+    overlap = len(asked & _content_words(response)) / len(asked) if asked else 0.5
+
+    length = min(1.0, len(response.split()) / _FULL_LENGTH_WORDS)
+    return 0.4 * prior + 0.3 * overlap + 0.3 * length
+
+def enough_good(scores, top_k):
+    """
+    True when the early stop may cancel the rest of the panel.
+    """
+    return PANEL_EARLY_STOP and sum(1 for s in scores.values() if s >= PANEL_GOOD_SCORE) >= top_k
+
+async def rank_responses(user_text, responses, scores, top_k, channel_id=None):
+    """
+    Returns the names of the top_k replies, best first. Replies scoring 0
+    (errors) are only kept when nothing else is left.
+    """
+    ranked = sorted(responses, key=lambda name: scores.get(name, 0.0), reverse=True)
+    usable = [name for name in ranked if scores.get(name, 0.0) > 0] or ranked[:1]
+    if PANEL_RANKER == "meta" and len(usable) > top_k:
+        with metrics.timer("turn_stage_seconds", stage="panel_rank"):
+            best = await choose_best_response(
+                user_text, {name: responses[name] for name in usable}, channel_id=channel_id
+            )
+        usable = [best] + [name for name in usable if name != best]
+    return usable[:top_k]
@@ -1,80 +1,112 @@
 import os
-import asyncio
-from dotenv import load_dotenv
-from openai import OpenAI
-import anthropic
-
-from src.memory_manager import load_memory
-from src.persona_prompts import (
-    cyclo_prompt,
-    emo_prompt,
-    prim_prompt,
-    spri_prompt,
-    governor_prompt
-)
 
-# Load environment variables from .env file
-load_dotenv()
+from src.llm_provider import (
+    openai_chat,
+    anthropic_messages,
+    openai_chat_stream,
+    anthropic_messages_stream
+)
+from src.llm_scheduler import PRIORITY_FIRST, PRIORITY_MERGE
+from src.memory_manager import load_entries_async, HISTORY_MAX_ENTRIES
+from src.context_builder import build_context
+from src import metrics
+from src import response_cache
+from src import persona_prompts
+from src.model_registry import model_for, prompt_name
+from src.token_count import count_tokens
 
 # Load API keys from environment variables
-openai_api_key = os.getenv("OPENAI_API_KEY", "")
 anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "")
 
-client = OpenAI(api_key=openai_api_key)
-
-
-# Temperature settings for each persona
-temperature_map = {
-    "Governor": 0.4,  # Governor uses OpenAI
-    "Cyclo": 0.3,
-    "Emo": 0.5,
-    "Prim": 0.7,
-    "Spri": 1.0
-}
-
-# Define the Anthropic model to use (Claude 3 Sonnet)
-CLAUDE_MODEL = "claude-3-sonnet-20240229"
-
-def get_system_prompt(persona_name):
-    if persona_name == "Cyclo":
-        return cyclo_prompt
-    elif persona_name == "Emo":
-        return emo_prompt
-    elif persona_name == "Prim":
-        return prim_prompt
-    elif persona_name == "Spri":
-        return spri_prompt
-    elif persona_name == "Governor":
-        return governor_prompt
-    else:
-        return "You are an AI assistant."
+# Anthropic prompt caching. The only prefix that stays the same from call to
+# call is the system prompt plus the rolling-summary turn (unchanged between
+# summary refreshes); the history after it slides with every new message. That
+# prefix gets a cache_control breakpoint once it reaches
+# ANTHROPIC_CACHE_MIN_TOKENS, Anthropic's minimum (1024 tokens for Sonnet/Opus,
+# 2048 for Haiku); shorter prefixes are never cached. With the current persona
+# prompts (about 100 tokens) and summaries (under 150 words) the prefix stays
+# far below that, so caching is a no-op until the prompts grow.
+ANTHROPIC_PROMPT_CACHE = os.getenv("ANTHROPIC_PROMPT_CACHE", "1") == "1"
+ANTHROPIC_CACHE_MIN_TOKENS = int(os.getenv("ANTHROPIC_CACHE_MIN_TOKENS", "1024"))
 
-async def call_persona(persona_name, user_text, channel_id, max_tokens=350, temperature=None):
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+# Stands in for a message without text (e.g. attachments only), so the last
+# turn is never empty; Anthropic rejects an empty message list.
+EMPTY_INPUT = "(The user sent a message without text.)"
+
+def get_system_prompt(role):
+    """
+    The system prompt named by the role's entry in the model registry.
     """
-    Calls the appropriate API:
-    - For Governor: uses OpenAI (GPT-4)
-    - For all other personas: uses Anthropic's Claude.
+    name = prompt_name(role)
+    prompt = getattr(persona_prompts, name, None) if name else None
+    return prompt or "You are an AI assistant."
+
+async def call_persona(persona_name, user_text, channel_id, max_tokens=None, temperature=None, on_chunk=None, history=None,
+                       priority=PRIORITY_FIRST):
+    """
+    Calls the persona's provider and model from the model registry
+    (src/data/models.json), which also supplies the default max_tokens and
+    temperature and may switch to the role's faster tier under load.
+
+    If on_chunk is given, the provider's streaming API is used and
+    on_chunk(text_so_far) is awaited after every received delta.
+    The full (persona_name, text) tuple is still returned at the end.
+
+    history is an optional HistorySnapshot for the current turn; without one
+    the channel history is loaded from memory. priority is the scheduler class
+    of the call (see src/llm_scheduler.py).
+
+    With RESPONSE_CACHE_ENABLED=1, an identical earlier request (same persona,
+    prompt, history window, text and parameters) is answered from the
+    response cache; a streamed call then gets the whole reply as one chunk.
     """
+    spec = model_for(persona_name)
     system_prompt = get_system_prompt(persona_name)
     if temperature is None:
-        temperature = temperature_map.get(persona_name, 0.7)
+        temperature = spec.temperature
+    if max_tokens is None:
+        max_tokens = spec.max_tokens
 
-    # Load conversation history and construct final input
-    history = load_memory(channel_id, limit=10)
-    context_str = "\n".join(history) if history else ""
-    final_user_input = f"Context:\n{context_str}\n\n{user_text}"
+    # Fit the conversation history into the token budget and lay it out as role turns
+    entries = await _recent_history(channel_id, history)
+    context = await build_context(channel_id, entries, system_prompt, user_text)
+    turns = build_turns(persona_name, context.entries, user_text, summary=context.summary)
 
-    if persona_name == "Governor":
-        return await _call_openai(persona_name, system_prompt, final_user_input, max_tokens, temperature)
-    else:
-        return await _call_claude(persona_name, system_prompt, final_user_input, max_tokens, temperature)
+    cache_key = response_cache.response_key(
+        persona_name, system_prompt, [context.summary] + [e.text for e in context.entries], user_text,
+        spec.model, temperature, max_tokens
+    )
+    if cache_key is not None:
+        cached = await response_cache.lookup(persona_name, cache_key)
+        if cached is not None:
+            if on_chunk is not None:
+                await on_chunk(cached)
+            return (persona_name, cached)
+
+    with metrics.timer("persona_call_seconds", persona=persona_name, model=spec.model):
+        result = await _call_model(spec, persona_name, system_prompt, turns, max_tokens, temperature, on_chunk,
+                                   priority, channel_id)
+
+    # Error replies are never cached
+    if cache_key is not None and result[1] and not result[1].startswith("Error:"):
+        await response_cache.store(cache_key, result[1])
+    return result
 
-async def call_persona_governor(responses_dict, user_text, channel_id, max_tokens=350, temperature=None):
+async def call_persona_governor(responses_dict, user_text, channel_id, max_tokens=None, temperature=None, on_chunk=None, history=None,
+                                priority=PRIORITY_MERGE):
     """
-    Specialized function to merge multiple persona outputs via Governor (using OpenAI).
+    Specialized function to merge multiple persona outputs via Governor
+    (registry role "governor_merge").
+    Streams through on_chunk and reads history the same way as call_persona.
     """
+    spec = model_for("governor_merge")
+    system_prompt = get_system_prompt("governor_merge")
     if temperature is None:
-        temperature = temperature_map.get("Governor", 0.4)
+        temperature = spec.temperature
+    if max_tokens is None:
+        max_tokens = spec.max_tokens
 
     # Combine user text and responses from other personas
     content_str = f"User's question:\n{user_text}\n\n"
@@ -82,57 +114,177 @@ async def call_persona_governor(responses_dict, user_text, channel_id, max_token
     for name, text in responses_dict.items():
         content_str += f"{name} responded:\n{text}\n\n"
 
-    history = load_memory(channel_id, limit=10)
-    context_str = "\n".join(history) if history else ""
-    final_user_input = f"Context:\n{context_str}\n\n{content_str}"
+    entries = await _recent_history(channel_id, history)
+    context = await build_context(channel_id, entries, system_prompt, content_str)
+    turns = build_turns("Governor", context.entries, content_str, summary=context.summary)
+
+    with metrics.timer("persona_call_seconds", persona="Governor", model=spec.model):
+        return await _call_model(spec, "Governor", system_prompt, turns, max_tokens, temperature, on_chunk,
+                                 priority, channel_id)
+
+def build_turns(persona_name, history, user_text, summary=None):
+    """
+    Lays the history window and the new input out as alternating
+    (role, [text, ...]) turns. The persona's own history lines become its
+    assistant turns; everyone else's stay user turns as "Name: text".
+    Consecutive lines with the same role share a turn, the first turn is
+    always a user turn, and user_text (EMPTY_INPUT if blank) is the last text
+    of the last turn. A rolling summary of older turns, if any, opens the
+    conversation.
+    """
+    turns = []
+    if summary:
+        _append_turn(turns, "user", f"{SUMMARY_HEADER}\n{summary}")
+    for entry in history:
+        if entry.author == persona_name and turns:
+            _append_turn(turns, "assistant", entry.content)
+        else:
+            _append_turn(turns, "user", entry.text)
+    _append_turn(turns, "user", user_text if user_text.strip() else EMPTY_INPUT)
+    return turns
+
+def _append_turn(turns, role, text):
+    if not text:
+        return
+    if turns and turns[-1][0] == role:
+        turns[-1][1].append(text)
+    else:
+        turns.append((role, [text]))
+
+def _openai_messages(system_prompt, turns):
+    """
+    Chat Completions layout. The system prompt and history come first and
+    unchanged between calls, so OpenAI's automatic prefix caching can apply.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    for role, texts in turns:
+        messages.append({"role": role, "content": "\n".join(texts)})
+    return messages
 
-    return await _call_openai("Governor", governor_prompt, final_user_input, max_tokens, temperature)
+def _anthropic_payload(system_prompt, turns):
+    """
+    Messages API layout: (system, messages). With ANTHROPIC_PROMPT_CACHE the
+    stable prefix (system prompt, plus the summary turn when there is one)
+    ends in a cache_control breakpoint if it has ANTHROPIC_CACHE_MIN_TOKENS.
+    """
+    system = [{"type": "text", "text": system_prompt}]
+    messages = [
+        {"role": role, "content": [{"type": "text", "text": t} for t in texts]}
+        for role, texts in turns
+    ]
+    if ANTHROPIC_PROMPT_CACHE:
+        last = system[0]
+        prefix_tokens = count_tokens(system_prompt)
+        first = messages[0]["content"][0] if messages else None
+        if first is not None and first["text"].startswith(SUMMARY_HEADER):
+            last = first
+            prefix_tokens += count_tokens(first["text"])
+        if prefix_tokens >= ANTHROPIC_CACHE_MIN_TOKENS:
+            last["cache_control"] = {"type": "ephemeral"}
+    return system, messages
 
-async def _call_openai(persona_name, system_prompt, raw_input, max_tokens, temperature):
+async def _recent_history(channel_id, snapshot):
+    """
+    The stored channel history (HistoryEntry records), from the turn's
+    snapshot when there is one; build_context() decides how much of it is sent.
     """
-    Helper function using OpenAI's ChatCompletion.create with the new interface.
+    if snapshot is not None:
+        return snapshot.recent_entries(limit=HISTORY_MAX_ENTRIES // 2)
+    return await load_entries_async(channel_id, limit=HISTORY_MAX_ENTRIES // 2)
+
+async def _collect_stream(stream, on_chunk):
     """
-    loop = asyncio.get_running_loop()
+    Drains a provider text stream, reporting the accumulated text after each delta.
+    """
+    text = ""
     try:
-        completion = await loop.run_in_executor(
-            None,
-            lambda: client.chat.completions.create(model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": raw_input}
-            ],
+        async for delta in stream:
+            text += delta
+            await on_chunk(text)
+    finally:
+        await stream.aclose()
+    return text.strip()
+
+async def _call_model(spec, persona_name, system_prompt, turns, max_tokens, temperature, on_chunk=None,
+                      priority=PRIORITY_FIRST, channel_id=None):
+    """
+    Dispatches to the provider of the registry entry spec.
+    """
+    call = _call_openai if spec.provider == "openai" else _call_claude
+    return await call(spec, persona_name, system_prompt, turns, max_tokens, temperature, on_chunk,
+                      priority, channel_id)
+
+async def _call_openai(spec, persona_name, system_prompt, turns, max_tokens, temperature, on_chunk=None,
+                       priority=PRIORITY_FIRST, channel_id=None):
+    """
+    Helper function using OpenAI's chat completions on the shared async client.
+    """
+    messages = _openai_messages(system_prompt, turns)
+    try:
+        if on_chunk is not None:
+            stream = openai_chat_stream(
+                model=spec.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=spec.timeout,
+                priority=priority,
+                channel_id=channel_id
+            )
+            return (persona_name, await _collect_stream(stream, on_chunk))
+
+        completion = await openai_chat(
+            model=spec.model,
+            messages=messages,
             max_tokens=max_tokens,
-            temperature=temperature)
+            temperature=temperature,
+            timeout=spec.timeout,
+            priority=priority,
+            channel_id=channel_id
         )
         answer = completion.choices[0].message.content.strip()
         return (persona_name, answer)
     except Exception as e:
+        metrics.inc("errors_total", stage="persona_call")
         print(f"OpenAI error ({persona_name}):", e)
         return (persona_name, f"Error: {str(e)}")
 
-async def _call_claude(persona_name, system_prompt, raw_input, max_tokens, temperature):
+async def _call_claude(spec, persona_name, system_prompt, turns, max_tokens, temperature, on_chunk=None,
+                       priority=PRIORITY_FIRST, channel_id=None):
     """
-    Helper function using Anthropic's Claude API.
+    Helper function using Anthropic's Claude API on the shared async client.
     """
     if not anthropic_api_key:
         return (persona_name, "Error: No Anthropic API key provided.")
 
-    client = anthropic.Anthropic(api_key=anthropic_api_key)
-
-    loop = asyncio.get_running_loop()
+    system, messages = _anthropic_payload(system_prompt, turns)
     try:
-        response = await loop.run_in_executor(
-            None,
-            lambda: client.messages.create(
-                model=CLAUDE_MODEL,
+        if on_chunk is not None:
+            stream = anthropic_messages_stream(
+                model=spec.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                system=system_prompt,
-                messages=[{"role": "user", "content": raw_input}]
+                system=system,
+                messages=messages,
+                timeout=spec.timeout,
+                priority=priority,
+                channel_id=channel_id
             )
+            return (persona_name, await _collect_stream(stream, on_chunk))
+
+        response = await anthropic_messages(
+            model=spec.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=messages,
+            timeout=spec.timeout,
+            priority=priority,
+            channel_id=channel_id
         )
         answer = response.content[0].text.strip()
         return (persona_name, answer)
     except Exception as e:
+        metrics.inc("errors_total", stage="persona_call")
         print(f"Claude error ({persona_name}):", e)
         return (persona_name, f"Error: {str(e)}")
@@ -1,102 +1,197 @@
 # src/persona_manager.py
 """
-Manages persona activation, isolation mode, and resets.
+Manages persona activation, isolation mode, panel mode, and resets, per channel.
+
+Each channel's state is one small Redis hash, "personas:{channel_id}", holding
+an active-persona bitmask ("a"), the isolated persona ("i", empty when
+isolation is off) and the panel size ("p", 0 when panel mode is off; see
+src/panel.py). Channels in the default state (everyone active, no isolation,
+no panel) have no key at all. Reads go through a short-lived in-process
+cache; updates are optimistic WATCH/MULTI transactions, so several worker
+processes see a consistent view.
 """
+import os
+from collections import namedtuple
 
-active_personas = {
-    "Cyclo": True,
-    "Emo": True,
-    "Prim": True,
-    "Spri": True,
-    "Governor": True  # Governor is treated as a special persona
-}
+from redis.exceptions import WatchError
 
-isolation_mode = False
-isolated_persona = None
+from src.memory_manager import ar
+from src.ttl_cache import TTLCache
 
-def remove_persona(persona):
+MAIN_PERSONAS = ["Cyclo", "Emo", "Prim", "Spri"]
+ALL_PERSONAS = MAIN_PERSONAS + ["Governor"]  # Governor is treated as a special persona
+
+_BITS = {p: 1 << i for i, p in enumerate(ALL_PERSONAS)}
+_ALL_MASK = (1 << len(ALL_PERSONAS)) - 1
+
+# How long a worker may serve a channel's state from memory before re-reading Redis.
+PERSONA_STATE_CACHE_TTL = float(os.getenv("PERSONA_STATE_CACHE_TTL", "5"))
+PERSONA_STATE_CACHE_SIZE = int(os.getenv("PERSONA_STATE_CACHE_SIZE", "5000"))
+
+_cache = TTLCache(PERSONA_STATE_CACHE_SIZE, PERSONA_STATE_CACHE_TTL)
+
+class PersonaState(namedtuple("PersonaState", ["mask", "isolated", "panel"])):
     """
-    Deactivates a persona. If that leaves only one
-    from the four main (Cyclo/Emo/Prim/Spri), we enter isolation mode.
-    Governor cannot be removed.
-    We also prevent removing all four main personas entirely.
+    One channel's persona state: a bitmask of active personas, the
+    isolated persona (None when isolation is off) and how many replies a
+    panel turn posts (0 when panel mode is off).
     """
-    global isolation_mode, isolated_persona
+    __slots__ = ()
 
-    # Never remove Governor
-    if persona == "Governor":
-        return
+    def is_active(self, persona):
+        return bool(self.mask & _BITS.get(persona, 0))
+
+    @property
+    def isolation_mode(self):
+        return self.isolated is not None
+
+    def active_personas(self):
+        if self.isolated:
+            return [self.isolated]
+        return [p for p in MAIN_PERSONAS if self.is_active(p)]
 
-    if persona in active_personas:
-        active_personas[persona] = False
+DEFAULT_STATE = PersonaState(_ALL_MASK, None, 0)
+
+def _key(channel_id):
+    return f"personas:{channel_id}"
+
+def _decode(raw):
+    if not raw:
+        return DEFAULT_STATE
+    return PersonaState(int(raw.get("a", _ALL_MASK)), raw.get("i") or None, int(raw.get("p", 0)))
+
+def _with(state, persona, active):
+    bit = _BITS[persona]
+    return state._replace(mask=(state.mask | bit) if active else (state.mask & ~bit))
+
+async def get_persona_state(channel_id):
+    """
+    Returns the channel's PersonaState, from the in-process cache when fresh.
+    """
+    state = _cache.get(channel_id)
+    if state is None:
+        state = _decode(await ar.hgetall(_key(channel_id)))
+        _cache.set(channel_id, state)
+    return state
+
+def forget_channels(predicate):
+    """
+    Drops the cached state of every channel for which predicate(channel_id) is true.
+    """
+    _cache.evict(predicate)
+
+async def _update(channel_id, change):
+    """
+    Applies change(state) -> state atomically in Redis and refreshes the cache.
+    """
+    key = _key(channel_id)
+    async with ar.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                state = _decode(await pipe.hgetall(key))
+                new_state = change(state)
+                pipe.multi()
+                if new_state == DEFAULT_STATE:
+                    pipe.delete(key)
+                else:
+                    pipe.hset(key, mapping={
+                        "a": new_state.mask, "i": new_state.isolated or "", "p": new_state.panel
+                    })
+                await pipe.execute()
+                break
+            except WatchError:
+                continue
+    _cache.set(channel_id, new_state)
+    return new_state
+
+def _remove(state, persona):
+    # Never remove Governor
+    if persona == "Governor" or persona not in _BITS:
+        return state
+    new_state = _with(state, persona, False)
 
     # Count how many of the four main personas remain active
-    main_active = [p for p in ["Cyclo", "Emo", "Prim", "Spri"] if active_personas[p]]
+    main_active = [p for p in MAIN_PERSONAS if new_state.is_active(p)]
 
     # If zero remain, revert this removal (can't remove all)
     if len(main_active) == 0:
-        # revert
-        active_personas[persona] = True
-        return
+        return state
 
     # If exactly one remains, we enter isolation mode with that persona
     if len(main_active) == 1:
-        isolation_mode = True
-        isolated_persona = main_active[0]
+        return new_state._replace(isolated=main_active[0])
+    return new_state
 
-def add_persona(persona):
+def _add(state, persona):
+    if persona in _BITS:
+        state = _with(state, persona, True)
+
+    # Exit isolation if more than one main persona is active
+    main_active = [p for p in MAIN_PERSONAS if state.is_active(p)]
+    if len(main_active) > 1:
+        state = state._replace(isolated=None)
+    return state
+
+def _isolate(state, persona):
+    if persona == "Governor" or persona not in _BITS:
+        return state
+    mask = state.mask
+    for p in MAIN_PERSONAS:
+        mask = (mask | _BITS[p]) if p == persona else (mask & ~_BITS[p])
+    return state._replace(mask=mask, isolated=persona)
+
+async def remove_persona(channel_id, persona):
     """
-    Reactivates a persona. If more than one main persona
-    is active, we exit isolation mode.
+    Deactivates a persona in a channel. If that leaves only one
+    from the four main (Cyclo/Emo/Prim/Spri), we enter isolation mode.
+    Governor cannot be removed.
+    We also prevent removing all four main personas entirely.
     """
-    global isolation_mode, isolated_persona
-    if persona in active_personas:
-        active_personas[persona] = True
+    return await _update(channel_id, lambda state: _remove(state, persona))
 
-    # Recount how many main personas are active
-    main_active = [p for p in ["Cyclo", "Emo", "Prim", "Spri"] if active_personas[p]]
+async def add_persona(channel_id, persona):
+    """
+    Reactivates a persona in a channel. If more than one main persona
+    is active, we exit isolation mode.
+    """
+    return await _update(channel_id, lambda state: _add(state, persona))
 
-    if len(main_active) > 1:
-        # Exit isolation if more than one
-        isolation_mode = False
-        isolated_persona = None
+async def reset_personas(channel_id):
+    """
+    Resets all personas (including Governor) in a channel to active,
+    and turns off isolation mode. Panel mode is a channel setting of its
+    own and stays as it is.
+    """
+    return await _update(channel_id, lambda state: DEFAULT_STATE._replace(panel=state.panel))
 
-def reset_personas():
+async def set_panel_mode(channel_id, top_k):
     """
-    Resets all personas (including Governor) to active,
-    and turns off isolation mode.
+    Turns panel mode on for a channel, posting the top_k replies of each
+    turn, or off with top_k=0.
     """
-    global isolation_mode, isolated_persona
-    isolation_mode = False
-    isolated_persona = None
-    for p in active_personas:
-        active_personas[p] = True
+    return await _update(channel_id, lambda state: state._replace(panel=max(0, int(top_k))))
 
-def isolate_persona(persona):
+async def isolate_persona(channel_id, persona):
     """
-    Directly isolate a single persona, ignoring the rest.
+    Directly isolate a single persona in a channel, ignoring the rest.
     Governor won't be isolated in that sense.
     """
-    global isolation_mode, isolated_persona
-    if persona == "Governor":
-        return
+    return await _update(channel_id, lambda state: _isolate(state, persona))
 
-    if persona in active_personas:
-        isolation_mode = True
-        isolated_persona = persona
-        for p in ["Cyclo", "Emo", "Prim", "Spri"]:
-            active_personas[p] = (p == persona)
-
-def get_active_personas():
+async def get_active_personas(channel_id):
     """
-    Returns all active 'main' personas (Cyclo, Emo, Prim, Spri),
+    Returns all active 'main' personas (Cyclo, Emo, Prim, Spri) in a channel,
     ignoring Governor in the normal list. If isolation is in effect,
     returns just the isolated one.
     """
-    global isolation_mode, isolated_persona
-    if isolation_mode and isolated_persona:
-        return [isolated_persona]
-    return [p for p in ["Cyclo", "Emo", "Prim", "Spri"] if active_personas[p]]
+    return (await get_persona_state(channel_id)).active_personas()
+
+async def is_isolation_mode(channel_id):
+    return (await get_persona_state(channel_id)).isolation_mode
 
-def is_isolation_mode():
-    return isolation_mode
+async def get_panel_size(channel_id):
+    """
+    Returns how many replies a panel turn posts in the channel (0 when panel mode is off).
+    """
+    return (await get_persona_state(channel_id)).panel
@@ -0,0 +1,204 @@
+# src/postprocess.py
+"""
+Post-processing of persona replies before they are shown or saved.
+
+ResponseSanitizer compiles its rules once: asterisk actions are removed with
+one regex, every unwanted phrase is merged into a single case-insensitive
+alternation, and the persona-name prefix check is a plain string comparison.
+StreamSanitizer applies the same rules to a streamed reply chunk by chunk,
+holding back only text that could still turn out to be an open *...* span,
+the start of an unwanted phrase, or a persona-name prefix.
+"""
+import re
+
+UNWANTED_PHRASES = [
+    "is reflecting on your question",
+    "has something thoughtful to share",
+    "is working on an answer right now",
+]
+
+# Italicized narrative actions such as *nods* or *smiles warmly*.
+ACTION_PATTERN = r"\*[^*]+\*"
+
+class ResponseSanitizer:
+    """
+    Compiled response clean-up rules.
+
+    Parameters:
+        unwanted_phrases (list): Phrases removed anywhere in the reply (case-insensitive).
+        strip_actions (bool): Remove text enclosed in asterisks.
+        strip_name_prefix (bool): Remove a leading "PersonaName:" prefix.
+    """
+
+    def __init__(self, unwanted_phrases=None, strip_actions=True, strip_name_prefix=True):
+        phrases = UNWANTED_PHRASES if unwanted_phrases is None else unwanted_phrases
+        self.unwanted_phrases = [p for p in phrases if p]
+        self.strip_actions = strip_actions
+        self.strip_name_prefix = strip_name_prefix
+        self._action_re = re.compile(ACTION_PATTERN)
+        self._phrase_re = None
+        if self.unwanted_phrases:
+            # Longest first, so a phrase that contains another still wins.
+            ordered = sorted(self.unwanted_phrases, key=len, reverse=True)
+            self._phrase_re = re.compile("|".join(re.escape(p) for p in ordered), re.IGNORECASE)
+        self._phrase_prefixes = {p.lower()[:i] for p in self.unwanted_phrases for i in range(1, len(p))}
+        self._max_phrase_len = max((len(p) for p in self.unwanted_phrases), default=0)
+
+    @staticmethod
+    def name_prefixes(persona_name):
+        return [f"{persona_name}:", f"{persona_name.lower()}:", f"{persona_name.capitalize()}:"]
+
+    def remove_phrases(self, text):
+        if self._phrase_re is None:
+            return text
+        return self._phrase_re.sub("", text)
+
+    def strip_prefix(self, persona_name, text):
+        stripped = text.strip()
+        if self.strip_name_prefix:
+            for prefix in self.name_prefixes(persona_name):
+                if stripped.startswith(prefix):
+                    return stripped[len(prefix):].strip()
+        return stripped
+
+    def sanitize(self, persona_name, response):
+        """
+        Cleans up a complete reply: removes *actions*, unwanted phrases and a
+        leading persona-name prefix, then strips surrounding whitespace.
+        """
+        cleaned = self._action_re.sub("", response) if self.strip_actions else response
+        cleaned = self.remove_phrases(cleaned)
+        return self.strip_prefix(persona_name, cleaned)
+
+    def stream(self, persona_name):
+        """
+        Returns a StreamSanitizer applying these rules to a streamed reply.
+        """
+        return StreamSanitizer(self, persona_name)
+
+class StreamSanitizer:
+    """
+    Incremental form of ResponseSanitizer.sanitize for one streamed reply.
+
+    feed() takes the next raw chunk and returns newly safe display text;
+    finish() flushes whatever was held back. The concatenation of all returned
+    pieces equals sanitize() of the full reply. update() is a convenience for
+    callbacks that receive the accumulated raw text instead of deltas.
+    """
+
+    def __init__(self, sanitizer, persona_name):
+        self.sanitizer = sanitizer
+        self.prefixes = sanitizer.name_prefixes(persona_name) if sanitizer.strip_name_prefix else []
+        self._max_prefix_len = max((len(p) for p in self.prefixes), default=0)
+        self._raw = ""        # raw text not yet through action removal
+        self._phrases = ""    # action-free text not yet through phrase removal
+        self._head = ""       # phrase-free text held until the prefix is decided
+        self._prefix_done = not self.prefixes
+        self._trailing = ""   # whitespace held until more text follows
+        self._started = False
+        self._seen = 0
+        self.text = ""
+
+    def update(self, text_so_far):
+        """
+        Feeds the part of text_so_far not seen yet and returns all safe text so far.
+        """
+        self.feed(text_so_far[self._seen:])
+        return self.text
+
+    def feed(self, chunk):
+        self._seen += len(chunk)
+        self._raw += chunk
+        out = self._phrase_stage(self._action_stage(final=False), final=False)
+        return self._emit(self._prefix_stage(out, final=False), final=False)
+
+    def finish(self):
+        out = self._phrase_stage(self._action_stage(final=True), final=True)
+        return self._emit(self._prefix_stage(out, final=True), final=True)
+
+    def _action_stage(self, final):
+        if not self.sanitizer.strip_actions:
+            out, self._raw = self._raw, ""
+            return out
+        out = []
+        raw = self._raw
+        pos = 0
+        while True:
+            star = raw.find("*", pos)
+            if star == -1:
+                out.append(raw[pos:])
+                pos = len(raw)
+                break
+            out.append(raw[pos:star])
+            pos = star
+            close = raw.find("*", star + 1)
+            if close == -1:
+                # Possibly an open *action*; wait for more text.
+                break
+            if close == star + 1:
+                # "**" never starts a match; the first star is literal.
+                out.append("*")
+                pos = star + 1
+                continue
+            pos = close + 1
+        self._raw = raw[pos:]
+        if final:
+            out.append(self._raw)
+            self._raw = ""
+        return "".join(out)
+
+    def _phrase_stage(self, text, final):
+        buf = self._phrases + text
+        regex = self.sanitizer._phrase_re
+        if regex is None or final:
+            self._phrases = ""
+            return self.sanitizer.remove_phrases(buf)
+
+        # Hold back the longest tail that could still grow into an unwanted phrase.
+        lower = buf.lower()
+        cut = len(buf)
+        for k in range(min(len(buf), self.sanitizer._max_phrase_len - 1), 0, -1):
+            if lower[-k:] in self.sanitizer._phrase_prefixes:
+                cut = len(buf) - k
+                break
+
+        out = []
+        pos = 0
+        for m in regex.finditer(buf):
+            if m.start() >= cut:
+                break
+            out.append(buf[pos:m.start()])
+            pos = m.end()
+        if pos < cut:
+            out.append(buf[pos:cut])
+            pos = cut
+        self._phrases = buf[pos:]
+        return "".join(out)
+
+    def _prefix_stage(self, text, final):
+        if self._prefix_done:
+            return text
+        self._head += text
+        head = self._head.lstrip()
+        if not final and len(head) < self._max_prefix_len and any(p.startswith(head) for p in self.prefixes):
+            return ""
+        self._prefix_done = True
+        self._head = ""
+        for prefix in self.prefixes:
+            if head.startswith(prefix):
+                return head[len(prefix):]
+        return head
+
+    def _emit(self, text, final):
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._trailing + text
+        body = text.rstrip()
+        self._trailing = "" if final else text[len(body):]
+        self.text += body
+        return body
+
+default_sanitizer = ResponseSanitizer()
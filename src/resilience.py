@@ -0,0 +1,237 @@
+# src/resilience.py
+"""
+Retries and hedged requests around provider calls.
+
+Retryable failures (connection errors, timeouts, 408/409/429 and 5xx) are
+retried up to LLM_MAX_RETRIES times with full-jitter exponential backoff,
+honouring a provider's retry-after header when it asks for longer, but never
+past the deadline of the turn making the call. Streams are only retried while
+nothing has been yielded yet.
+
+With LLM_HEDGING=1, a call that is slower than the observed p95 of its
+provider/model gets a duplicate request; whichever produces its first token
+(or, for non-streaming calls, finishes) first is kept and the other is
+cancelled. Streamed and non-streamed calls keep separate latency windows:
+streams are measured to their first delta ("ttft") and hedge on that, plain
+calls are measured to the full response ("completion") and hedge on that, so
+long completions never stretch the threshold streams are hedged against.
+Hedges and hedge wins are counted per target and kind so the threshold can
+be tuned; the current thresholds are exported as gauges.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+from src import metrics
+from src.turn_scope import remaining_time
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+# No hedging until this many latencies have been observed.
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Never hedge earlier than this, however fast the provider has been.
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_NAMES = {"APIConnectionError", "APITimeoutError", "TimeoutException", "ConnectError", "ReadError"}
+
+# Latency kinds: time to first delta of streams, full time of plain calls.
+TTFT = "ttft"
+COMPLETION = "completion"
+
+_latency = {}  # ("provider:model", kind) -> deque of recent latencies
+
+def observe_latency(key, kind, seconds):
+    samples = _latency.get((key, kind))
+    if samples is None:
+        samples = deque(maxlen=LLM_LATENCY_WINDOW)
+        _latency[(key, kind)] = samples
+    samples.append(seconds)
+
+def latency_quantile(key, kind, q=LLM_HEDGE_QUANTILE):
+    """
+    The q-quantile of recent latencies of one kind, or None with too few samples.
+    """
+    samples = _latency.get((key, kind))
+    if not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def reset_latency(key):
+    """
+    Forgets all latency samples of key, e.g. once a model is back in rotation.
+    """
+    for kind in (TTFT, COMPLETION):
+        _latency.pop((key, kind), None)
+
+def hedge_delay(key, kind):
+    """
+    How long to wait for a call of this kind before sending a duplicate (None = don't hedge).
+    """
+    if not LLM_HEDGING:
+        return None
+    p = latency_quantile(key, kind)
+    if p is None:
+        return None
+    return max(LLM_HEDGE_MIN_DELAY, p)
+
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in _RETRYABLE_STATUS or status >= 500
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    return any(cls.__name__ in _RETRYABLE_NAMES for cls in type(exc).__mro__)
+
+def _retry_fits(delay):
+    """
+    False when a retry after delay would start past the turn's deadline.
+    """
+    remaining = remaining_time()
+    return remaining is None or remaining > delay
+
+def backoff_delay(attempt, exc=None):
+    """
+    Full-jitter exponential backoff, stretched to the provider's retry-after.
+    """
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        retry_after = 0
+    return max(delay, min(retry_after, LLM_RETRY_MAX_DELAY))
+
+async def _cancel(task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def _race(key, kind, start_attempt):
+    """
+    Runs start_attempt() (returning a task), hedging once if it is slower than
+    hedge_delay(key, kind). Returns (winning task, the other task or None).
+    """
+    metrics.inc("llm_calls_total", target=key, kind=kind)
+    primary = start_attempt()
+    backup = None
+    try:
+        delay = hedge_delay(key, kind)
+        if delay is None:
+            await asyncio.wait({primary})
+            return primary, None
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary, None
+
+        metrics.inc("llm_hedges_total", target=key, kind=kind)
+        backup = start_attempt()
+        pending = {primary, backup}
+        first_failed = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None or isinstance(task.exception(), StopAsyncIteration):
+                    if task is backup:
+                        metrics.inc("llm_hedge_wins_total", target=key, kind=kind)
+                    return task, (pending.pop() if pending else None)
+                if first_failed is None:
+                    first_failed = task
+        return first_failed, None
+    except asyncio.CancelledError:
+        for task in (primary, backup):
+            if task is not None:
+                await _cancel(task)
+        raise
+
+async def call_with_resilience(key, make_call):
+    """
+    Awaits make_call() with retries and optional hedging on completion time;
+    key is "provider:model".
+    """
+    attempt = 0
+    while True:
+        started = {}
+
+        def start_attempt():
+            task = asyncio.create_task(make_call())
+            started[task] = time.monotonic()
+            return task
+
+        winner, loser = await _race(key, COMPLETION, start_attempt)
+        if loser is not None:
+            await _cancel(loser)
+        exc = winner.exception()
+        if exc is None:
+            observe_latency(key, COMPLETION, time.monotonic() - started[winner])
+            return winner.result()
+        delay = backoff_delay(attempt, exc)
+        if attempt >= LLM_MAX_RETRIES or not is_retryable(exc) or not _retry_fits(delay):
+            raise exc
+        metrics.inc("llm_retries_total", target=key, kind=COMPLETION)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def _next(stream):
+    return await stream.__anext__()
+
+async def stream_with_resilience(key, make_stream):
+    """
+    Async generator over make_stream()'s deltas with retries before the first
+    delta and optional hedging on time-to-first-token.
+    """
+    attempt = 0
+    while True:
+        streams = {}
+
+        def start_attempt():
+            stream = make_stream()
+            task = asyncio.create_task(_next(stream))
+            streams[task] = (stream, time.monotonic())
+            return task
+
+        winner, loser = await _race(key, TTFT, start_attempt)
+        if loser is not None:
+            await _cancel(loser)
+            await streams[loser][0].aclose()
+        stream, started = streams[winner]
+        exc = winner.exception()
+        if exc is None or isinstance(exc, StopAsyncIteration):
+            break
+        await stream.aclose()
+        delay = backoff_delay(attempt, exc)
+        if attempt >= LLM_MAX_RETRIES or not is_retryable(exc) or not _retry_fits(delay):
+            raise exc
+        metrics.inc("llm_retries_total", target=key, kind=TTFT)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    try:
+        if exc is not None:
+            return  # empty stream
+        observe_latency(key, TTFT, time.monotonic() - started)
+        yield winner.result()
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
+
+def _export_hedge_thresholds():
+    for key, kind in list(_latency):
+        p = latency_quantile(key, kind)
+        if p is not None:
+            metrics.set_gauge("llm_latency_p95_seconds", p, target=key, kind=kind)
+        delay = hedge_delay(key, kind)
+        if delay is not None:
+            metrics.set_gauge("llm_hedge_delay_seconds", delay, target=key, kind=kind)
+
+metrics.register_collector(_export_hedge_thresholds)
@@ -0,0 +1,71 @@
+# src/response_cache.py
+"""
+Opt-in exact-match cache of persona completions.
+
+The key is a hash of everything that determines the request: persona, system
+prompt, history window, user text, model, temperature and max_tokens, so a hit
+is a request the provider has already answered. Entries live in a bounded
+in-process LRU with a TTL and, with RESPONSE_CACHE_REDIS=1, in Redis as a
+second tier shared between processes.
+
+RESPONSE_CACHE_PERSONAS lists the personas whose replies may be cached; the
+high-temperature Spri is left out by default.
+"""
+import os
+import json
+import hashlib
+
+from src import metrics
+from src.memory_manager import ar
+from src.ttl_cache import TTLCache
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_REDIS = os.getenv("RESPONSE_CACHE_REDIS", "0") == "1"
+RESPONSE_CACHE_PERSONAS = {
+    p.strip() for p in os.getenv("RESPONSE_CACHE_PERSONAS", "Cyclo,Emo,Prim,Governor").split(",") if p.strip()
+}
+
+_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+def response_key(persona_name, system_prompt, history, user_text, model, temperature, max_tokens):
+    """
+    Cache key for one persona request, or None if caching is off for the persona.
+    """
+    if not RESPONSE_CACHE_ENABLED or persona_name not in RESPONSE_CACHE_PERSONAS:
+        return None
+    payload = json.dumps(
+        [persona_name, system_prompt, list(history or []), user_text, model, temperature, max_tokens],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def lookup(persona_name, key):
+    """
+    Returns the cached reply text for key, or None.
+    """
+    text = _cache.get(key)
+    if text is None and RESPONSE_CACHE_REDIS:
+        try:
+            text = await ar.get(f"response:{key}")
+        except Exception as e:
+            print("Response cache read error:", e)
+            text = None
+        if text is not None:
+            _cache.set(key, text)
+    metrics.inc("response_cache_requests_total", persona=persona_name, result="hit" if text is not None else "miss")
+    return text
+
+async def store(key, text):
+    _cache.set(key, text)
+    if RESPONSE_CACHE_REDIS:
+        try:
+            await ar.set(f"response:{key}", text, ex=int(RESPONSE_CACHE_TTL))
+        except Exception as e:
+            print("Response cache write error:", e)
+
+def _export_cache_size():
+    metrics.set_gauge("response_cache_entries", len(_cache))
+
+metrics.register_collector(_export_cache_size)
@@ -0,0 +1,130 @@
+# src/streaming_reply.py
+"""
+Progressive Discord replies for streamed persona output.
+
+The first non-empty chunk is posted as soon as it arrives; later chunks edit
+that message in place, throttled so a single reply stays well inside
+Discord's message-edit rate limit (about 5 edits per 5 seconds per channel).
+Edits run in the turn's scope (see src/turn_scope.py), so they stop when the
+turn is cancelled.
+"""
+import os
+import time
+import asyncio
+
+from src.turn_scope import spawn
+
+# Streaming is opt-in: STREAM_REPLIES=1 turns it on for persona and Governor replies.
+STREAMING_ENABLED = os.getenv("STREAM_REPLIES", "0") == "1"
+
+# Minimum seconds between two edits of the same message.
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+
+class StreamingReply:
+    """
+    Posts and progressively edits one reply message.
+
+    Pass `update` as the on_chunk callback of call_persona / call_persona_governor,
+    then call `finish` with the final text once the call returns.
+
+    Parameters:
+        channel: The channel (as seen by the persona's client) to post in.
+        render (callable): Maps accumulated raw text to the text to display.
+        placeholder: Optional "Thinking..." message (or queued send) deleted once the first chunk is posted.
+        outbox (DiscordOutbox): Optional turn outbox; the first post waits behind its queued messages.
+    """
+
+    def __init__(self, channel, render=None, placeholder=None, min_interval=None, outbox=None):
+        self.channel = channel
+        self.render = render or (lambda text: text.strip())
+        self.placeholder = placeholder
+        self.outbox = outbox
+        self.min_interval = STREAM_EDIT_INTERVAL if min_interval is None else min_interval
+        self.message = None
+        self._shown = ""
+        self._last_edit = 0.0
+        self._edit_task = None
+
+    async def update(self, text_so_far):
+        """
+        on_chunk callback. Posts the first chunk immediately, then schedules
+        throttled background edits so the provider stream is never blocked on Discord.
+        """
+        preview = self.render(text_so_far)
+        if not preview:
+            return
+
+        if self.message is None:
+            try:
+                self.message = await self._send(preview)
+            except Exception as e:
+                print("Streaming send error:", e)
+                return
+            if self.message is None:
+                return
+            self._shown = preview
+            self._last_edit = time.monotonic()
+            await self._drop_placeholder()
+            return
+
+        if self._edit_task is not None and not self._edit_task.done():
+            return
+        if time.monotonic() - self._last_edit < self.min_interval:
+            return
+        if preview == self._shown:
+            return
+        self._edit_task = spawn(self._edit(preview))
+
+    async def finish(self, final_text):
+        """
+        Makes the posted message show exactly final_text (sending it if nothing
+        was streamed yet). With an outbox the final edit runs in the background
+        and is awaited by outbox.flush(); otherwise it is awaited here.
+        """
+        if self.message is None:
+            self.message = await self._send(final_text)
+            await self._drop_placeholder()
+            return
+        if self.outbox is not None:
+            self.outbox.background(self._final_edit(final_text))
+        else:
+            await self._final_edit(final_text)
+
+    async def _final_edit(self, final_text):
+        if self._edit_task is not None:
+            try:
+                await self._edit_task
+            except Exception:
+                pass
+        if final_text == self._shown:
+            return
+        # Wait out the throttle window so the final edit isn't rate limited.
+        delay = self.min_interval - (time.monotonic() - self._last_edit)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._edit(final_text)
+
+    async def _edit(self, text):
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit(content=text)
+            self._shown = text
+        except Exception as e:
+            print("Streaming edit error:", e)
+
+    async def _send(self, text):
+        if self.outbox is not None:
+            return await self.outbox.send(self.channel, text)
+        return await self.channel.send(text)
+
+    async def _drop_placeholder(self):
+        if self.placeholder is None:
+            return
+        if self.outbox is not None:
+            self.outbox.delete(self.placeholder)
+        else:
+            try:
+                await self.placeholder.delete()
+            except:
+                pass
+        self.placeholder = None
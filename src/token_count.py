@@ -0,0 +1,37 @@
+# src/token_count.py
+"""
+Token counting for prompt budgets and stored history entries.
+
+Uses tiktoken when it is installed and a 4-characters-per-token estimate
+otherwise. Counts are cached per text.
+"""
+import os
+
+from src.llm_scheduler import estimate_tokens
+from src.ttl_cache import TTLCache
+
+_token_counts = TTLCache(int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "20000")), 24 * 3600)
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+def count_tokens(text):
+    """
+    Token count of text, cached per text.
+    """
+    if not text:
+        return 0
+    count = _token_counts.get(text)
+    if count is None:
+        encoding = _get_encoding()
+        count = len(encoding.encode(text)) if encoding else estimate_tokens(text)
+        _token_counts.set(text, count)
+    return count
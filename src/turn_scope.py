@@ -0,0 +1,179 @@
+# src/turn_scope.py
+"""
+Deadlines and cancellation for message turns.
+
+Each turn of handle_governor_message runs inside a TurnScope: its own task
+plus every task it starts through spawn() (persona calls, typing indicators,
+the outbox's Discord sends). Cancelling the scope cancels all of them, so a
+stale turn stops making LLM calls, writing history and posting.
+
+A scope is cancelled when:
+  - its TURN_DEADLINE (seconds) passes ("deadline")
+  - a newer turn supersedes it ("superseded"). TURN_SUPERSEDE sets the
+    policy: "author" (default) for a newer message from the same author in
+    the same channel, "channel" for any newer message in the channel, or
+    "off".
+  - !new, !isolate or !reset is used in its channel ("command")
+
+Crisis detection and the helpline reply run before a turn's scope is created
+(see handle_governor_message), so nothing here can cancel them.
+
+Scopes are tracked in-process. That covers the worker split as well, because
+all jobs of one channel go to the same worker (see src/job_queue.py), which
+calls message_arrived() as it reads each job.
+
+Cancelled turns are counted in turns_cancelled_total{reason}. LLM calls cut
+short are counted by src/llm_provider.py.
+"""
+import os
+import time
+import asyncio
+import contextvars
+
+from src import metrics
+
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "90"))
+TURN_SUPERSEDE = os.getenv("TURN_SUPERSEDE", "author").lower()
+
+# Commands that make an in-flight answer in their channel stale.
+CANCELLING_COMMANDS = ("!new", "!isolate", "!reset")
+
+# How long a command waits for the turns it cancelled to wind down.
+CANCEL_WAIT = 5.0
+
+_current = contextvars.ContextVar("turn_scope", default=None)
+_scopes = {}  # channel_id -> set of running TurnScopes
+
+class TurnScope:
+    """
+    Deadline and cancellation scope of one message turn.
+
+    Parameters:
+        channel_id (str): Channel the turn answers in.
+        author_id (str): Author of the message being answered.
+        deadline (float): Seconds the turn may run.
+    """
+
+    def __init__(self, channel_id, author_id, deadline=None):
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.deadline = time.monotonic() + (TURN_DEADLINE if deadline is None else deadline)
+        self.reason = None
+        self._tasks = set()
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def spawn(self, coro):
+        """
+        Starts coro as a task that is cancelled together with the scope.
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def cancel(self, reason):
+        """
+        Cancels the turn and every task it spawned. Returns the tasks cancelled.
+        """
+        if self.reason is None:
+            self.reason = reason
+            metrics.inc("turns_cancelled_total", reason=reason)
+            print(f"Cancelled turn in channel {self.channel_id} ({reason})")
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    async def run(self, coro):
+        """
+        Runs coro as the turn's task until it finishes, the scope is cancelled
+        or the deadline passes. Returns False if the turn was cancelled.
+        Exceptions of coro propagate.
+        """
+        token = _current.set(self)
+        try:
+            main = self.spawn(coro)
+        finally:
+            _current.reset(token)
+        _scopes.setdefault(self.channel_id, set()).add(self)
+        timer = asyncio.get_running_loop().call_later(max(0.0, self.remaining()), self.cancel, "deadline")
+        try:
+            await asyncio.wait({main})
+        except asyncio.CancelledError:
+            self.cancel("shutdown")
+            raise
+        finally:
+            timer.cancel()
+            channel_scopes = _scopes.get(self.channel_id)
+            if channel_scopes is not None:
+                channel_scopes.discard(self)
+                if not channel_scopes:
+                    del _scopes[self.channel_id]
+        if main.cancelled():
+            return False
+        main.result()
+        return True
+
+def current_scope():
+    """
+    The TurnScope of the running turn, or None outside a turn.
+    """
+    return _current.get()
+
+def spawn(coro):
+    """
+    asyncio.create_task, tied to the current turn's scope when there is one.
+    """
+    scope = _current.get()
+    if scope is not None:
+        return scope.spawn(coro)
+    return asyncio.create_task(coro)
+
+def remaining_time():
+    """
+    Seconds left before the current turn's deadline, or None outside a turn.
+    """
+    scope = _current.get()
+    return scope.remaining() if scope is not None else None
+
+def cancel_turns(channel_id, reason, author_id=None):
+    """
+    Cancels the running turns of a channel (only author_id's when given).
+    Returns the tasks cancelled.
+    """
+    tasks = []
+    for scope in list(_scopes.get(channel_id, ())):
+        if author_id is None or scope.author_id == author_id:
+            tasks += scope.cancel(reason)
+    return tasks
+
+def message_arrived(channel_id, author_id, content):
+    """
+    Applies the cancellation rules to a newly arrived message: commands in
+    CANCELLING_COMMANDS cancel every turn of the channel, other messages
+    supersede turns according to TURN_SUPERSEDE. Returns the tasks cancelled.
+    """
+    words = content.strip().lower().split()
+    if words and words[0] in CANCELLING_COMMANDS:
+        return cancel_turns(channel_id, "command")
+    if words and words[0].startswith("!"):
+        return []
+    if TURN_SUPERSEDE == "channel":
+        return cancel_turns(channel_id, "superseded")
+    if TURN_SUPERSEDE == "author":
+        return cancel_turns(channel_id, "superseded", author_id=author_id)
+    return []
+
+async def wait_cancelled(tasks, timeout=CANCEL_WAIT):
+    """
+    Waits (bounded) for cancelled tasks to wind down, e.g. before !new clears
+    the memory they might still be writing to.
+    """
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
@@ -0,0 +1,161 @@
+# src/webhook_transport.py
+"""
+Persona replies through channel webhooks instead of one bot client per persona.
+
+With PERSONA_TRANSPORT=webhooks only the Governor bot connects to Discord.
+Every other persona posts through a webhook of the channel, with the
+persona's username and avatar (WEBHOOK_AVATAR_<PERSONA> holds the avatar URL).
+Each channel gets one webhook, named WEBHOOK_NAME and shared by all personas.
+It is looked up or created on the first reply in that channel. Its URL is
+cached in-process and in the Redis hash "webhooks", so other worker processes
+can reuse it without another API call.
+
+WebhookPersonaClient has the two methods the aggregator uses on a persona
+client, get_channel and get_partial_messageable. The channels it returns
+support send (returning a message that can be edited and deleted) and
+typing. Webhooks cannot show a typing indicator, so the Governor bot types
+instead. When a channel's webhook cannot be set up, replies fall back to the
+Governor bot: for good when the channel can never have one (no Manage
+Webhooks permission, DMs), for WEBHOOK_RETRY_AFTER seconds after other
+errors (Redis hiccups, Discord 5xx or rate limits).
+"""
+import os
+import asyncio
+import discord
+
+from src.memory_manager import ar
+from src.ttl_cache import TTLCache
+
+PERSONA_TRANSPORT = os.getenv("PERSONA_TRANSPORT", "clients").lower()
+WEBHOOK_NAME = os.getenv("WEBHOOK_NAME", "Blob personas")
+WEBHOOK_RETRY_AFTER = float(os.getenv("WEBHOOK_RETRY_AFTER", "60"))
+
+PERSONA_NAMES = ["Cyclo", "Emo", "Prim", "Spri"]
+
+_webhooks = {}  # channel_id -> (discord.Webhook or None, thread or None)
+_retry_later = TTLCache(10000, WEBHOOK_RETRY_AFTER)  # channel_id -> True after a transient failure
+_locks = {}
+
+def webhooks_enabled():
+    return PERSONA_TRANSPORT == "webhooks"
+
+def avatar_url(persona_name):
+    return os.getenv(f"WEBHOOK_AVATAR_{persona_name.upper()}") or None
+
+async def _find_or_create(client, channel):
+    for webhook in await channel.webhooks():
+        if webhook.name == WEBHOOK_NAME and webhook.token:
+            return webhook
+    return await channel.create_webhook(name=WEBHOOK_NAME, reason="Persona replies")
+
+async def get_webhook(client, channel_id):
+    """
+    Returns (webhook, thread) for a channel, or (None, None) when the channel
+    cannot have one, or could not get one recently. Thread channels post
+    through their parent's webhook.
+    """
+    cached = _webhooks.get(channel_id)
+    if cached is not None:
+        return cached
+    if _retry_later.get(channel_id):
+        return (None, None)
+    lock = _locks.setdefault(channel_id, asyncio.Lock())
+    async with lock:
+        cached = _webhooks.get(channel_id)
+        if cached is not None:
+            return cached
+        if _retry_later.get(channel_id):
+            return (None, None)
+
+        try:
+            url = await ar.hget("webhooks", str(channel_id))
+            channel = client.get_channel(channel_id) or await client.fetch_channel(channel_id)
+            thread = channel if isinstance(channel, discord.Thread) else None
+            parent = thread.parent if thread is not None else channel
+            if url:
+                result = (discord.Webhook.from_url(url, client=client), thread)
+            elif not hasattr(parent, "create_webhook"):
+                print(f"Channel {channel_id} cannot have webhooks, posting as the Governor")
+                result = (None, None)
+            else:
+                webhook = await _find_or_create(client, parent)
+                await ar.hset("webhooks", str(channel_id), webhook.url)
+                result = (webhook, thread)
+        except (discord.Forbidden, discord.NotFound) as e:
+            print(f"Webhook setup failed for channel {channel_id}, posting as the Governor:", e)
+            result = (None, None)
+        except Exception as e:
+            print(f"Webhook setup failed for channel {channel_id}, posting as the Governor "
+                  f"for {WEBHOOK_RETRY_AFTER:.0f}s:", e)
+            _retry_later.set(channel_id, True)
+            return (None, None)
+        _webhooks[channel_id] = result
+        return result
+
+async def forget_webhook(channel_id):
+    """
+    Drops a webhook that stopped working (e.g. deleted in Discord); the next
+    reply looks it up again.
+    """
+    _webhooks.pop(channel_id, None)
+    try:
+        await ar.hdel("webhooks", str(channel_id))
+    except Exception as e:
+        print("Webhook cache error:", e)
+
+class WebhookChannel:
+    """
+    One channel as seen by a webhook persona.
+    """
+
+    def __init__(self, client, persona_name, channel_id):
+        self.client = client
+        self.persona_name = persona_name
+        self.id = channel_id
+
+    def typing(self):
+        return self.client.get_partial_messageable(self.id).typing()
+
+    async def send(self, content=None, **kwargs):
+        webhook, thread = await get_webhook(self.client, self.id)
+        if webhook is None:
+            return await self.client.get_partial_messageable(self.id).send(content, **kwargs)
+        options = {"username": self.persona_name, "wait": True}
+        if avatar_url(self.persona_name):
+            options["avatar_url"] = avatar_url(self.persona_name)
+        if thread is not None:
+            options["thread"] = thread
+        try:
+            return await webhook.send(content, **options, **kwargs)
+        except discord.NotFound:
+            await forget_webhook(self.id)
+            webhook, thread = await get_webhook(self.client, self.id)
+            if webhook is None:
+                return await self.client.get_partial_messageable(self.id).send(content, **kwargs)
+            return await webhook.send(content, **options, **kwargs)
+
+class WebhookPersonaClient:
+    """
+    Stands in for a persona's discord.Client, posting through webhooks of the
+    Governor bot's client.
+    """
+
+    def __init__(self, client, persona_name):
+        self.client = client
+        self.persona_name = persona_name
+        # Webhooks need no channel permissions of their own (see !private).
+        self.user = None
+
+    def get_channel(self, channel_id):
+        return WebhookChannel(self.client, self.persona_name, channel_id)
+
+    get_partial_messageable = get_channel
+
+def webhook_persona_clients(governor_client):
+    """
+    The persona_clients mapping for the webhook transport: the Governor posts
+    as itself, every other persona through webhooks.
+    """
+    clients = {name: WebhookPersonaClient(governor_client, name) for name in PERSONA_NAMES}
+    clients["Governor"] = governor_client
+    return clients
@@ -0,0 +1,136 @@
+# src/worker.py
+"""
+Worker process (BOT_MODE=worker): consumes message jobs from the Redis Streams
+work queue and runs handle_governor_message for each.
+
+The persona clients only log in over REST (no gateway connection), so any
+number of workers can run side by side; replies are posted through each
+persona's REST API as before. With PERSONA_TRANSPORT=webhooks only the
+Governor logs in and the other personas post through channel webhooks.
+"""
+import os
+import asyncio
+import discord
+
+from src.job_queue import StreamWorker, shard_for
+from src.turn_scope import message_arrived
+from src.health import start_health_server
+from src.webhook_transport import webhooks_enabled, webhook_persona_clients
+
+PERSONA_TOKENS = {
+    "Cyclo":    os.getenv("BLOB_TOKEN_CYCLO"),
+    "Emo":      os.getenv("BLOB_TOKEN_EMO"),
+    "Prim":     os.getenv("BLOB_TOKEN_PRIM"),
+    "Spri":     os.getenv("BLOB_TOKEN_SPRI"),
+    "Governor": os.getenv("BLOB_TOKEN_GOVERNOR"),
+}
+
+if webhooks_enabled():
+    persona_clients = webhook_persona_clients(discord.Client(intents=discord.Intents.none()))
+    # Only clients that log in (webhook personas ride on the Governor's).
+    login_clients = {"Governor": persona_clients["Governor"]}
+else:
+    persona_clients = {name: discord.Client(intents=discord.Intents.none()) for name in PERSONA_TOKENS}
+    login_clients = persona_clients
+
+class JobAuthor(discord.Object):
+    """
+    Message author rebuilt from a job (id, name, display_name, bot).
+    """
+
+    def __init__(self, job):
+        super().__init__(id=int(job["author_id"]))
+        self.name = job["author_name"]
+        self.display_name = job["author_display_name"]
+        self.bot = job["author_bot"]
+
+class JobMessage:
+    """
+    Stand-in for the discord.Message a job was made from, with the
+    attributes the aggregator uses. The guild is only fetched on demand
+    (for !private).
+    """
+
+    def __init__(self, job, client):
+        self.id = int(job["message_id"])
+        self.content = job["content"]
+        self.author = JobAuthor(job)
+        self.guild_id = int(job["guild_id"]) if job.get("guild_id") else None
+        self.channel = client.get_partial_messageable(int(job["channel_id"]), guild_id=self.guild_id)
+        self.guild = None
+        self._client = client
+
+    async def load_guild(self):
+        if self.guild is None and self.guild_id:
+            self.guild = await self._client.fetch_guild(self.guild_id)
+        return self.guild
+
+async def handle_job(job):
+    from src.aggregator import handle_governor_message
+    message = JobMessage(job, persona_clients["Governor"])
+    if message.content.strip().lower().startswith("!private"):
+        await message.load_guild()
+    await handle_governor_message(message, persona_clients, burst=job.get("burst"))
+
+def job_arrived(job):
+    """
+    Applies turn cancellation as soon as a job is read: a superseded turn of
+    its channel is cancelled instead of finishing before this job starts.
+    """
+    message_arrived(job["channel_id"], job["author_id"], job["content"])
+
+def shard_changed(shard):
+    """
+    Drops in-process state cached for the shard's channels whenever this
+    worker takes or gives up the shard: while another worker owned it, that
+    worker's writes (new messages, !new, persona changes) never reached our
+    caches.
+    """
+    from src.memory_manager import forget_channels as forget_history
+    from src.persona_manager import forget_channels as forget_persona_state
+
+    def owned(channel_id):
+        return shard_for(channel_id) == shard
+
+    forget_history(owned)
+    forget_persona_state(owned)
+
+def preload_pipeline():
+    """
+    Imports the message pipeline and creates the LLM clients (blocking).
+    """
+    import src.aggregator  # noqa: F401
+    from src.llm_provider import prewarm_clients
+    prewarm_clients()
+
+async def run_worker():
+    # Log in while the pipeline is imported in a thread.
+    await asyncio.gather(
+        asyncio.get_running_loop().run_in_executor(None, preload_pipeline),
+        *(client.login(PERSONA_TOKENS[name]) for name, client in login_clients.items())
+    )
+    print("Worker logged in as", ", ".join(str(c.user) for c in login_clients.values()))
+    worker = StreamWorker(handle_job, on_dispatch=job_arrived, on_shard_change=shard_changed)
+    try:
+        await worker.run()
+    finally:
+        from src.llm_provider import close_clients
+        for client in login_clients.values():
+            await client.close()
+        await close_clients()
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.create_task(start_health_server())
+    task = loop.create_task(run_worker())
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+    finally:
+        loop.stop()
+
+if __name__ == "__main__":
+    main()